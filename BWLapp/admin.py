@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import CustomUser, Customer, Payment, Product, Order, Category, OrderItem, Stock
+from django.db import transaction
+from .forms import StockForm
+from .models import CustomUser, Customer, Payment, Product, Order, Category, OrderItem, Stock, StockMovement, StockCheckpoint, OutboxEvent
 
 # Register your models here.
 admin.site.register(CustomUser)
@@ -9,4 +11,51 @@ admin.site.register(Order)
 admin.site.register(Payment)
 admin.site.register(OrderItem)
 admin.site.register(Category)
-admin.site.register(Stock)
+
+@admin.register(Stock)
+class StockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'package_type', 'on_hand', 'price_per_package', 'is_available', 'shard_count')
+    readonly_fields = ('shard_count',)
+    # Seeds quantity from the shard total on sharded stock.
+    form = StockForm
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(on_hand=Stock.on_hand_expression())
+
+    @admin.display(description='Quantity', ordering='on_hand')
+    def on_hand(self, obj):
+        return obj.on_hand
+
+    def save_model(self, request, obj, form, change):
+        # Keep the stock ledger in step with quantity edits made from the admin.
+        with transaction.atomic():
+            if not change:
+                super().save_model(request, obj, form, change)
+                if obj.quantity:
+                    StockMovement.record(obj, obj.quantity, 'receipt', user=request.user, note="Edited in admin")
+                return
+            # As StockUpdateView: keep the row's current quantity unless a new count was typed.
+            obj.quantity = Stock.objects.select_for_update().values_list('quantity', flat=True).get(pk=obj.pk)
+            super().save_model(request, obj, form, change)
+            if 'quantity' in form.changed_data:
+                obj.set_quantity(form.cleaned_data['quantity'], user=request.user, note="Edited in admin")
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'stock', 'kind', 'change', 'source_model', 'source_id', 'user')
+    list_filter = ('kind',)
+
+    def has_change_permission(self, request, obj=None):
+        # The ledger is append-only.
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+admin.site.register(StockCheckpoint)
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'aggregate_type', 'aggregate_id', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status', 'event_type')
+    readonly_fields = ('event_type', 'aggregate_type', 'aggregate_id', 'payload', 'created_at', 'processed_at', 'last_error')
@@ -0,0 +1,288 @@
+# BWLapp/api.py
+"""
+Versioned REST API (mounted at /api/v1/) for integrations such as POS
+terminals and the warehouse scanner app.
+
+Requests authenticate with a JWT access token from /api/v1/token/. The
+token carries the user's id and role, so no session or user row is read
+per request. Every list endpoint pages by primary-key cursor, every
+endpoint takes `?fields=` to trim the response, and customers, stock,
+orders, order items and payments accept up to MAX_BULK objects per
+POST/PATCH to `<endpoint>/bulk/`, written in one transaction.
+
+Tablets push their offline queues to /api/v1/sync/ (see sync.py), and
+quotes check many packages at once at /api/v1/availability/.
+Past prices are looked up at /api/v1/prices/.
+"""
+import io
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from rest_framework import permissions, serializers, status, viewsets
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import CursorPagination
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from . import availability, order_status, sync
+from .prices import prices_as_of
+from .models import Customer, Order, OrderItem, Payment, Product, Stock
+from .serializers import (
+    CachedPrimaryKeyRelatedField, CustomerSerializer, OrderItemSerializer, OrderSerializer,
+    PaymentSerializer, RoleTokenObtainPairSerializer, StockSerializer,
+)
+
+MAX_BULK = 500
+
+
+class RoleTokenUser(TokenUser):
+    """The request user for JWT requests, built from the token alone."""
+    @property
+    def role(self):
+        return self.token.get('role', '')
+
+
+class PkCursorPagination(CursorPagination):
+    ordering = 'pk'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class RolePermission(permissions.BasePermission):
+    """
+    Mirrors the HTML views: employees and admins may list and create;
+    changing or deleting needs an admin, as do the views' AdminRequiredMixin
+    views. Viewsets listing `admin_actions` restrict those actions too.
+    """
+    ADMIN_ACTIONS = {'update', 'partial_update', 'destroy'}
+
+    def has_permission(self, request, view):
+        role = getattr(request.user, 'role', '')
+        if role not in ('admin', 'employee'):
+            return False
+        admin_actions = self.ADMIN_ACTIONS | set(getattr(view, 'admin_actions', ()))
+        action_name = getattr(view, 'action', None)
+        if action_name == 'bulk' and request.method == 'PATCH':
+            return role == 'admin'
+        return role == 'admin' or action_name not in admin_actions
+
+
+class BulkMixin:
+    """
+    Adds `<endpoint>/bulk/`: POST a list of new objects, or PATCH a list of
+    partial objects that each carry the primary key. Every object is
+    validated before anything is written; if any fails, the response is a
+    400 listing the errors by position and nothing is saved. The same goes
+    for a row the database rejects on save, such as a second customer with
+    an email used earlier in the batch.
+    """
+    def _preload_related(self, serializer, rows, cache):
+        # One in_bulk() per related model instead of a query per object and field.
+        for name, field in serializer.fields.items():
+            if field.read_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                nested = [row for parent in rows for row in (parent.get(name) or []) if isinstance(row, dict)]
+                self._preload_related(field.child, nested, cache)
+            elif isinstance(field, CachedPrimaryKeyRelatedField):
+                queryset = field.get_queryset()
+                ids = {row[name] for row in rows if isinstance(row.get(name), int) or str(row.get(name)).isdigit()}
+                cache.setdefault(queryset.model, {}).update(queryset.in_bulk(ids))
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            raise serializers.ValidationError({'detail': "Send a list of objects."})
+        if len(rows) > MAX_BULK:
+            raise serializers.ValidationError({'detail': f"Send at most {MAX_BULK} objects per request."})
+        if not all(isinstance(row, dict) for row in rows):
+            raise serializers.ValidationError({'detail': "Every entry must be an object."})
+
+        context = {**self.get_serializer_context(), 'related_cache': {}}
+        self._preload_related(self.get_serializer_class()(context=context), rows, context['related_cache'])
+
+        partial = request.method == 'PATCH'
+        instances = {}
+        if partial:
+            pk_name = self.get_queryset().model._meta.pk.name
+            pks = [row.get(pk_name, row.get('pk')) for row in rows]
+            instances = self.get_queryset().in_bulk([pk for pk in pks if isinstance(pk, int)])
+
+        items, errors = [], []
+        for index, row in enumerate(rows):
+            instance = None
+            if partial:
+                instance = instances.get(pks[index]) if isinstance(pks[index], int) else None
+                if instance is None:
+                    errors.append({'index': index, 'errors': {'detail': "Unknown or missing id."}})
+                    continue
+            item = self.get_serializer_class()(instance, data=row, partial=partial, context=context)
+            if item.is_valid():
+                items.append(item)
+            else:
+                errors.append({'index': index, 'errors': item.errors})
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                for index, item in enumerate(items):
+                    try:
+                        item.save()
+                    except serializers.ValidationError as exc:
+                        # Model-level failures (e.g. stock ran out) roll the whole batch back.
+                        errors.append({'index': index, 'errors': exc.detail})
+                        raise
+                    except IntegrityError:
+                        # Unique checks run per row, so duplicates within the batch only fail here.
+                        errors.append({'index': index, 'errors': {
+                            'detail': "Conflicts with an existing record or an earlier entry in this batch.",
+                        }})
+                        raise
+        except (serializers.ValidationError, IntegrityError):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            [item.data for item in items],
+            status=status.HTTP_200_OK if partial else status.HTTP_201_CREATED,
+        )
+
+
+class ApiViewSet(BulkMixin, viewsets.ModelViewSet):
+    # Set here, not in REST_FRAMEWORK: DRF reads its defaults while this module imports.
+    permission_classes = [RolePermission]
+    pagination_class = PkCursorPagination
+
+
+class CustomerViewSet(ApiViewSet):
+    queryset = Customer.objects.all()
+    serializer_class = CustomerSerializer
+
+
+class StockViewSet(ApiViewSet):
+    # Stock levels are set by admins only, as in StockCreateView/StockUpdateView.
+    queryset = Stock.objects.select_related('product')
+    serializer_class = StockSerializer
+    admin_actions = ('create', 'bulk')
+
+
+class OrderViewSet(ApiViewSet):
+    queryset = Order.objects.prefetch_related('items')
+    serializer_class = OrderSerializer
+    admin_actions = ('transition',)
+
+    @action(detail=False, methods=['post'])
+    def transition(self, request):
+        """POST {"orders": [ids], "status": "Dispatched"} to move many orders in one update."""
+        order_ids, status_name = request.data.get('orders'), request.data.get('status')
+        if status_name not in Order.TRANSITIONS:
+            raise serializers.ValidationError({'status': f"Must be one of {', '.join(Order.TRANSITIONS)}."})
+        if not isinstance(order_ids, list) or not all(isinstance(pk, int) for pk in order_ids):
+            raise serializers.ValidationError({'orders': "Send a list of order ids."})
+        if len(order_ids) > MAX_BULK:
+            raise serializers.ValidationError({'orders': f"Send at most {MAX_BULK} orders per request."})
+        moved, skipped = order_status.transition_orders(order_ids, status_name, int(request.user.id))
+        return Response({'moved': moved, 'skipped': skipped})
+
+
+class OrderItemViewSet(ApiViewSet):
+    queryset = OrderItem.objects.all()
+    serializer_class = OrderItemSerializer
+
+
+class PaymentViewSet(ApiViewSet):
+    queryset = Payment.objects.all()
+    serializer_class = PaymentSerializer
+
+
+class RoleTokenObtainPairView(TokenObtainPairView):
+    serializer_class = RoleTokenObtainPairSerializer
+
+
+class GzipJSONParser(JSONParser):
+    """JSONParser that also takes a body sent with `Content-Encoding: gzip`."""
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        if request is not None and request.META.get('HTTP_CONTENT_ENCODING', '').lower() == 'gzip':
+            try:
+                stream = io.BytesIO(sync.decompress(stream.read()))
+            except sync.SyncError as exc:
+                raise ParseError(str(exc))
+        return super().parse(stream, media_type, parser_context)
+
+
+@method_decorator(gzip_page, name='dispatch')
+class SyncView(APIView):
+    """
+    POST a tablet's queued orders and payments; the response has a result
+    per operation plus the stock changed since the client's token.
+    """
+    permission_classes = [RolePermission]
+    parser_classes = [GzipJSONParser]
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            raise ParseError("Send an object with 'operations' and, after the first sync, 'since'.")
+        try:
+            since = sync.parse_token(request.data.get('since'))
+            results = sync.apply_batch(request.data.get('operations', []), int(request.user.id))
+        except sync.SyncError as exc:
+            raise ParseError(str(exc))
+        return Response({'results': results, **sync.stock_delta(since)})
+
+
+class AvailabilityView(APIView):
+    """
+    POST {"lines": [{"product": 4, "package_type": "Carton", "quantity": 3}, ...]}
+    for each package's live quantity and price, all from the same
+    availability snapshot, stamped with its version.
+    """
+    # Also accepts the session so the order and quote pages can call it.
+    authentication_classes = [JWTStatelessUserAuthentication, SessionAuthentication]
+    permission_classes = [RolePermission]
+
+    def post(self, request):
+        lines = request.data.get('lines') if isinstance(request.data, dict) else None
+        if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+            raise ParseError("Send {'lines': [{'product': id, 'package_type': ..., 'quantity': n}, ...]}.")
+        if len(lines) > availability.MAX_LINES:
+            raise ParseError(f"Send at most {availability.MAX_LINES} lines per request.")
+        version, results = availability.check_lines(lines)
+        return Response({'version': version, 'lines': results})
+
+
+class PriceHistoryView(APIView):
+    """
+    GET ?stock=1,2,3&product=4,5&at=<ISO timestamp> for each item's price as
+    of `at` (default now). Items unknown at that time are left out.
+    """
+    permission_classes = [RolePermission]
+
+    def get(self, request):
+        at = request.query_params.get('at')
+        when = parse_datetime(at) if at else timezone.now()
+        if when is None:
+            raise ParseError("'at' must be an ISO 8601 timestamp.")
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        result = {'at': when.isoformat()}
+        for param, model in (('stock', Stock), ('product', Product)):
+            try:
+                ids = [int(pk) for pk in request.query_params.get(param, '').split(',') if pk.strip()]
+            except ValueError:
+                raise ParseError(f"'{param}' must be a comma-separated list of ids.")
+            if len(ids) > availability.MAX_LINES:
+                raise ParseError(f"Ask for at most {availability.MAX_LINES} {param} ids per request.")
+            result[param] = {pk: str(price) for pk, price in prices_as_of(model, ids, when).items()} if ids else {}
+        return Response(result)
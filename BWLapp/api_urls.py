@@ -0,0 +1,23 @@
+# BWLapp/api_urls.py
+"""URL patterns for the REST API, included under /api/v1/."""
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenRefreshView
+
+from . import api
+
+router = DefaultRouter()
+router.register('customers', api.CustomerViewSet)
+router.register('stock', api.StockViewSet)
+router.register('orders', api.OrderViewSet)
+router.register('order-items', api.OrderItemViewSet)
+router.register('payments', api.PaymentViewSet)
+
+urlpatterns = [
+    path('token/', api.RoleTokenObtainPairView.as_view(), name='api-token'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='api-token-refresh'),
+    path('sync/', api.SyncView.as_view(), name='api-sync'),
+    path('availability/', api.AvailabilityView.as_view(), name='api-availability'),
+    path('prices/', api.PriceHistoryView.as_view(), name='api-prices'),
+    path('', include(router.urls)),
+]
@@ -6,4 +6,5 @@ class BwlappConfig(AppConfig):
     name = 'BWLapp'
     
     def ready(self):
-        import BWLapp.signals
\ No newline at end of file
+        import BWLapp.signals
+        import BWLapp.tasks
\ No newline at end of file
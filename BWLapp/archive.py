@@ -0,0 +1,141 @@
+# BWLapp/archive.py
+"""
+Hot/cold split for order history.
+
+Closed orders older than ARCHIVE_AFTER_DAYS move, with their items and
+payments, from the live tables into ArchivedOrder / ArchivedOrderItem /
+ArchivedPayment, keeping their primary keys. The live tables that order
+entry and the order list hit stay small; reports add the archive only
+when the date range they cover reaches back into it.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import audit, outbox
+from .models import ArchivedOrder, ArchivedOrderItem, ArchivedPayment, AuditTrail, Order, OrderItem, Payment
+from .shared_cache import cache_is_shared
+
+# Orders in these states are closed whether or not they were paid.
+CLOSED_STATUSES = Order.CLOSED_STATUSES
+HORIZON_CACHE_KEY = 'order_archive_horizon'
+HORIZON_CACHE_SECONDS = 3600
+
+
+def archive_after_days():
+    return getattr(settings, 'ARCHIVE_AFTER_DAYS', 365)
+
+
+def closed_orders(cutoff):
+    """Orders placed before `cutoff` that are paid in full or in a closed status."""
+    money = DecimalField(max_digits=14, decimal_places=2)
+    paid = (
+        Payment.objects.filter(order=OuterRef('pk')).values('order')
+        .annotate(total=Sum('total_amount')).values('total')
+    )
+    ordered = (
+        OrderItem.objects.filter(order=OuterRef('pk')).values('order')
+        .annotate(total=Sum(F('quantity') * F('price_each'))).values('total')
+    )
+    return Order.objects.filter(order_date__lt=cutoff).annotate(
+        paid=Coalesce(Subquery(paid, output_field=money), Value(Decimal('0')), output_field=money),
+        ordered=Coalesce(Subquery(ordered, output_field=money), Value(Decimal('0')), output_field=money),
+    ).filter(Q(status__in=CLOSED_STATUSES) | Q(paid__gt=0, paid__gte=F('ordered')))
+
+
+def archive_orders(order_ids):
+    """
+    Moves the given orders with their items and payments into the archive
+    in one transaction. Stock is not returned and no outbox events fire:
+    nothing about the business changed, and the customer ledger already
+    counts archived rows. One 'Archived' audit entry is written per row so
+    audit history and incremental backups see the live rows go.
+    Returns the number of orders moved.
+    """
+    now = timezone.now()
+    with transaction.atomic(), outbox.suppressed():
+        orders = list(Order.objects.select_for_update().filter(pk__in=order_ids))
+        if not orders:
+            return 0
+        ids = [order.pk for order in orders]
+        items = list(OrderItem.objects.filter(order_id__in=ids))
+        payments = list(Payment.objects.filter(order_id__in=ids))
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(order_id=o.pk, customer_id=o.customer_id, status=o.status,
+                          created_by_id=o.created_by_id, order_date=o.order_date, archived_at=now)
+            for o in orders
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(id=i.pk, order_id=i.order_id, stock_item_id=i.stock_item_id,
+                              quantity=i.quantity, price_each=i.price_each, product_id=i.product_id,
+                              product_name=i.product_name, package_type=i.package_type, unit_cost=i.unit_cost)
+            for i in items
+        ])
+        ArchivedPayment.objects.bulk_create([
+            ArchivedPayment(payment_id=p.pk, order_id=p.order_id, payment_date=p.payment_date,
+                            total_amount=p.total_amount, method=p.method, processed_by_id=p.processed_by_id)
+            for p in payments
+        ])
+        details = audit.to_json({'archived_at': now})
+        AuditTrail.objects.bulk_create([
+            AuditTrail(action=f"Archived {type(row).__name__}", model_name=type(row).__name__,
+                       record_id=str(row.pk), is_snapshot=True, details=details, timestamp=now)
+            for row in [*orders, *items, *payments]
+        ])
+        Order.objects.filter(pk__in=ids).delete()
+    invalidate_horizon()
+    return len(orders)
+
+
+def _read_horizon():
+    return {
+        'order_date': ArchivedOrder.objects.aggregate(latest=Max('order_date'))['latest'],
+        'payment_date': ArchivedPayment.objects.aggregate(latest=Max('payment_date'))['latest'],
+    }
+
+
+def archive_horizon():
+    """
+    Latest order and payment dates in the archive ({'order_date': ...,
+    'payment_date': ...}). Cached only in a shared cache: archive_orders()
+    usually runs in another process, whose invalidation a per-process cache
+    would never see. Otherwise it is read each time, two lookups on indexed
+    columns.
+    """
+    if not cache_is_shared():
+        return _read_horizon()
+    horizon = cache.get(HORIZON_CACHE_KEY)
+    if horizon is None:
+        horizon = _read_horizon()
+        cache.set(HORIZON_CACHE_KEY, horizon, HORIZON_CACHE_SECONDS)
+    return horizon
+
+
+def invalidate_horizon():
+    cache.delete(HORIZON_CACHE_KEY)
+
+
+def reaches_archive(start, field='order_date'):
+    """True when a range starting at `start` (None: all time) covers archived rows."""
+    latest = archive_horizon()[field]
+    return latest is not None and (start is None or start <= latest)
+
+
+def merge_totals(key, value, *row_lists):
+    """Adds up grouped `.values(key).annotate(value=...)` rows from the live and archive tables."""
+    totals = {}
+    for rows in row_lists:
+        for row in rows:
+            totals[row[key]] = totals.get(row[key], 0) + (row[value] or 0)
+    return [{key: group, value: total} for group, total in totals.items()]
+
+
+def cutoff_date(days=None):
+    return timezone.now() - timedelta(days=archive_after_days() if days is None else days)
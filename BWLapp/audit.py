@@ -0,0 +1,141 @@
+# BWLapp/audit.py
+"""
+Delta-based audit logging.
+
+Every audited instance remembers the field values it was loaded with. On
+save only the fields that changed are written to the AuditTrail, as a JSON
+object of {field: new value}. A full snapshot is written on create, on
+delete and after every AUDIT_SNAPSHOT_INTERVAL deltas, so reconstruct()
+never has to replay more than that many entries.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.db.models.fields.files import FieldFile
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditTrail
+
+# Never copied into the audit log.
+EXCLUDED_FIELDS = {'password', 'last_login', 'is_superuser'}
+
+# Actions after which the record is no longer in its live table.
+GONE_ACTIONS = ('Deleted', 'Archived', 'Merged')
+
+
+def snapshot_interval():
+    return getattr(settings, 'AUDIT_SNAPSHOT_INTERVAL', 20)
+
+
+def _audited_fields(instance):
+    return [f for f in instance._meta.concrete_fields if f.attname not in EXCLUDED_FIELDS]
+
+
+def current_values(instance):
+    """Field values currently held by the instance, skipping deferred fields."""
+    values = {}
+    for field in _audited_fields(instance):
+        if field.attname not in instance.__dict__:
+            continue
+        value = instance.__dict__[field.attname]
+        if isinstance(value, FieldFile):
+            value = value.name
+        values[field.attname] = value
+    return values
+
+
+def remember_loaded_values(instance):
+    instance._audit_loaded = current_values(instance)
+
+
+def changed_values(instance):
+    """{field: new value} for every field that differs from what was loaded."""
+    loaded = getattr(instance, '_audit_loaded', {})
+    return {
+        name: value for name, value in current_values(instance).items()
+        if name not in loaded or loaded[name] != value
+    }
+
+
+def to_json(values):
+    return json.dumps(values, cls=DjangoJSONEncoder, sort_keys=True)
+
+
+def needs_snapshot(model_name, record_id):
+    """True when the record has gone AUDIT_SNAPSHOT_INTERVAL entries without a snapshot."""
+    interval = snapshot_interval()
+    recent = list(
+        AuditTrail.objects.filter(model_name=model_name, record_id=record_id)
+        .order_by('-timestamp', '-id').values_list('is_snapshot', flat=True)[:interval]
+    )
+    return len(recent) >= interval and not any(recent)
+
+
+def reconstruct(model_name, record_id, as_of=None):
+    """
+    Returns the field values of a record as they were at `as_of` (default:
+    now), or None if it did not exist then. Starts from the nearest full
+    snapshot and replays the deltas recorded after it.
+    """
+    entries = AuditTrail.objects.filter(model_name=model_name, record_id=str(record_id))
+    if as_of is not None:
+        entries = entries.filter(timestamp__lte=as_of)
+    snapshot = entries.filter(is_snapshot=True).order_by('-timestamp', '-id').first()
+    if snapshot is None:
+        return None
+    if snapshot.action.startswith(GONE_ACTIONS):
+        return None
+
+    state = json.loads(snapshot.details)
+    later = entries.filter(Q(timestamp__gt=snapshot.timestamp) | Q(timestamp=snapshot.timestamp, id__gt=snapshot.id))
+    for entry in later.order_by('timestamp', 'id'):
+        if entry.action.startswith(GONE_ACTIONS):
+            return None
+        state.update(json.loads(entry.details or '{}'))
+    return state
+
+
+def parse_cursor(cursor):
+    """Splits a '<timestamp>_<id>' keyset cursor; returns None if malformed."""
+    try:
+        timestamp, entry_id = cursor.rsplit('_', 1)
+        timestamp = parse_datetime(timestamp)
+        return (timestamp, int(entry_id)) if timestamp else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def make_cursor(entry):
+    return f"{entry.timestamp.isoformat()}_{entry.pk}"
+
+
+def browse(filters, cursor=None, page_size=50):
+    """
+    One page of audit entries, newest first, using keyset pagination on
+    (timestamp, id) so deep pages cost the same as the first one.
+    Returns (entries, next_cursor).
+    """
+    entries = AuditTrail.objects.select_related('user')
+    if filters.get('model_name'):
+        entries = entries.filter(model_name=filters['model_name'])
+    if filters.get('record_id'):
+        entries = entries.filter(record_id=filters['record_id'])
+    if filters.get('user'):
+        entries = entries.filter(user__username=filters['user'])
+    if filters.get('action'):
+        entries = entries.filter(action__startswith=filters['action'])
+    if filters.get('start'):
+        entries = entries.filter(timestamp__gte=filters['start'])
+    if filters.get('end'):
+        entries = entries.filter(timestamp__lte=filters['end'])
+
+    position = parse_cursor(cursor) if cursor else None
+    if position:
+        timestamp, entry_id = position
+        entries = entries.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=entry_id))
+
+    page = list(entries.order_by('-timestamp', '-id')[:page_size + 1])
+    next_cursor = make_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
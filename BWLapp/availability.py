@@ -0,0 +1,97 @@
+# BWLapp/availability.py
+"""
+In-memory stock availability for quote building.
+
+Each worker keeps one snapshot of every stock package's quantity on
+hand, price and availability, indexed by (product id, package type).
+The snapshot is tied to a version (shared_cache.get_version), a counter
+signals.py bumps after every committed Stock save or StockMovement (every
+quantity change writes one). With a shared cache lookups never touch the
+database; without one the counter is re-read at most once every
+VERSION_CHECK_SECONDS. The first lookup after a change rebuilds the
+snapshot with two queries, and every answer carries the version of the
+snapshot it came from.
+"""
+from django.db.models import Sum
+
+from .models import Stock, StockShard
+from .shared_cache import bump_version, get_version
+
+AVAILABILITY_VERSION_KEY = 'stock_availability_version'
+MAX_LINES = 500
+
+# This worker's snapshot and the version it was built for.
+_local_snapshot = {'version': None, 'snapshot': None}
+
+
+def get_availability_version():
+    return get_version(AVAILABILITY_VERSION_KEY)
+
+
+def invalidate_availability():
+    """Called after a stock quantity or price change commits."""
+    bump_version(AVAILABILITY_VERSION_KEY)
+
+
+def build_snapshot():
+    # Available packages first, so a pair listed twice resolves to one that can be sold.
+    rows = list(
+        Stock.objects.order_by('-is_available', 'pk')
+        .values_list('pk', 'product_id', 'package_type', 'quantity', 'price_per_package', 'is_available', 'shard_count')
+    )
+    sharded = [row[0] for row in rows if row[6]]
+    shard_totals = {}
+    if sharded:
+        totals = StockShard.objects.filter(stock_id__in=sharded).values('stock_id').annotate(total=Sum('quantity'))
+        shard_totals = {row['stock_id']: row['total'] or 0 for row in totals}
+    by_pair, entries = {}, {}
+    for pk, product_id, package_type, quantity, price, is_available, shard_count in rows:
+        by_pair.setdefault((product_id, package_type), pk)
+        entries[pk] = {
+            'stock_id': pk,
+            'available': shard_totals.get(pk, 0) if shard_count else quantity,
+            'price_per_package': str(price),
+            'is_available': is_available,
+        }
+    return {'by_pair': by_pair, 'entries': entries}
+
+
+def get_snapshot():
+    """Returns (version, snapshot), rebuilding the snapshot if the version moved."""
+    version = get_availability_version()
+    if _local_snapshot['version'] != version:
+        _local_snapshot.update(version=version, snapshot=build_snapshot())
+    return version, _local_snapshot['snapshot']
+
+
+# Package types are accepted by key ('6pack') or label ('6-Pack'), any case.
+PACKAGE_TYPES = {
+    name.lower(): key for key, label in Stock.PACKAGE_TYPE_CHOICES for name in (key, label)
+}
+
+
+def check_lines(lines):
+    """
+    Answers a list of {'product', 'package_type', 'quantity'?} lines from
+    one snapshot. Each answer echoes the line with the package's stock_id,
+    available quantity, price and is_available, and `sufficient` when a
+    quantity was asked for; unknown packages get an 'error' instead.
+    """
+    version, snapshot = get_snapshot()
+    by_pair, entries = snapshot['by_pair'], snapshot['entries']
+    results = []
+    for line in lines:
+        product = line.get('product')
+        package_type = PACKAGE_TYPES.get(str(line.get('package_type', '')).lower())
+        stock_id = by_pair.get((product, package_type)) if isinstance(product, int) else None
+        result = {'product': product, 'package_type': line.get('package_type')}
+        if stock_id is None:
+            result['error'] = "No such product and package type."
+        else:
+            result.update(entries[stock_id])
+            quantity = line.get('quantity')
+            if isinstance(quantity, int) and not isinstance(quantity, bool):
+                result['quantity'] = quantity
+                result['sufficient'] = result['is_available'] and result['available'] >= quantity
+        results.append(result)
+    return version, results
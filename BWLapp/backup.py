@@ -0,0 +1,330 @@
+# BWLapp/backup.py
+"""
+Chunked, compressed, checksummed backups.
+
+A backup is a directory holding a manifest.json and, per model, one or
+more gzipped JSON-lines chunks of fixture-style objects, read in primary
+key order with keyset pagination so memory stays flat. The manifest lists
+every chunk with its row count and SHA-256.
+
+Incremental backups name their base backup and only copy what changed
+since its high-water marks:
+
+- append-only tables (audit trail, stock movements, checkpoints): rows
+  above the highest primary key seen last time;
+- the customer ledger and the order archive: rows written since the last
+  backup started;
+- audited models: records with audit entries above the last audit id.
+  Those records that no longer exist are listed as deleted;
+- everything else is small and copied in full.
+
+Restoring replays the chain from the full backup forward, loading the
+tables of each dependency level in parallel.
+"""
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import outbox
+from .handlers import AUDITED_SAVES
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, ArchivedPayment, AuditTrail, CustomerLedger, StockCheckpoint, StockMovement,
+)
+from .seed import BulkLoader, reset_sequences, topological_levels
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+CHUNK_ROWS = 50000
+QUERY_BATCH = 2000
+
+# Rebuilt by migrate, or not worth keeping.
+EXCLUDED_MODELS = {'contenttypes.ContentType', 'auth.Permission', 'sessions.Session', 'admin.LogEntry'}
+APPEND_ONLY_MODELS = {AuditTrail, StockMovement, StockCheckpoint}
+# Models copied incrementally by a timestamp that moves whenever the row is written.
+CHANGED_SINCE = {
+    CustomerLedger: 'updated_at',
+    ArchivedOrder: 'archived_at',
+    ArchivedOrderItem: 'order__archived_at',
+    ArchivedPayment: 'order__archived_at',
+}
+AUDITED_MODEL_NAMES = {event.split('.', 1)[0] for event in AUDITED_SAVES}
+
+
+class BackupError(Exception):
+    pass
+
+
+def backed_up_models(labels=None):
+    """Concrete models to back up, optionally limited to the given 'app_label.Model' labels."""
+    models = [
+        model for model in apps.get_models()
+        if model._meta.managed and not model._meta.proxy and model._meta.label not in EXCLUDED_MODELS
+    ]
+    if labels:
+        wanted = {label.lower() for label in labels}
+        models = [model for model in models if model._meta.label.lower() in wanted]
+    return models
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as exc:
+        raise BackupError(f"No readable manifest in {path}: {exc}")
+    if manifest.get('format') != FORMAT_VERSION:
+        raise BackupError(f"{path} has unsupported backup format {manifest.get('format')!r}")
+    return manifest
+
+
+def latest_backup(root):
+    """The newest backup directory under `root`, or None."""
+    names = sorted(
+        name for name in os.listdir(root)
+        if os.path.isfile(os.path.join(root, name, MANIFEST_NAME))
+    ) if os.path.isdir(root) else []
+    return os.path.join(root, names[-1]) if names else None
+
+
+def current_marks():
+    """High-water marks an incremental backup taken later will start from."""
+    return {
+        'audit_id': AuditTrail.objects.aggregate(top=Max('id'))['top'] or 0,
+        'started_at': timezone.now().isoformat(),
+        'max_pk': {
+            model._meta.label: model.objects.aggregate(top=Max('pk'))['top'] or 0
+            for model in APPEND_ONLY_MODELS
+        },
+    }
+
+
+def _changed_record_ids(model, marks):
+    record_ids = (
+        AuditTrail.objects.filter(id__gt=marks['audit_id'], model_name=model.__name__)
+        .values_list('record_id', flat=True).distinct()
+    )
+    pk = model._meta.pk
+    return sorted({pk.to_python(record_id) for record_id in record_ids if record_id})
+
+
+def _iter_batches(queryset):
+    """Rows in primary key order, QUERY_BATCH at a time, paginated by keyset."""
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:QUERY_BATCH])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkWriter:
+    """Writes one model's fixture objects to gzipped JSONL files of at most `chunk_rows` lines."""
+
+    def __init__(self, directory, label, chunk_rows):
+        self.directory = directory
+        self.label = label
+        self.chunk_rows = chunk_rows
+        self.chunks = []
+        self.handle = None
+
+    def write(self, data):
+        if self.handle is not None and self.rows >= self.chunk_rows:
+            self._close_chunk()
+        if self.handle is None:
+            self.path = os.path.join(self.directory, f"{self.label}.{len(self.chunks):04d}.jsonl.gz")
+            self.handle = gzip.open(self.path, 'wt', encoding='utf-8')
+            self.rows = 0
+        self.handle.write(json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n')
+        self.rows += 1
+
+    def _close_chunk(self):
+        self.handle.close()
+        self.handle = None
+        self.chunks.append({
+            'file': os.path.basename(self.path),
+            'rows': self.rows,
+            'sha256': file_sha256(self.path),
+        })
+
+    def close(self):
+        if self.handle is not None:
+            self._close_chunk()
+        return self.chunks
+
+
+def write_backup(root, base=None, labels=None, chunk_rows=CHUNK_ROWS):
+    """
+    Writes a backup into a new timestamped directory under `root` and
+    returns its path. With `base` (a previous backup's path) the backup is
+    incremental relative to it.
+    """
+    base_manifest = read_manifest(base) if base else None
+    directory = os.path.join(root, timezone.now().strftime('%Y%m%dT%H%M%S'))
+    os.makedirs(directory)
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Every table is read from the same snapshot.
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        marks = current_marks()
+        manifest = {
+            'format': FORMAT_VERSION,
+            'created_at': marks['started_at'],
+            'kind': 'incremental' if base_manifest else 'full',
+            'base': os.path.basename(os.path.normpath(base)) if base_manifest else None,
+            'marks': marks,
+            'models': {},
+        }
+        for model in backed_up_models(labels):
+            manifest['models'][model._meta.label] = _back_up_model(
+                directory, model, base_manifest and base_manifest['marks'], chunk_rows,
+            )
+
+    with open(os.path.join(directory, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return directory
+
+
+def _back_up_model(directory, model, since, chunk_rows):
+    rows = model._base_manager.all()
+    mode, deleted = 'full', []
+    if since:
+        if model in APPEND_ONLY_MODELS:
+            mode, rows = 'appended', rows.filter(pk__gt=since['max_pk'].get(model._meta.label, 0))
+        elif model in CHANGED_SINCE:
+            since_time = parse_datetime(since['started_at'])
+            mode, rows = 'changed', rows.filter(**{f"{CHANGED_SINCE[model]}__gte": since_time})
+        elif model.__name__ in AUDITED_MODEL_NAMES:
+            changed = _changed_record_ids(model, since)
+            present = set()
+            for offset in range(0, len(changed), QUERY_BATCH):
+                present.update(rows.filter(pk__in=changed[offset:offset + QUERY_BATCH]).values_list('pk', flat=True))
+            mode, rows = 'changed', rows.filter(pk__in=sorted(present))
+            deleted = [pk for pk in changed if pk not in present]
+    writer = ChunkWriter(directory, model._meta.label, chunk_rows)
+    for batch in _iter_batches(rows):
+        for data in serializers.serialize('python', batch):
+            writer.write(data)
+    chunks = writer.close()
+    return {
+        'mode': mode,
+        'rows': sum(chunk['rows'] for chunk in chunks),
+        'chunks': chunks,
+        'deleted': deleted,
+    }
+
+
+# --- Restore ---
+
+def backup_chain(path):
+    """The backups to replay for `path`, oldest (the full one) first."""
+    chain = []
+    root = os.path.dirname(os.path.normpath(path))
+    while path:
+        manifest = read_manifest(path)
+        chain.append((path, manifest))
+        path = os.path.join(root, manifest['base']) if manifest['base'] else None
+        if len(chain) > 1000:
+            raise BackupError("Backup chain does not end in a full backup")
+    return list(reversed(chain))
+
+
+def verify(path, manifest):
+    """Checks every chunk against its manifest checksum; raises BackupError on a mismatch."""
+    for label, entry in manifest['models'].items():
+        for chunk in entry['chunks']:
+            try:
+                digest = file_sha256(os.path.join(path, chunk['file']))
+            except OSError as exc:
+                raise BackupError(f"{label}: {exc}")
+            if digest != chunk['sha256']:
+                raise BackupError(f"{label}: checksum mismatch in {chunk['file']}")
+
+
+def _restore_model(path, model, entry, batch_size):
+    close_old_connections()
+    try:
+        with transaction.atomic(), outbox.suppressed():
+            loader = BulkLoader(batch_size=batch_size, upsert=True)
+            for chunk in entry['chunks']:
+                with gzip.open(os.path.join(path, chunk['file']), 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        loader.add(json.loads(line))
+            loader.finish()
+        return entry['rows']
+    finally:
+        connection.close()
+
+
+def _apply_deletions(models, batch_size):
+    """
+    Deletes the rows an incremental backup lists as gone, dependents first.
+    This runs after every table is loaded, so rows that were moved to another
+    parent (e.g. orders of a merged customer) are re-pointed before the old
+    parent's cascade could take them along.
+    """
+    with transaction.atomic(), outbox.suppressed():
+        for level in reversed(topological_levels(models)):
+            for model in level:
+                deleted = models[model]['deleted']
+                for offset in range(0, len(deleted), batch_size):
+                    model._base_manager.filter(pk__in=deleted[offset:offset + batch_size]).delete()
+
+
+def restore_backup(path, workers=4, batch_size=1000, progress=None):
+    """
+    Restores `path` (and the backups it builds on) into the current
+    database. Tables in the same dependency level load in parallel.
+    Returns {label: rows} for the rows written.
+    """
+    chain = backup_chain(path)
+    if chain[0][1]['kind'] != 'full':
+        raise BackupError("Backup chain does not start with a full backup")
+    for backup_path, manifest in chain:
+        verify(backup_path, manifest)
+    if connection.vendor == 'sqlite':
+        workers = 1  # SQLite allows one writer at a time.
+
+    totals = {}
+    restored_models = set()
+    for backup_path, manifest in chain:
+        models = {apps.get_model(label): entry for label, entry in manifest['models'].items()}
+        restored_models.update(models)
+        for level in topological_levels(models):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    model: pool.submit(_restore_model, backup_path, model, models[model], batch_size)
+                    for model in level
+                }
+                for model, future in futures.items():
+                    rows = future.result()
+                    totals[model._meta.label] = totals.get(model._meta.label, 0) + rows
+                    if progress:
+                        progress(os.path.basename(backup_path), model._meta.label, rows)
+        _apply_deletions(models, batch_size)
+
+    reset_sequences(restored_models)
+    return totals
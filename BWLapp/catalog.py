@@ -0,0 +1,129 @@
+# BWLapp/catalog.py
+import re
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import Stock, StockShard
+from .shared_cache import bump_version, get_version
+
+CATALOG_CACHE_KEY = 'stock_catalog'
+CATALOG_VERSION_KEY = 'stock_catalog_version'
+CATALOG_TIMEOUT = 60 * 60
+# Prefixes longer than this are matched by scanning the (already small) candidate set.
+MAX_PREFIX_LENGTH = 8
+
+# This worker's unpickled copy, reused until the version changes.
+_local_catalog = {'version': None, 'catalog': None}
+
+
+def _tokens(text):
+    return [t for t in re.split(r'[^0-9a-z]+', text.lower()) if t]
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog():
+    """Called after a Stock or Product row change commits."""
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def stock_label(stock):
+    return f"{stock.product.name} - {stock.get_package_type_display()} (K{stock.price_per_package})"
+
+
+def build_catalog():
+    """
+    Loads every available stock package once and indexes it by the prefixes
+    of each word in the product name and package type.
+    """
+    entries = {}
+    index = defaultdict(list)
+    stocks = (
+        Stock.objects.filter(is_available=True)
+        .select_related('product')
+        .order_by('product__name', 'package_type')
+    )
+    for stock in stocks:
+        entries[stock.pk] = {
+            'id': stock.pk,
+            'product': stock.product.name,
+            'package_type': stock.get_package_type_display(),
+            'price': str(stock.price_per_package),
+            'label': stock_label(stock),
+            'tokens': _tokens(f"{stock.product.name} {stock.get_package_type_display()}"),
+        }
+        for token in set(entries[stock.pk]['tokens']):
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                index[token[:length]].append(stock.pk)
+    return {'entries': entries, 'index': dict(index)}
+
+
+def get_catalog():
+    version = get_catalog_version()
+    if _local_catalog['version'] == version:
+        return _local_catalog['catalog']
+    key = f"{CATALOG_CACHE_KEY}:{version}"
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = build_catalog()
+        cache.set(key, catalog, CATALOG_TIMEOUT)
+    _local_catalog.update(version=version, catalog=catalog)
+    return catalog
+
+
+def get_entry(stock_id):
+    try:
+        return get_catalog()['entries'].get(int(stock_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def live_quantities(stock_ids):
+    """Current quantity on hand for a handful of stock IDs (two queries at most)."""
+    quantities = {}
+    sharded = []
+    for pk, quantity, shard_count in Stock.objects.filter(pk__in=stock_ids).values_list('pk', 'quantity', 'shard_count'):
+        quantities[pk] = quantity
+        if shard_count:
+            sharded.append(pk)
+    if sharded:
+        totals = StockShard.objects.filter(stock_id__in=sharded).values('stock_id').annotate(total=Sum('quantity'))
+        quantities.update({row['stock_id']: row['total'] or 0 for row in totals})
+    return quantities
+
+
+def search_catalog(query, limit=20):
+    """
+    Returns up to `limit` catalog entries whose words start with every word
+    in `query`, each with its live available quantity.
+    """
+    terms = _tokens(query)
+    if not terms:
+        return []
+    catalog = get_catalog()
+    entries, index = catalog['entries'], catalog['index']
+
+    matches = None
+    for term in terms:
+        candidates = set(index.get(term[:MAX_PREFIX_LENGTH], ()))
+        if len(term) > MAX_PREFIX_LENGTH:
+            candidates = {
+                pk for pk in candidates
+                if any(token.startswith(term) for token in entries[pk]['tokens'])
+            }
+        matches = candidates if matches is None else matches & candidates
+        if not matches:
+            return []
+
+    ordered = sorted(matches, key=lambda pk: entries[pk]['label'])[:limit]
+    quantities = live_quantities(ordered)
+    results = []
+    for pk in ordered:
+        entry = {k: v for k, v in entries[pk].items() if k != 'tokens'}
+        entry['available'] = quantities.get(pk, 0)
+        results.append(entry)
+    return results
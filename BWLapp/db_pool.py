@@ -0,0 +1,34 @@
+# BWLapp/db_pool.py
+from django.db import connections
+
+
+def get_pool(alias='default'):
+    """
+    Returns the psycopg connection pool for a database alias, or None when
+    pooling is disabled (or the backend is not PostgreSQL).
+    """
+    return getattr(connections[alias], 'pool', None)
+
+
+def pool_stats(alias='default'):
+    """
+    Returns the pool counters plus the derived wait-time and saturation
+    figures we watch when tuning DB_POOL_MAX_SIZE.
+    """
+    pool = get_pool(alias)
+    if pool is None:
+        return {'enabled': False}
+
+    stats = pool.get_stats()
+    pool_max = stats.get('pool_max') or 1
+    in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+    requests_num = stats.get('requests_num', 0)
+
+    stats.update({
+        'enabled': True,
+        'in_use': in_use,
+        # 1.0 means every connection is checked out and new requests queue up.
+        'saturation': round(in_use / pool_max, 3),
+        'avg_wait_ms': round(stats.get('requests_wait_ms', 0) / requests_num, 3) if requests_num else 0,
+    })
+    return stats
@@ -0,0 +1,421 @@
+# BWLapp/documents.py
+"""
+Printable receipts, invoices and customer statements.
+
+Documents are built in two steps: the data for a batch is loaded with a few
+bulk queries into plain dicts, then each dict is rendered to PDF by a pure
+function. Rendering needs no database access, so batches can be fanned out
+over a process pool. Rendered files are cached in default storage under a
+digest of their data, so an unchanged payment/order is never rendered twice.
+A change gives a document a new digest; purge_documents() deletes the
+versions left behind, and any cached file older than a cutoff.
+"""
+import hashlib
+import json
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from .archive import reaches_archive
+from .models import ArchivedOrder, ArchivedPayment, Customer, Order, OrderItem, Payment
+
+COMPANY_NAME = "BWL Wholesale"
+DOCUMENT_KINDS = ('receipt', 'invoice', 'statement')
+STORAGE_PREFIX = 'documents'
+
+# --- 1. Minimal PDF writer ---
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+FONT_SIZE = 9
+LEADING = 13
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+
+def _pdf_text(text):
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def render_pdf(lines):
+    """
+    Renders text lines to a PDF using the built-in Courier fonts, so columns
+    line up without measuring glyphs. Lines starting with '# ' are bold.
+    """
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+    # Objects 1-4 are the catalog, page tree and two fonts; each page then adds a page and a content stream.
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold >>"]
+    page_refs = []
+    for page_lines in pages:
+        ops = [f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td"]
+        for line in page_lines:
+            font = '/F2' if line.startswith('# ') else '/F1'
+            text = line[2:] if line.startswith('# ') else line
+            ops.append(f"{font} {FONT_SIZE} Tf ({_pdf_text(text)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, content_ref)
+        )
+        page_refs.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % ref for ref in page_refs), len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+# --- 2. Document layouts (pure functions of the loaded data) ---
+
+
+def _money(value):
+    return f"K{Decimal(value):,.2f}"
+
+
+def _item_lines(items):
+    lines = [f"{'Item':<40}{'Qty':>6}{'Each':>14}{'Total':>16}", "-" * 76]
+    for item in items:
+        lines.append(f"{item['label'][:40]:<40}{item['quantity']:>6}{_money(item['price_each']):>14}{_money(item['total']):>16}")
+    return lines
+
+
+def receipt_lines(doc):
+    return [
+        f"# {COMPANY_NAME}",
+        f"# Payment Receipt #{doc['payment_id']}",
+        "",
+        f"Date:       {doc['payment_date'][:16].replace('T', ' ')}",
+        f"Customer:   {doc['customer']}",
+        f"Order:      #{doc['order_id']}",
+        f"Method:     {doc['method']}",
+        f"Processed:  {doc['processed_by'] or '-'}",
+        "",
+        *_item_lines(doc['items']),
+        "",
+        f"# {'Amount paid:':<60}{_money(doc['total_amount']):>16}",
+        "",
+        "Thank you for your payment!",
+    ]
+
+
+def invoice_lines(doc):
+    return [
+        f"# {COMPANY_NAME}",
+        f"# Invoice for Order #{doc['order_id']}",
+        "",
+        f"Date:       {doc['order_date'][:10]}",
+        f"Customer:   {doc['customer']}",
+        f"Email:      {doc['email']}",
+        f"Status:     {doc['status']}",
+        "",
+        *_item_lines(doc['items']),
+        "",
+        f"# {'Total due:':<60}{_money(doc['total']):>16}",
+        f"{'Paid:':<62}{_money(doc['paid']):>16}",
+        f"{'Balance:':<62}{_money(Decimal(doc['total']) - Decimal(doc['paid'])):>16}",
+    ]
+
+
+def statement_lines(doc):
+    lines = [
+        f"# {COMPANY_NAME}",
+        f"# Statement for {doc['customer']}",
+        f"Period: {doc['start'][:10]} to {doc['end'][:10]}",
+        "",
+        f"{'Date':<12}{'Description':<30}{'Charges':>12}{'Payments':>12}{'Balance':>12}",
+        "-" * 78,
+        f"{'':<12}{'Opening balance':<30}{'':>12}{'':>12}{_money(doc['opening_balance']):>12}",
+    ]
+    balance = Decimal(doc['opening_balance'])
+    for entry in doc['entries']:
+        balance += Decimal(entry['charge']) - Decimal(entry['payment'])
+        lines.append(
+            f"{entry['date'][:10]:<12}{entry['description'][:30]:<30}"
+            f"{_money(entry['charge']) if Decimal(entry['charge']) else '':>12}"
+            f"{_money(entry['payment']) if Decimal(entry['payment']) else '':>12}"
+            f"{_money(balance):>12}"
+        )
+    lines += ["", f"# {'Closing balance:':<64}{_money(balance):>12}"]
+    return lines
+
+
+LAYOUTS = {
+    'receipt': receipt_lines,
+    'invoice': invoice_lines,
+    'statement': statement_lines,
+}
+
+
+def render_document(doc):
+    """Renders one loaded document; safe to call in a worker process."""
+    return render_pdf(LAYOUTS[doc['kind']](doc))
+
+# --- 3. Bulk data loading ---
+
+
+def _finish(doc):
+    """Stamps a document with its version digest and storage name."""
+    payload = json.dumps(doc, cls=DjangoJSONEncoder, sort_keys=True)
+    doc['version'] = hashlib.sha1(payload.encode()).hexdigest()[:16]
+    doc['filename'] = f"{doc['kind']}-{doc['object_id']}.pdf"
+    doc['storage_name'] = f"{STORAGE_PREFIX}/{doc['kind']}/{doc['object_id']}-{doc['version']}.pdf"
+    return doc
+
+
+def _items_prefetch():
+    return Prefetch('items', queryset=OrderItem.objects.select_related('stock_item__product').order_by('pk'))
+
+
+def _serialize_items(order):
+    return [{
+        'label': f"{item.stock_item.product.name} ({item.stock_item.get_package_type_display()})",
+        'quantity': item.quantity,
+        'price_each': str(item.price_each or 0),
+        'total': str(item.quantity * (item.price_each or 0)),
+    } for item in order.items.all()]
+
+
+def load_receipts(payment_ids):
+    payments = (
+        Payment.objects.filter(pk__in=payment_ids)
+        .select_related('order__customer', 'processed_by')
+        .prefetch_related(Prefetch('order__items', queryset=OrderItem.objects.select_related('stock_item__product').order_by('pk')))
+        .order_by('pk')
+    )
+    return [_finish({
+        'kind': 'receipt',
+        'object_id': p.pk,
+        'payment_id': p.pk,
+        'payment_date': p.payment_date.isoformat(),
+        'order_id': p.order.pk,
+        'customer': p.order.customer.name,
+        'method': p.method,
+        'processed_by': p.processed_by.username if p.processed_by else '',
+        'total_amount': str(p.total_amount),
+        'items': _serialize_items(p.order),
+    }) for p in payments]
+
+
+def load_invoices(order_ids):
+    orders = (
+        Order.objects.filter(pk__in=order_ids)
+        .select_related('customer')
+        .prefetch_related(_items_prefetch(), 'payment_set')
+        .order_by('pk')
+    )
+    docs = []
+    for order in orders:
+        items = _serialize_items(order)
+        docs.append(_finish({
+            'kind': 'invoice',
+            'object_id': order.pk,
+            'order_id': order.pk,
+            'order_date': order.order_date.isoformat(),
+            'customer': order.customer.name,
+            'email': order.customer.email,
+            'status': order.status,
+            'items': items,
+            'total': str(sum((Decimal(i['total']) for i in items), Decimal('0'))),
+            'paid': str(sum((p.total_amount for p in order.payment_set.all()), Decimal('0'))),
+        }))
+    return docs
+
+
+def _order_value(order):
+    return sum((item.quantity * (item.price_each or 0) for item in order.items.all()), Decimal('0'))
+
+
+def load_statements(customer_ids, start, end):
+    """
+    Customer statements for orders and payments between `start` and `end`.
+    Cancelled and returned orders are left out with their payments, as in
+    CustomerLedger, so the closing balance matches the ledger's.
+    """
+    closed = Order.CLOSED_STATUSES
+    customers = Customer.objects.filter(pk__in=customer_ids).order_by('pk').prefetch_related(
+        Prefetch('order_set', queryset=Order.objects.filter(order_date__lte=end).exclude(status__in=closed)
+                 .prefetch_related('items', Prefetch('payment_set', queryset=Payment.objects.filter(payment_date__lte=end)))),
+        # Archived orders still make up the opening balance.
+        Prefetch('archived_orders', queryset=ArchivedOrder.objects.filter(order_date__lte=end).exclude(status__in=closed)
+                 .prefetch_related('items', Prefetch('payment_set', queryset=ArchivedPayment.objects.filter(payment_date__lte=end)))),
+    )
+    docs = []
+    for customer in customers:
+        opening = Decimal('0')
+        entries = []
+        for order in [*customer.archived_orders.all(), *customer.order_set.all()]:
+            value = _order_value(order)
+            if order.order_date < start:
+                opening += value
+            else:
+                entries.append({'date': order.order_date.isoformat(), 'description': f"Order #{order.pk}",
+                                'charge': str(value), 'payment': '0'})
+            for payment in order.payment_set.all():
+                if payment.payment_date < start:
+                    opening -= payment.total_amount
+                else:
+                    entries.append({'date': payment.payment_date.isoformat(),
+                                    'description': f"Payment #{payment.pk} ({payment.method})",
+                                    'charge': '0', 'payment': str(payment.total_amount)})
+        entries.sort(key=lambda e: e['date'])
+        docs.append(_finish({
+            'kind': 'statement',
+            'object_id': f"{customer.pk}-{start:%Y%m%d}-{end:%Y%m%d}",
+            'customer': customer.name,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'opening_balance': str(opening),
+            'entries': entries,
+        }))
+    return docs
+
+
+def select_ids(kind, start, end):
+    """IDs of the objects that have a document of `kind` in the date range."""
+    if kind == 'receipt':
+        return Payment.objects.filter(payment_date__range=(start, end)).order_by('pk').values_list('pk', flat=True)
+    if kind == 'invoice':
+        return Order.objects.filter(order_date__range=(start, end)).order_by('pk').values_list('pk', flat=True)
+    active = Q(order__order_date__range=(start, end)) | Q(order__payment__payment_date__range=(start, end))
+    if reaches_archive(start) or reaches_archive(start, 'payment_date'):
+        active |= Q(archived_orders__order_date__range=(start, end))
+        active |= Q(archived_orders__payment_set__payment_date__range=(start, end))
+    return Customer.objects.filter(active).distinct().order_by('pk').values_list('pk', flat=True)
+
+
+def load_documents(kind, ids, start=None, end=None):
+    if kind == 'receipt':
+        return load_receipts(ids)
+    if kind == 'invoice':
+        return load_invoices(ids)
+    return load_statements(ids, start, end)
+
+
+def date_range(start_date, end_date):
+    """Turns two dates into an aware [start of day, end of day] range."""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start_date, time.min), tz),
+        timezone.make_aware(datetime.combine(end_date, time.max), tz),
+    )
+
+# --- 4. Caching, batching and ZIP streaming ---
+
+
+def get_or_render(doc):
+    """Returns the PDF bytes for one document, rendering and caching on a miss."""
+    if default_storage.exists(doc['storage_name']):
+        with default_storage.open(doc['storage_name'], 'rb') as f:
+            return f.read()
+    content = render_document(doc)
+    default_storage.save(doc['storage_name'], ContentFile(content))
+    return content
+
+
+def iter_documents(kind, ids, start=None, end=None, workers=1, chunk_size=200):
+    """
+    Yields (filename, pdf_bytes) for every object in `ids`. Data is loaded in
+    chunks; cache misses in each chunk are rendered across `workers` processes.
+    """
+    ids = list(ids)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for offset in range(0, len(ids), chunk_size):
+            docs = load_documents(kind, ids[offset:offset + chunk_size], start, end)
+            missing = [doc for doc in docs if not default_storage.exists(doc['storage_name'])]
+            if pool:
+                contents = pool.map(render_document, missing, chunksize=max(1, len(missing) // (workers * 4)))
+            else:
+                contents = map(render_document, missing)
+            rendered = {}
+            for doc, content in zip(missing, contents):
+                default_storage.save(doc['storage_name'], ContentFile(content))
+                rendered[doc['storage_name']] = content
+            for doc in docs:
+                content = rendered.get(doc['storage_name'])
+                yield doc['filename'], content if content is not None else get_or_render(doc)
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def purge_documents(cutoff):
+    """
+    Deletes cached PDFs superseded by a newer version of the same document,
+    and any saved before `cutoff` (re-rendered if asked for again).
+    Returns the number of files deleted.
+    """
+    deleted = 0
+    for kind in DOCUMENT_KINDS:
+        directory = f"{STORAGE_PREFIX}/{kind}"
+        try:
+            _, names = default_storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        versions = {}
+        for name in names:
+            path = f"{directory}/{name}"
+            versions.setdefault(name.rsplit('-', 1)[0], []).append((default_storage.get_modified_time(path), path))
+        for saved in versions.values():
+            saved.sort(reverse=True)
+            for index, (modified, path) in enumerate(saved):
+                if index or modified < cutoff:
+                    default_storage.delete(path)
+                    deleted += 1
+    return deleted
+
+
+class _ZipStream:
+    """Write-only buffer that lets zipfile write to a generator."""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files):
+    """
+    Yields a ZIP archive chunk by chunk from (filename, bytes) pairs, so the
+    whole archive never has to sit in memory.
+    """
+    buffer = _ZipStream()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in files:
+            archive.writestr(filename, content)
+            yield buffer.drain()
+    yield buffer.drain()
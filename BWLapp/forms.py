@@ -1,7 +1,167 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from .models import CustomUser, Order, OrderItem, Payment, Product, Category, Stock
 from django.contrib.auth import get_user_model
+from django.urls import reverse_lazy
+from .catalog import get_entry, stock_label
+
+
+class StockAutocompleteWidget(forms.Widget):
+    """
+    Hidden stock ID plus a search box backed by the stock autocomplete
+    endpoint. Unlike a Select, it never iterates the field's choices, so the
+    page size does not grow with the catalog. The selected package's label
+    comes from the form's ChoiceCache when it has one (one query for the
+    packages on the page), else from the stock catalog.
+    """
+    template_name = 'BWLapp/widgets/stock_autocomplete.html'
+
+    def __init__(self, url=reverse_lazy('stock-autocomplete'), placeholder="Search products...", attrs=None):
+        super().__init__(attrs)
+        self.url = url
+        self.placeholder = placeholder
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        label = self.selected_label(value) if value else None
+        context['widget'].update({
+            'url': str(self.url),
+            'placeholder': self.placeholder,
+            'label': label or (f"Stock #{value}" if value else ''),
+        })
+        return context
+
+    def selected_label(self, value):
+        # ModelChoiceField hands its widget the choice iterator, which knows the field.
+        field = getattr(getattr(self, 'choices', None), 'field', None)
+        if getattr(field, 'choice_cache', None) is not None:
+            stock = field.choice_cache.get(field.cache_key, field.queryset, value)
+            return stock_label(stock) if stock else None
+        entry = get_entry(value)
+        return entry['label'] if entry else None
+
+
+class ChoiceCache:
+    """
+    Per-request store of evaluated choice querysets. Pass one instance to
+    every form in a formset (via `form_kwargs`) and each CachedModelChoiceField
+    queryset is evaluated once, however many forms render or validate it.
+
+    Fields whose widget never lists the choices (StockAutocompleteWidget)
+    register the values their forms hold with want() instead, and the first
+    get() loads just those rows, so the work doesn't grow with the table.
+    """
+    def __init__(self):
+        self._objects = {}
+        self._lookups = {}
+        self._wanted = {}
+
+    def objects(self, key, queryset):
+        if key not in self._objects:
+            self._objects[key] = list(queryset)
+        return self._objects[key]
+
+    def lookup(self, key, queryset, to_field_name=None):
+        """Returns {str(pk or to_field value): object} for the cached rows."""
+        if key not in self._lookups:
+            attr = to_field_name or 'pk'
+            self._lookups[key] = {str(getattr(obj, attr)): obj for obj in self.objects(key, queryset)}
+        return self._lookups[key]
+
+    def want(self, key, value):
+        """Registers a value get() will be asked for, making `key` load by value."""
+        wanted = self._wanted.setdefault(key, set())
+        if value not in (None, ''):
+            wanted.add(str(value))
+
+    def get(self, key, queryset, value, to_field_name=None):
+        """The row whose pk (or to_field value) is `value`, or None."""
+        if key not in self._wanted:
+            return self.lookup(key, queryset, to_field_name).get(str(value))
+        loaded = self._lookups.setdefault(key, {})
+        self._wanted[key].add(str(value))
+        pending = self._wanted[key] - loaded.keys()
+        if pending:
+            attr = to_field_name or queryset.model._meta.pk.name
+            field = queryset.model._meta.get_field(attr)
+            valid = []
+            for raw in pending:
+                loaded[raw] = None  # Stays None unless the query finds it.
+                try:
+                    valid.append(field.to_python(raw))
+                except ValidationError:
+                    pass
+            if valid:
+                loaded.update((str(k), obj) for k, obj in queryset.in_bulk(valid, field_name=attr).items())
+        return loaded[str(value)]
+
+
+class CachedModelChoiceIterator(forms.models.ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.cached_objects():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.cached_objects()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.cached_objects())
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField that renders and validates against a shared ChoiceCache
+    when its form was given one, and behaves like the stock field otherwise.
+    """
+    iterator = CachedModelChoiceIterator
+    choice_cache = None
+    cache_key = None
+
+    def cached_objects(self):
+        if self.choice_cache is None:
+            return self.queryset.all()
+        return self.choice_cache.objects(self.cache_key, self.queryset)
+
+    def to_python(self, value):
+        if self.choice_cache is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            value = getattr(value, self.to_field_name or 'pk')
+        obj = self.choice_cache.get(self.cache_key, self.queryset, value, self.to_field_name)
+        if obj is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
+
+class SharedChoicesMixin:
+    """Accepts a `choice_cache` kwarg and hands it to the form's cached choice fields."""
+    def __init__(self, *args, choice_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            if isinstance(field, CachedModelChoiceField):
+                field.choice_cache = choice_cache
+                field.cache_key = f"{type(self).__name__}.{name}"
+                if choice_cache is not None and not isinstance(field.widget, forms.widgets.ChoiceWidget):
+                    # Only the chosen rows are ever needed: the submitted one, or the saved one.
+                    choice_cache.want(field.cache_key, self[name].value())
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # A cached field already found the row among its choices, so skip the
+        # model's per-instance foreign key lookup for it.
+        for name, field in self.fields.items():
+            if isinstance(field, CachedModelChoiceField) and field.choice_cache is not None:
+                exclude.add(name)
+        return exclude
 
 
 class RegisterForm(UserCreationForm):
@@ -21,15 +181,24 @@ class LoginForm(AuthenticationForm):
     password = forms.CharField(widget=forms.PasswordInput)
     
     
-class OrderForm(forms.ModelForm):
+class OrderForm(SharedChoicesMixin, forms.ModelForm):
     """
     Form for creating or updating an order.
     """
     class Meta:
         model = Order
         fields = ['customer', 'status', 'created_by']
+        field_classes = {
+            'customer': CachedModelChoiceField,
+            'created_by': CachedModelChoiceField,
+        }
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        Order.check_transition(self.instance.status if self.instance.pk else None, status)
+        return status
         
-class OrderItemForm(forms.ModelForm):
+class OrderItemForm(SharedChoicesMixin, forms.ModelForm):
     """
     Form for creating or updating an order item.
     
@@ -38,11 +207,12 @@ class OrderItemForm(forms.ModelForm):
     """
     
     # Custom ModelChoiceField for better display and filtering
-    stock_item = forms.ModelChoiceField(
+    stock_item = CachedModelChoiceField(
         # ✅ CRITICAL UPDATE: Filter to show ONLY available stock items
         queryset=Stock.objects.filter(is_available=True).select_related('product').all(),
         label="Product Package",
-        empty_label="Select a Package" 
+        empty_label="Select a Package",
+        widget=StockAutocompleteWidget(),
     )
 
     class Meta:
@@ -50,6 +220,18 @@ class OrderItemForm(forms.ModelForm):
         fields = ['stock_item', 'quantity'] 
         # 'price_each' is intentionally omitted here to be set programmatically
 
+
+class OrderItemInlineFormSet(forms.BaseInlineFormSet):
+    """An order's lines. Those of a cancelled or returned order can't change."""
+    def clean(self):
+        super().clean()
+        if not self.instance.pk or not self.has_changed():
+            return
+        # Read from the table: the order form may already have put the submitted status on the instance.
+        status = Order.objects.filter(pk=self.instance.pk).values_list('status', flat=True).first()
+        if status in Order.CLOSED_STATUSES:
+            raise forms.ValidationError(f"This order is {status.lower()}; its items can't change.")
+
         
 PAYMENT_METHOD_CHOICES = (
     ('Credit Card', 'Credit Card'),
@@ -63,22 +245,40 @@ AVAILABILITY_CHOICES = (
     (False, 'No'),
 )
 
-class PaymentForm(forms.ModelForm):
+class PaymentForm(SharedChoicesMixin, forms.ModelForm):
     """
     Form for creating or updating a payment.
     """
     class Meta:
         model = Payment
         fields = ['order', 'method', 'processed_by']
+        field_classes = {
+            'order': CachedModelChoiceField,
+            'processed_by': CachedModelChoiceField,
+        }
         widgets = {
             'method': forms.Select(choices=PAYMENT_METHOD_CHOICES),
         }
 
-class ProductForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Order.__str__ reads the customer name; load it with the choices.
+        self.fields['order'].queryset = self.fields['order'].queryset.select_related('customer')
+
+class StatementUploadForm(forms.Form):
+    """
+    Upload of a bank or mobile-money statement CSV with at least date and
+    amount columns (reference, payer and phone are used when present).
+    """
+    file = forms.FileField(help_text="CSV export of the statement")
+    method = forms.ChoiceField(choices=PAYMENT_METHOD_CHOICES, initial='Online Transfer',
+                               help_text="Payment method recorded on the confirmed payments")
+
+class ProductForm(SharedChoicesMixin, forms.ModelForm):
     """
     Form for creating or updating a Product instance, including all fields.
     """
-    category = forms.ModelChoiceField(
+    category = CachedModelChoiceField(
         queryset=Category.objects.all(),
         label="Category",
         empty_label="Select a Category",
@@ -114,6 +314,9 @@ class StockForm(forms.ModelForm):
         
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if self.instance.pk and self.instance.shard_count:
+            # The quantity column lags behind sales on sharded stock; show the shard total.
+            self.initial['quantity'] = self.instance.available_quantity
         # Add basic form styling (recommended practice for all forms)
         for field_name, field in self.fields.items():
             # Apply 'form-control' to non-select and non-checkbox fields
@@ -0,0 +1,118 @@
+# BWLapp/handlers.py
+"""
+Outbox handlers: the side effects of model changes, run by the run_outbox
+dispatcher instead of inside the request. Event types are
+'<Model>.saved' and '<Model>.deleted'; see signals.py for the payload.
+"""
+from . import audit, outbox
+from .models import AuditTrail, CustomerLedger, Notification, Order, Stock
+
+LOW_STOCK_THRESHOLD = 10
+
+AUDITED_SAVES = ['Product.saved', 'Customer.saved', 'Order.saved', 'OrderItem.saved', 'Payment.saved', 'CustomUser.saved']
+AUDITED_DELETES = ['Product.deleted', 'Customer.deleted', 'Order.deleted', 'OrderItem.deleted', 'Payment.deleted']
+LEDGER_EVENTS = [
+    'Order.saved', 'Order.deleted',
+    'OrderItem.saved', 'OrderItem.deleted',
+    'Payment.saved', 'Payment.deleted',
+]
+
+
+def _model_name(event):
+    return event.event_type.split('.', 1)[0]
+
+
+# --- Audit trail ---
+
+@outbox.handler(*AUDITED_SAVES)
+def write_audit_entry(event):
+    """
+    Creates store a full snapshot; updates store only the changed fields,
+    plus a snapshot every AUDIT_SNAPSHOT_INTERVAL entries, rebuilt from the
+    log itself since the row may have changed again by now.
+    """
+    payload = event.payload
+    model_name = _model_name(event)
+    record_id = str(payload['record_id'])
+    values, is_snapshot = payload['values'], payload['created']
+    if not is_snapshot and audit.needs_snapshot(model_name, record_id):
+        state = audit.reconstruct(model_name, record_id)
+        if state is not None:
+            state.update(values)
+            values, is_snapshot = state, True
+
+    AuditTrail.objects.create(
+        user_id=payload['user_id'],
+        action=f"Created {model_name}" if payload['created'] else f"Updated {model_name}",
+        model_name=model_name,
+        record_id=record_id,
+        is_snapshot=is_snapshot,
+        details=audit.to_json(values),
+        timestamp=event.created_at,
+    )
+
+
+@outbox.handler(*AUDITED_DELETES)
+def write_delete_audit_entry(event):
+    model_name = _model_name(event)
+    AuditTrail.objects.create(
+        user=None,  # Deletion signals don't carry the user.
+        action=f"Deleted {model_name}",
+        model_name=model_name,
+        record_id=str(event.payload['record_id']),
+        is_snapshot=True,
+        details=audit.to_json(event.payload['values']),
+        timestamp=event.created_at,
+    )
+
+
+# --- Customer ledger ---
+
+@outbox.handler(*LEDGER_EVENTS)
+def refresh_customer_ledger(event):
+    """
+    Recomputes the ledger of the order's customer, and of the customer a
+    save moved the order (or an item or payment) away from. Every line of a
+    50-line order emits an event; all but the last skip the current
+    customer, whom the last one refreshes.
+    """
+    refs = event.payload.get('refs', {})
+    customer_ids = {refs.get('previous_customer_id')} - {None}
+    order_ids = {refs.get('previous_order_id')} - {None}
+    if not outbox.has_later_pending(event, LEDGER_EVENTS):
+        customer_ids.add(refs.get('customer_id'))
+        order_ids.add(refs.get('order_id'))
+    order_ids.discard(None)
+    if order_ids:
+        customer_ids.update(Order.objects.filter(pk__in=order_ids).values_list('customer_id', flat=True))
+    customer_ids.discard(None)
+    if customer_ids:
+        CustomerLedger.refresh(customer_ids)
+
+
+# --- Notifications ---
+
+def post_low_stock_notification(stock):
+    """
+    Posts an unread notification for a package below LOW_STOCK_THRESHOLD,
+    unless one is already waiting. Returns True if one was posted.
+    """
+    remaining = stock.available_quantity
+    if remaining >= LOW_STOCK_THRESHOLD:
+        return False
+    prefix = f"Low stock: {stock.product.name} - {stock.get_package_type_display()} [ID:{stock.pk}]"
+    if Notification.objects.filter(is_read=False, message__startswith=prefix).exists():
+        return False
+    Notification.objects.create(message=f"{prefix} has {remaining} left."[:255])
+    return True
+
+
+@outbox.handler('OrderItem.saved')
+def notify_low_stock(event):
+    """Checks the package a sale took stock from."""
+    values = event.payload['values']
+    if 'quantity' not in values and 'stock_item_id' not in values:
+        return
+    stock = Stock.objects.select_related('product').filter(pk=event.payload['refs'].get('stock_item_id')).first()
+    if stock is not None:
+        post_low_stock_notification(stock)
@@ -0,0 +1,71 @@
+# BWLapp/identity.py
+"""
+Cached request identity.
+
+AuthenticationMiddleware asks the session's backend for the user on
+every authenticated request, including each notification poll and
+search keystroke. CachedModelBackend answers from the cache: one entry
+per user holds the user with its profile already attached, so neither
+the user row nor `request.user.profile` costs a query.
+
+That is only safe when every process sees the same cache (REDIS_URL).
+With the default per-process LocMemCache, a save in one worker could not
+reach the copies in the others, which would go on accepting a
+deactivated user, a demoted role or an old password. There the backend
+reads the database on every request, exactly like ModelBackend.
+
+Each user also has a version number in the cache, which signals.py bumps
+after every committed CustomUser or Profile save or delete. An entry is
+stored with the version it was built under and ignored once the version
+moves, so a request that read the user just before a change can't leave
+a stale copy behind. Both are fetched with a single get_many().
+"""
+import time
+
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .models import CustomUser
+from .shared_cache import cache_is_shared
+
+IDENTITY_TIMEOUT = 60 * 60
+
+
+def _keys(user_id):
+    return f'identity:{user_id}', f'identity_version:{user_id}'
+
+
+def invalidate_identity(user_id):
+    """Called after a user or their profile changes."""
+    _, version_key = _keys(user_id)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        # Evicted: start again from a number no stored entry can carry.
+        cache.set(version_key, time.time_ns(), None)
+
+
+def get_cached_user(user_id):
+    """The user with their profile, from the cache when current, else one query."""
+    entry_key, version_key = _keys(user_id)
+    found = cache.get_many([entry_key, version_key])
+    version = found.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key)
+    entry = found.get(entry_key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    user = CustomUser.objects.select_related('profile').filter(pk=user_id).first()
+    if user is not None:
+        cache.set(entry_key, (version, user), IDENTITY_TIMEOUT)
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() reads through the identity cache when it is shared."""
+    def get_user(self, user_id):
+        if not cache_is_shared():
+            return super().get_user(user_id)
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
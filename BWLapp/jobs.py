@@ -0,0 +1,201 @@
+# BWLapp/jobs.py
+"""
+Database-backed background jobs.
+
+Register a function with @job and queue it with enqueue(); `manage.py
+runworker` claims and runs it. Workers claim with
+SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL. On SQLite, which has no
+row locks, a worker claims a job with a conditional UPDATE and moves on
+to the next candidate when another worker got there first.
+
+Functions registered with @periodic('<cron expression>') are queued by
+the workers themselves when their minute comes round. The dedupe key
+makes sure only one of several workers queues each run.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+
+_registry = {}
+_schedules = []
+
+
+class CronSchedule:
+    """
+    Standard 5-field cron expression: minute hour day-of-month month
+    day-of-week (0 = Sunday). Fields accept '*', 'a', 'a-b', '*/n',
+    'a-b/n' and comma-separated lists of those.
+    """
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.fields = [self._parse(part, low, high) for part, (low, high) in zip(parts, self.RANGES)]
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for item in field.split(','):
+            spec, _, step = item.partition('/')
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                start, end = (int(v) for v in spec.split('-'))
+            else:
+                start = end = int(spec)
+            if not low <= start <= end <= high:
+                raise ValueError(f"Cron field {field!r} is outside {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def matches(self, when):
+        minutes, hours, days, months, weekdays = self.fields
+        return (
+            when.minute in minutes and when.hour in hours and when.day in days
+            and when.month in months and (when.weekday() + 1) % 7 in weekdays
+        )
+
+
+def job(name=None, max_attempts=5):
+    """Registers the decorated function as a job, under `name` or its dotted path."""
+    def decorator(func):
+        func.job_name = name or f"{func.__module__}.{func.__name__}"
+        func.max_attempts = max_attempts
+        _registry[func.job_name] = func
+        return func
+    return decorator
+
+
+def periodic(cron, name=None, max_attempts=1):
+    """Registers the decorated function as a job and queues it on the given cron schedule."""
+    def decorator(func):
+        func = job(name, max_attempts)(func)
+        _schedules.append((CronSchedule(cron), func.job_name))
+        return func
+    return decorator
+
+
+def registered():
+    return dict(_registry)
+
+
+def schedules():
+    return list(_schedules)
+
+
+def enqueue(name, run_at=None, priority=0, dedupe_key=None, **kwargs):
+    """
+    Queues the registered job `name` with the given keyword arguments.
+    With a dedupe_key, returns the existing job instead of queueing a second one.
+    """
+    if name not in _registry:
+        raise KeyError(f"No job registered as {name!r}")
+    fields = {
+        'name': name,
+        'kwargs': kwargs,
+        'priority': priority,
+        'run_at': run_at or timezone.now(),
+        'max_attempts': _registry[name].max_attempts,
+    }
+    if dedupe_key is None:
+        return Job.objects.create(**fields)
+    job_obj, _ = Job.objects.get_or_create(dedupe_key=dedupe_key, defaults=fields)
+    return job_obj
+
+
+def schedule_due(since, until):
+    """Queues every periodic job whose cron schedule matches a minute in (since, until]."""
+    queued = 0
+    minute = since.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    while minute <= until:
+        local_minute = timezone.localtime(minute)
+        for schedule, name in _schedules:
+            if schedule.matches(local_minute):
+                try:
+                    enqueue(name, run_at=minute, dedupe_key=f"{name}@{minute.isoformat()}")
+                    queued += 1
+                except IntegrityError:
+                    pass  # Another worker queued it between our get and create.
+        minute += timedelta(minutes=1)
+    return queued
+
+
+def claim(worker):
+    """Marks the next due job as running for `worker` and returns it, or None when idle."""
+    due = Job.objects.filter(status='queued', run_at__lte=timezone.now()).order_by('priority', 'run_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_obj = due.select_for_update(skip_locked=True).first()
+            if job_obj is None:
+                return None
+            job_obj.status, job_obj.worker, job_obj.started_at = 'running', worker, timezone.now()
+            job_obj.attempts += 1
+            job_obj.save(update_fields=['status', 'worker', 'started_at', 'attempts'])
+            return job_obj
+
+    for job_obj in due[:10]:
+        started_at = timezone.now()
+        claimed = Job.objects.filter(pk=job_obj.pk, status='queued').update(
+            status='running', worker=worker, started_at=started_at, attempts=job_obj.attempts + 1,
+        )
+        if claimed:
+            job_obj.status, job_obj.worker, job_obj.started_at = 'running', worker, started_at
+            job_obj.attempts += 1
+            return job_obj
+    return None
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def run(job_obj):
+    """Runs a claimed job and records the outcome. Returns True on success."""
+    func = _registry.get(job_obj.name)
+    try:
+        if func is None:
+            raise KeyError(f"No job registered as {job_obj.name!r}")
+        func(**job_obj.kwargs)
+    except Exception:
+        logger.exception("Job %s (%s) failed", job_obj.pk, job_obj.name)
+        job_obj.last_error = traceback.format_exc()
+        if job_obj.attempts < job_obj.max_attempts and func is not None:
+            job_obj.status = 'queued'
+            job_obj.run_at = timezone.now() + backoff(job_obj.attempts)
+        else:
+            job_obj.status = 'failed'
+            job_obj.finished_at = timezone.now()
+        job_obj.save(update_fields=['status', 'run_at', 'last_error', 'finished_at'])
+        return False
+
+    job_obj.status, job_obj.finished_at = 'done', timezone.now()
+    job_obj.save(update_fields=['status', 'finished_at'])
+    return True
+
+
+def requeue_stale(timeout):
+    """Puts back jobs whose worker died mid-run: 'running' for longer than `timeout`."""
+    return Job.objects.filter(status='running', started_at__lt=timezone.now() - timeout).update(
+        status='queued', worker='', run_at=timezone.now(),
+    )
+
+
+def retry(job_obj):
+    """Queues a failed job again with a fresh set of attempts."""
+    Job.objects.filter(pk=job_obj.pk, status='failed').update(
+        status='queued', attempts=0, run_at=timezone.now(), finished_at=None,
+    )
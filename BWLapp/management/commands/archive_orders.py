@@ -0,0 +1,33 @@
+# BWLapp/management/commands/archive_orders.py
+from django.core.management.base import BaseCommand
+
+from BWLapp.archive import archive_after_days, archive_orders, closed_orders, cutoff_date
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves closed orders older than ARCHIVE_AFTER_DAYS, with their items and payments, "
+        "from the live tables into the archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, help="Defaults to settings.ARCHIVE_AFTER_DAYS.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Orders moved per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the orders that would move.")
+
+    def handle(self, *args, **options):
+        days = options['older_than_days'] if options['older_than_days'] is not None else archive_after_days()
+        candidates = closed_orders(cutoff_date(days)).order_by('pk').values_list('pk', flat=True)
+        if options['dry_run']:
+            self.stdout.write(f"{candidates.count()} closed orders are older than {days} days.")
+            return
+
+        moved = 0
+        last_pk = 0
+        while True:
+            batch = list(candidates.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            moved += archive_orders(batch)
+            last_pk = batch[-1]
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} orders older than {days} days."))
@@ -0,0 +1,39 @@
+# BWLapp/management/commands/backup.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from BWLapp.backup import CHUNK_ROWS, BackupError, latest_backup, write_backup
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes a compressed, chunked and checksummed backup of the database into a new "
+        "timestamped directory. --incremental only copies what changed since the last backup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('root', help="Directory that holds the backups.")
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help="Build on the newest backup in ROOT (or --base) instead of copying everything.",
+        )
+        parser.add_argument('--base', help="Backup directory to build the incremental backup on.")
+        parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="Rows per compressed chunk file.")
+        parser.add_argument('--models', nargs='*', help="Only these models, as app_label.Model.")
+
+    def handle(self, *args, **options):
+        base = options['base']
+        if options['incremental'] and not base:
+            base = latest_backup(options['root'])
+            if base is None:
+                raise CommandError(f"No backup in {options['root']} to build on; take a full backup first.")
+
+        started = time.perf_counter()
+        try:
+            path = write_backup(options['root'], base=base, labels=options['models'], chunk_rows=options['chunk_rows'])
+        except BackupError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Incremental' if base else 'Full'} backup written to {path} in {time.perf_counter() - started:.1f}s."
+        ))
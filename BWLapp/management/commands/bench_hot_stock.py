@@ -0,0 +1,76 @@
+# BWLapp/management/commands/bench_hot_stock.py
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from BWLapp.models import Customer, Order, OrderItem, Product, Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks order entry against a single hot stock item, with and without "
+        "sharded counters, at increasing worker counts. Creates and removes its own "
+        "scratch rows; run it against PostgreSQL (SQLite serialises all writers)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,2,4,8,16', help="Comma-separated worker counts.")
+        parser.add_argument('--orders', type=int, default=50, help="Orders placed by each worker.")
+        parser.add_argument('--shards', type=int, default=16, help="Shard count for the sharded run.")
+
+    def handle(self, *args, **options):
+        worker_counts = [int(n) for n in options['workers'].split(',')]
+        orders_per_worker = options['orders']
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(f"Running on {connection.vendor}: results will not show lock contention."))
+
+        customer = Customer.objects.create(name="Benchmark Customer", email="bench-hot-stock@example.invalid")
+        product = Product.objects.create(name="Benchmark Hot Product", selling_price=Decimal('1.00'))
+        try:
+            self.stdout.write(f"{'workers':>8} {'plain/s':>10} {'sharded/s':>10}")
+            for workers in worker_counts:
+                plain = self._run(customer, product, workers, orders_per_worker, shards=0)
+                sharded = self._run(customer, product, workers, orders_per_worker, shards=options['shards'])
+                self.stdout.write(f"{workers:>8} {plain:>10.0f} {sharded:>10.0f}")
+        finally:
+            Order.objects.filter(customer=customer).delete()
+            Stock.objects.filter(product=product).delete()
+            product.delete()
+            customer.delete()
+
+    def _run(self, customer, product, workers, orders_per_worker, shards):
+        total_orders = workers * orders_per_worker
+        stock = Stock.objects.create(
+            product=product, package_type='bulk', quantity=total_orders * 2, price_per_package=Decimal('1.00'),
+        )
+        if shards:
+            stock.enable_sharding(shards)
+        errors = []
+
+        def place_orders():
+            try:
+                for _ in range(orders_per_worker):
+                    with transaction.atomic():
+                        order = Order.objects.create(customer=customer)
+                        OrderItem.objects.create(order=order, stock_item=stock, quantity=1)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=place_orders) for _ in range(workers)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        if errors:
+            self.stderr.write(f"{len(errors)} worker(s) failed, first error: {errors[0]}")
+        Order.objects.filter(customer=customer).delete()
+        stock.delete()
+        return total_orders / elapsed
@@ -0,0 +1,80 @@
+# BWLapp/management/commands/bench_templates.py
+import time
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from BWLapp import outbox
+from BWLapp.models import Category, Product, Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Times server-side rendering of the product and stock lists at several row "
+        "counts: cold (empty fragment cache, every row rendered) and warm (every row "
+        "served from its cached fragment). Renders unsaved rows; touches no tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='1000,10000', help="Comma-separated row counts.")
+        parser.add_argument('--repeat', type=int, default=3, help="Renders per measurement; the best is reported.")
+
+    def handle(self, *args, **options):
+        try:
+            row_counts = [int(n) for n in options['rows'].split(',')]
+        except ValueError:
+            raise CommandError("--rows must be a comma-separated list of integers.")
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        fragments = caches['template_fragments']
+        self.stdout.write(f"{'template':<14} {'rows':>7} {'cold ms':>9} {'warm ms':>9} {'warm us/row':>12}")
+        for rows in row_counts:
+            products, stocks = self._rows(rows)
+            lists = (
+                ('product_list', 'BWLapp/product_list.html', {'products': products, 'is_admin': True}),
+                ('stock_list', 'BWLapp/stock_list.html', {'all_stocks': stocks}),
+            )
+            for name, template, context in lists:
+                cold = self._best(options['repeat'], template, context, before=fragments.clear)
+                warm = self._best(options['repeat'], template, context)
+                self.stdout.write(
+                    f"{name:<14} {rows:>7} {cold * 1000:>9.1f} {warm * 1000:>9.1f} {warm / rows * 1e6:>12.1f}"
+                )
+        fragments.clear()
+
+    def _rows(self, count):
+        now = timezone.now()
+        packages = [key for key, _ in Stock.PACKAGE_TYPE_CHOICES]
+        # Suppressed so building the rows skips the audit's per-instance tracking.
+        with outbox.suppressed():
+            categories = [Category(pk=i, name=f"Category {i}") for i in range(1, 11)]
+            products = [
+                Product(
+                    pk=i, name=f"Product {i}", description=f"Benchmark product {i}",
+                    selling_price=Decimal('12.50'), category=categories[i % len(categories)], updated_at=now,
+                )
+                for i in range(1, count + 1)
+            ]
+            stocks = [
+                Stock(
+                    pk=i, product=products[i - 1], package_type=packages[i % len(packages)],
+                    quantity=i % 500, price_per_package=Decimal('75.00'), updated_at=now,
+                )
+                for i in range(1, count + 1)
+            ]
+        return products, stocks
+
+    def _best(self, repeat, template, context, before=None):
+        best = None
+        for _ in range(repeat):
+            if before:
+                before()
+            started = time.perf_counter()
+            render_to_string(template, context)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
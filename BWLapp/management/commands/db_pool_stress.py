@@ -0,0 +1,62 @@
+# BWLapp/management/commands/db_pool_stress.py
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from BWLapp.db_pool import get_pool, pool_stats
+from BWLapp.models import Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulates concurrent requests against the database and reports how many "
+        "new physical connections were opened. With pooling enabled the count "
+        "stays at the pool size instead of growing with every request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help="Number of concurrent workers.")
+        parser.add_argument('--requests', type=int, default=100, help="Requests issued by each worker.")
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        requests_per_thread = options['requests']
+        pooled = get_pool() is not None
+        opened = []
+        lock = threading.Lock()
+
+        def worker():
+            local_opened = 0
+            for _ in range(requests_per_thread):
+                # Same lifecycle as a request: use a connection, then release it.
+                if connection.connection is None:
+                    local_opened += 1
+                Stock.objects.filter(is_available=True).exists()
+                connection.close()
+            with lock:
+                opened.append(local_opened)
+
+        before = pool_stats()
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+        after = pool_stats()
+
+        total_requests = threads * requests_per_thread
+        self.stdout.write(f"Pooling enabled:     {pooled}")
+        self.stdout.write(f"Requests:            {total_requests} in {elapsed:.2f}s ({total_requests / elapsed:.0f}/s)")
+        if pooled:
+            new_connections = after.get('connections_num', 0) - before.get('connections_num', 0)
+            self.stdout.write(f"Physical connects:   {new_connections}")
+            self.stdout.write(f"Avg wait (ms):       {after['avg_wait_ms']}")
+            self.stdout.write(f"Requests queued:     {after.get('requests_queued', 0) - before.get('requests_queued', 0)}")
+            self.stdout.write(f"Pool size / max:     {after.get('pool_size')} / {after.get('pool_max')}")
+        else:
+            self.stdout.write(f"Physical connects:   {sum(opened)}")
+        self.stdout.write(self.style.SUCCESS("Stress run finished."))
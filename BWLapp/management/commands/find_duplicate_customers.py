@@ -0,0 +1,28 @@
+# BWLapp/management/commands/find_duplicate_customers.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from BWLapp.dedupe import MATCH_THRESHOLD, find_duplicates
+
+
+class Command(BaseCommand):
+    help = (
+        "Finds customers that look like the same business by blocking on phone, email "
+        "domain and name MinHash bands, and stores likely pairs for review under "
+        "customer/duplicates/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=float, default=MATCH_THRESHOLD,
+            help=f"Lowest score stored as a candidate (default {MATCH_THRESHOLD}).",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        customers, compared, found = find_duplicates(threshold=options['threshold'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Compared {compared} candidate pairs among {customers} customers in "
+            f"{time.perf_counter() - started:.2f}s; {found} possible duplicates."
+        ))
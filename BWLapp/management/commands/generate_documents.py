@@ -0,0 +1,48 @@
+# BWLapp/management/commands/generate_documents.py
+import os
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from BWLapp.documents import DOCUMENT_KINDS, date_range, iter_documents, select_ids, stream_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders receipts, invoices or customer statements for a date range to PDF "
+        "across a process pool and bundles them into a ZIP archive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=DOCUMENT_KINDS)
+        parser.add_argument('--from', dest='start', required=True, help="First day (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', required=True, help="Last day (YYYY-MM-DD).")
+        parser.add_argument('--output', required=True, help="Path of the ZIP file to write.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Rendering processes.")
+
+    def handle(self, *args, **options):
+        try:
+            start, end = date_range(date.fromisoformat(options['start']), date.fromisoformat(options['end']))
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+
+        kind = options['kind']
+        ids = list(select_ids(kind, start, end))
+        started = time.perf_counter()
+        count = 0
+
+        def counted(files):
+            nonlocal count
+            for item in files:
+                count += 1
+                yield item
+
+        with open(options['output'], 'wb') as out:
+            for chunk in stream_zip(counted(iter_documents(kind, ids, start, end, workers=options['workers']))):
+                out.write(chunk)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} {kind} document(s) to {options['output']} in {elapsed:.1f}s."
+        ))
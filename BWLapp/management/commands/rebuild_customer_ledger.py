@@ -0,0 +1,18 @@
+# BWLapp/management/commands/rebuild_customer_ledger.py
+from django.core.management.base import BaseCommand
+
+from BWLapp.models import Customer, CustomerLedger
+
+
+class Command(BaseCommand):
+    help = "Recomputes the CustomerLedger row of every customer from orders and payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        customer_ids = list(Customer.objects.order_by('pk').values_list('pk', flat=True))
+        for offset in range(0, len(customer_ids), batch_size):
+            CustomerLedger.refresh(customer_ids[offset:offset + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ledger rows for {len(customer_ids)} customers."))
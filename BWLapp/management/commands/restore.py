@@ -0,0 +1,46 @@
+# BWLapp/management/commands/restore.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from BWLapp.backup import BackupError, backup_chain, restore_backup, verify
+from BWLapp.availability import invalidate_availability
+from BWLapp.catalog import invalidate_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Restores a backup written by `manage.py backup` into a migrated database, replaying "
+        "incremental backups on top of their full backup and loading tables in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Backup directory to restore (the newest one of the chain).")
+        parser.add_argument('--workers', type=int, default=4, help="Tables restored at the same time.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--verify-only', action='store_true', help="Check the chunk checksums and exit.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options['verify_only']:
+                chain = backup_chain(options['path'])
+                for path, manifest in chain:
+                    verify(path, manifest)
+                self.stdout.write(self.style.SUCCESS(f"{len(chain)} backups verified."))
+                return
+
+            def progress(backup, label, rows):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  {backup} {label}: {rows}")
+
+            totals = restore_backup(
+                options['path'], workers=options['workers'], batch_size=options['batch_size'], progress=progress,
+            )
+        except BackupError as exc:
+            raise CommandError(str(exc))
+        invalidate_catalog()
+        invalidate_availability()
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {sum(totals.values())} rows from {len(totals)} tables in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,53 @@
+# BWLapp/management/commands/run_outbox.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from BWLapp import outbox
+from BWLapp.models import OutboxEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Drains the transactional outbox: hands pending events to their registered "
+        "handlers (audit, ledger, notifications, cache invalidation) in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help="Seconds to wait when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain what is due now and exit.")
+        parser.add_argument(
+            '--keep-days', type=int, default=7,
+            help="Delete handled events older than this many days (checked once per idle period).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        totals = {'done': 0, 'retried': 0, 'failed': 0, 'deferred': 0}
+        try:
+            while True:
+                close_old_connections()
+                summary = outbox.dispatch_batch(batch_size)
+                for key, count in summary.items():
+                    totals[key] += count
+                if summary['retried'] or summary['failed']:
+                    self.stderr.write(f"Outbox batch: {summary}")
+                # Deferred events are only picked up again once their aggregate's retry is due.
+                if summary['done'] + summary['retried'] + summary['failed'] == 0:
+                    self.purge(options['keep_days'])
+                    if options['once']:
+                        break
+                    time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Handled {totals['done']} events ({totals['retried']} retried, {totals['failed']} failed)."
+        ))
+
+    def purge(self, keep_days):
+        cutoff = timezone.now() - timedelta(days=keep_days)
+        OutboxEvent.objects.filter(status='done', processed_at__lt=cutoff).delete()
@@ -0,0 +1,84 @@
+# BWLapp/management/commands/runworker.py
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from BWLapp import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs background jobs from the Job table with N worker threads and queues "
+        "periodic jobs on their cron schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help="Worker threads.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait when no job is due.")
+        parser.add_argument(
+            '--stale-after', type=int, default=30,
+            help="Minutes after which a 'running' job is assumed abandoned and queued again.",
+        )
+        parser.add_argument('--once', action='store_true', help="Run every due job and exit.")
+        parser.add_argument('--no-schedule', action='store_true', help="Don't queue periodic jobs from this worker.")
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.poll_interval = options['poll_interval']
+        self.once = options['once']
+        self.counts = {'done': 0, 'failed': 0}
+        self.lock = threading.Lock()
+        name = f"{socket.gethostname()}:{os.getpid()}"
+
+        threads = [
+            threading.Thread(target=self.work, args=(f"{name}:{n}",), daemon=True)
+            for n in range(max(options['concurrency'], 1))
+        ]
+        self.stdout.write(f"Worker {name} started with {len(threads)} threads.")
+        for thread in threads:
+            thread.start()
+
+        stale_after = timedelta(minutes=options['stale_after'])
+        last_tick = timezone.now()
+        try:
+            while True:
+                alive = [thread for thread in threads if thread.is_alive()]
+                if not alive:
+                    break
+                now = timezone.now()
+                if not options['no_schedule']:
+                    # Queue the periodic jobs whose minute came up since the last tick.
+                    jobs.schedule_due(max(last_tick, now - timedelta(hours=1)), now)
+                jobs.requeue_stale(stale_after)
+                last_tick = now
+                close_old_connections()
+                alive[0].join(timeout=min(self.poll_interval * 5, 30))
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the running jobs finish...")
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(
+            f"Ran {self.counts['done']} jobs ({self.counts['failed']} failed attempts)."
+        ))
+
+    def work(self, worker):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = jobs.claim(worker)
+                if job is None:
+                    if self.once:
+                        return
+                    self.stop.wait(self.poll_interval)
+                    continue
+                succeeded = jobs.run(job)
+                with self.lock:
+                    self.counts['done' if succeeded else 'failed'] += 1
+        finally:
+            connection.close()
@@ -0,0 +1,37 @@
+# BWLapp/management/commands/stock_checkpoint.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from BWLapp.models import Stock, StockCheckpoint, StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes a StockCheckpoint for every stock item that moved since the last run, "
+        "so point-in-time inventory lookups only scan a bounded range of the ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lag-minutes', type=int, default=5,
+            help="Checkpoint the state as of this many minutes ago, leaving room for in-flight transactions.",
+        )
+
+    def handle(self, *args, **options):
+        taken_at = timezone.now() - timedelta(minutes=options['lag_minutes'])
+        last_run = StockCheckpoint.objects.aggregate(last=Max('taken_at'))['last']
+
+        moved = StockMovement.objects.filter(created_at__lte=taken_at)
+        if last_run:
+            moved = moved.filter(created_at__gt=last_run)
+        stock_ids = moved.values_list('stock_id', flat=True).distinct()
+
+        checkpoints = [
+            StockCheckpoint(stock=stock, quantity=stock.quantity_as_of(taken_at), taken_at=taken_at)
+            for stock in Stock.objects.filter(pk__in=stock_ids)
+        ]
+        StockCheckpoint.objects.bulk_create(checkpoints, batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(checkpoints)} stock checkpoints as of {taken_at:%Y-%m-%d %H:%M}."))
@@ -0,0 +1,31 @@
+# BWLapp/management/commands/stock_shards.py
+from django.core.management.base import BaseCommand, CommandError
+
+from BWLapp.models import Stock
+
+
+class Command(BaseCommand):
+    help = "Enables, disables or rebalances sharded quantity counters for hot stock items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['enable', 'disable', 'rebalance'])
+        parser.add_argument('stock_ids', nargs='*', type=int, help="Stock IDs (rebalance defaults to every sharded item).")
+        parser.add_argument('--shards', type=int, default=8, help="Shard count used by 'enable'.")
+
+    def handle(self, *args, **options):
+        action = options['action']
+        stock_ids = options['stock_ids']
+        if action != 'rebalance' and not stock_ids:
+            raise CommandError(f"'{action}' needs at least one stock ID.")
+        if options['shards'] < 1:
+            raise CommandError("--shards must be at least 1.")
+
+        stocks = Stock.objects.filter(pk__in=stock_ids) if stock_ids else Stock.objects.filter(shard_count__gt=0)
+        for stock in stocks:
+            if action == 'enable':
+                stock.enable_sharding(options['shards'])
+            elif action == 'disable':
+                stock.disable_sharding()
+            elif stock.shard_count:
+                stock.rebalance_shards()
+            self.stdout.write(f"Stock {stock.pk}: {action}d ({stock.shard_count} shards, {stock.quantity} on hand)")
@@ -1,6 +1,6 @@
 # Generated by Django 5.2.5 on 2025-10-01 07:37
 
-from django.db import migrations, models
+from django.db import migrations
 
 class Migration(migrations.Migration):
 
@@ -8,15 +8,7 @@ class Migration(migrations.Migration):
         ('BWLapp', '0002_remove_product_cost_price'),
     ]
 
-    operations = [
-        migrations.AddField(
-            model_name='product',
-            name='image',
-            field=models.ImageField(
-                upload_to='product_images/',
-                blank=True,
-                null=True,
-                help_text='Upload a high-quality product image.',
-            ),
-        ),
-    ]
+    # 0001_initial already creates Product.image, so adding it again only
+    # failed on fresh databases ("duplicate column name: image").
+    # Kept as a no-op so databases that applied it stay in step.
+    operations = []
@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-19 08:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    # Seed the ledger with today's quantities so it sums to Stock.quantity.
+    Stock = apps.get_model('BWLapp', 'Stock')
+    StockMovement = apps.get_model('BWLapp', 'StockMovement')
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(stock_id=stock_id, kind='opening', change=quantity, note='Opening balance')
+            for stock_id, quantity in Stock.objects.filter(quantity__gt=0).values_list('pk', 'quantity')
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0003_auto_20251001_1737'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='BWLapp.stock')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stock', 'taken_at'], name='BWLapp_stoc_stock_i_2659f4_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('opening', 'Opening Balance'), ('receipt', 'Receipt'), ('sale', 'Sale'), ('return', 'Return'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('change', models.IntegerField(help_text='Packages added (positive) or removed (negative)')),
+                ('source_model', models.CharField(blank=True, max_length=50)),
+                ('source_id', models.CharField(blank=True, max_length=50)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='BWLapp.stock')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stock', 'created_at'], name='BWLapp_stoc_stock_i_1e6fcd_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0004_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Number of counter shards (0 = disabled)'),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='BWLapp.stock')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stock', 'index'), name='unique_stock_shard_index')],
+            },
+        ),
+    ]
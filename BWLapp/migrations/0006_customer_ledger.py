@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-19 08:59
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+
+
+def build_ledgers(apps, schema_editor):
+    Customer = apps.get_model('BWLapp', 'Customer')
+    Order = apps.get_model('BWLapp', 'Order')
+    OrderItem = apps.get_model('BWLapp', 'OrderItem')
+    Payment = apps.get_model('BWLapp', 'Payment')
+    CustomerLedger = apps.get_model('BWLapp', 'CustomerLedger')
+
+    rows = {pk: CustomerLedger(customer_id=pk) for pk in Customer.objects.values_list('pk', flat=True)}
+    for row in Order.objects.values('customer_id').annotate(count=Count('pk'), last=Max('order_date')):
+        rows[row['customer_id']].order_count = row['count']
+        rows[row['customer_id']].last_order_date = row['last']
+    for row in OrderItem.objects.values('order__customer_id').annotate(total=Sum(F('quantity') * F('price_each'))):
+        rows[row['order__customer_id']].total_ordered = row['total'] or Decimal('0')
+    for row in Payment.objects.values('order__customer_id').annotate(total=Sum('total_amount')):
+        rows[row['order__customer_id']].lifetime_spend = row['total'] or Decimal('0')
+    for row in Order.objects.filter(payment__isnull=True).values('customer_id').annotate(oldest=Min('order_date')):
+        rows[row['customer_id']].oldest_unpaid_order_date = row['oldest']
+    for row in rows.values():
+        row.open_balance = max(row.total_ordered - row.lifetime_spend, Decimal('0'))
+    CustomerLedger.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0005_stock_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLedger',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to='BWLapp.customer')),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total_ordered', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('open_balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+                ('oldest_unpaid_order_date', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-lifetime_spend'], name='ledger_lifetime_spend_idx'), models.Index(fields=['-open_balance'], name='ledger_open_balance_idx'), models.Index(fields=['oldest_unpaid_order_date'], name='ledger_unpaid_since_idx'), models.Index(fields=['-last_order_date'], name='ledger_last_order_idx')],
+            },
+        ),
+        migrations.RunPython(build_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0006_customer_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audittrail',
+            name='is_snapshot',
+            field=models.BooleanField(default=False),
+        ),
+    ]
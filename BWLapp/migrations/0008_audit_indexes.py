@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0007_audit_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['model_name', 'record_id', 'timestamp'], name='audit_record_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['user', 'timestamp'], name='audit_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['timestamp', 'id'], name='audit_timestamp_idx'),
+        ),
+    ]
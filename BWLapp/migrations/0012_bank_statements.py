@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-19 09:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0011_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('method', models.CharField(default='Online Transfer', max_length=50)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+                ('imported_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_no', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('reference', models.CharField(blank=True, max_length=255)),
+                ('payer', models.CharField(blank=True, max_length=255)),
+                ('phone', models.CharField(blank=True, max_length=30)),
+                ('status', models.CharField(choices=[('unmatched', 'Unmatched'), ('suggested', 'Suggested'), ('confirmed', 'Confirmed'), ('ignored', 'Ignored')], default='unmatched', max_length=10)),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('matched_order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='BWLapp.order')),
+                ('payment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_line', to='BWLapp.payment')),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='BWLapp.bankstatement')),
+            ],
+            options={
+                'ordering': ['line_no'],
+                'indexes': [models.Index(fields=['statement', 'status'], name='statement_line_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 09:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0012_bank_statements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('reasons', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('dismissed', 'Not a duplicate')], default='open', max_length=10)),
+                ('found_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='BWLapp.customer')),
+                ('customer_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='BWLapp.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-score'], name='duplicate_status_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('customer_a', 'customer_b'), name='unique_duplicate_pair')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-19 09:42
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_current_prices(apps, schema_editor):
+    # Earlier prices were overwritten, so today's stand in for all past sales
+    # (prices.HISTORY_START), which is what reports assumed until now.
+    Product = apps.get_model('BWLapp', 'Product')
+    Stock = apps.get_model('BWLapp', 'Stock')
+    PriceHistory = apps.get_model('BWLapp', 'PriceHistory')
+    start = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+    rows = [
+        PriceHistory(product_id=pk, price=price, valid_from=start)
+        for pk, price in Product.objects.values_list('pk', 'selling_price')
+    ] + [
+        PriceHistory(stock_id=pk, price=price, valid_from=start)
+        for pk, price in Stock.objects.values_list('pk', 'price_per_package')
+    ]
+    PriceHistory.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0014_offline_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateTimeField()),
+                ('valid_to', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='BWLapp.product')),
+                ('stock', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='BWLapp.stock')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'valid_from'], name='price_product_from_idx'), models.Index(fields=['stock', 'valid_from'], name='price_stock_from_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('product__isnull', False), ('stock__isnull', True)), models.Q(('product__isnull', True), ('stock__isnull', False)), _connector='OR'), name='price_history_one_item'), models.UniqueConstraint(condition=models.Q(('valid_to__isnull', True)), fields=('product',), name='one_current_product_price'), models.UniqueConstraint(condition=models.Q(('valid_to__isnull', True)), fields=('stock',), name='one_current_stock_price')],
+            },
+        ),
+        migrations.RunPython(seed_current_prices, migrations.RunPython.noop),
+    ]
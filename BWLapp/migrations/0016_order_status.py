@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-19 09:44
+
+from django.db import migrations, models
+
+# Free-text statuses seen before the state machine, lower-cased.
+LEGACY_STATUSES = {
+    'pending': 'Pending',
+    'picked': 'Picked',
+    'dispatched': 'Dispatched',
+    'shipped': 'Dispatched',
+    'delivered': 'Delivered',
+    'completed': 'Delivered',
+    'complete': 'Delivered',
+    'paid': 'Delivered',
+    'payed': 'Delivered',
+    'returned': 'Returned',
+    'cancelled': 'Cancelled',
+    'canceled': 'Cancelled',
+}
+
+
+def normalize_statuses(apps, schema_editor):
+    # Anything unrecognised goes back to Pending for someone to move on.
+    for model_name in ('Order', 'ArchivedOrder'):
+        model = apps.get_model('BWLapp', model_name)
+        for status in model.objects.values_list('status', flat=True).distinct():
+            normalized = LEGACY_STATUSES.get(status.strip().lower(), 'Pending')
+            if normalized != status:
+                model.objects.filter(status=status).update(status=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0015_price_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_statuses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Picked', 'Picked'), ('Dispatched', 'Dispatched'), ('Delivered', 'Delivered'), ('Returned', 'Returned'), ('Cancelled', 'Cancelled')], default='Pending', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-order_date'], name='order_status_date_idx'),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2 on 2026-10-19 09:48
+
+from bisect import bisect_right
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_product_snapshot(apps, schema_editor):
+    # Items are costed at their product's price on the order date, as
+    # reports did through PriceHistory; dates before it use the first price.
+    Product = apps.get_model('BWLapp', 'Product')
+    Stock = apps.get_model('BWLapp', 'Stock')
+    PriceHistory = apps.get_model('BWLapp', 'PriceHistory')
+    products = {pk: (name, price) for pk, name, price in Product.objects.values_list('pk', 'name', 'selling_price')}
+    stocks = {
+        pk: (product_id, package_type)
+        for pk, product_id, package_type in Stock.objects.values_list('pk', 'product_id', 'package_type')
+    }
+    history = defaultdict(lambda: ([], []))
+    rows = PriceHistory.objects.filter(product__isnull=False).order_by('product_id', 'valid_from')
+    for product_id, valid_from, price in rows.values_list('product_id', 'valid_from', 'price'):
+        history[product_id][0].append(valid_from)
+        history[product_id][1].append(price)
+
+    def price_on(product_id, when):
+        starts, prices = history.get(product_id, ((), ()))
+        if not prices:
+            return products[product_id][1]
+        return prices[max(bisect_right(starts, when) - 1, 0)]
+
+    for model_name in ('OrderItem', 'ArchivedOrderItem'):
+        model = apps.get_model('BWLapp', model_name)
+        items = model.objects.filter(product__isnull=True).values_list('pk', 'stock_item_id', 'order__order_date')
+        batch = []
+        for pk, stock_id, order_date in items.iterator(chunk_size=2000):
+            product_id, package_type = stocks[stock_id]
+            batch.append(model(
+                pk=pk, product_id=product_id, product_name=products[product_id][0],
+                package_type=package_type, unit_cost=price_on(product_id, order_date),
+            ))
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ['product', 'product_name', 'package_type', 'unit_cost'])
+                batch = []
+        model.objects.bulk_update(batch, ['product', 'product_name', 'package_type', 'unit_cost'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BWLapp', '0016_order_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='package_type',
+            field=models.CharField(blank=True, choices=[('6pack', '6-Pack'), ('dozen', 'Dozen'), ('Carton', 'Carton'), ('bulk', 'Bulk')], max_length=50),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='BWLapp.product'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='package_type',
+            field=models.CharField(blank=True, choices=[('6pack', '6-Pack'), ('dozen', 'Dozen'), ('Carton', 'Carton'), ('bulk', 'Bulk')], max_length=50),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='order_items', to='BWLapp.product'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_product_snapshot, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='archivedorderitem',
+            index=models.Index(fields=['product', 'order'], name='archived_item_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product_name', 'package_type'], name='orderitem_product_name_idx'),
+        ),
+    ]
@@ -1,10 +1,14 @@
 # BWLapp/models.py
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Count, Max, Min, Case, When, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+import random
 
 # --- 1. Custom User & Profile Models ---
 
@@ -85,6 +89,14 @@ class Product(models.Model):
         null=True,
         help_text="Upload a high-quality product image."
     )
+    # Lets sync clients fetch only what changed (see sync.stock_delta).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            PriceHistory.record(self, self.selling_price)
+
     @property
     def total_stock_quantity(self):
         """Calculates the total number of packages across all stock items."""
@@ -113,24 +125,287 @@ class Stock(models.Model):
     quantity = models.PositiveIntegerField(default=0, help_text="Number of packages in stock")
     price_per_package = models.DecimalField(max_digits=10, decimal_places=2, help_text="Price for this specific package type")
     is_available = models.BooleanField(default=True)
+    # Hot items can split their quantity across StockShard rows so concurrent
+    # orders don't all queue on this row's lock. 0 means not sharded.
+    shard_count = models.PositiveSmallIntegerField(default=0, help_text="Number of counter shards (0 = disabled)")
+    # Bumped by save() and by every update() of the quantity column, so it versions
+    # the row as the stock list shows it. Shard counts move without touching it;
+    # those changes are found through StockMovement.created_at.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            PriceHistory.record(self, self.price_per_package)
+
     @property
     def expected_total_amount(self):
         """Calculates the total revenue expected from this stock."""
-        return self.quantity * self.price_per_package
+        return self.available_quantity * self.price_per_package
+
+    @property
+    def available_quantity(self):
+        """
+        Exact quantity on hand. For sharded stock, `quantity` is only refreshed
+        when shards are rebalanced, so the shards are summed instead (or read
+        from an `on_hand` annotation, see on_hand_expression()).
+        """
+        if self.shard_count:
+            if hasattr(self, 'on_hand'):
+                return self.on_hand
+            return self.shards.aggregate(total=Sum('quantity'))['total'] or 0
+        return self.quantity
+
+    @staticmethod
+    def on_hand_expression():
+        """
+        available_quantity as a query expression, for
+        `Stock.objects.annotate(on_hand=Stock.on_hand_expression())`.
+        """
+        shard_total = (
+            StockShard.objects.filter(stock=OuterRef('pk')).values('stock')
+            .annotate(total=Sum('quantity')).values('total')
+        )
+        return Case(
+            When(shard_count__gt=0, then=Coalesce(Subquery(shard_total), Value(0))),
+            default=F('quantity'),
+        )
+
+    def insufficient_stock_error(self, requested):
+        return ValidationError(
+            f"Insufficient stock for {self.product.name} ({self.get_package_type_display()}). "
+            f"Only {self.available_quantity} available, requested {requested} more."
+        )
+
+    def adjust_quantity(self, change, kind, source=None, user=None, note=''):
+        """
+        Adds `change` (negative to deduct) to the quantity on hand and appends
+        the matching StockMovement to the ledger.
+        """
+        if change == 0:
+            return
+        if self.shard_count:
+            self._adjust_shards(change)
+        else:
+            # Conditional update so concurrent orders can never oversell.
+            updated = Stock.objects.filter(pk=self.pk, quantity__gte=-change).update(
+                quantity=F('quantity') + change, updated_at=timezone.now(),
+            )
+            if not updated:
+                raise self.insufficient_stock_error(-change)
+            self.quantity += change
+        StockMovement.record(self, change, kind, source=source, user=user, note=note)
+
+    def set_quantity(self, quantity, user=None, note=''):
+        """
+        Sets the quantity on hand from a stock count and records the
+        difference as an adjustment. Compares against the locked row's
+        current figure, so sales since the count was typed are not undone.
+        """
+        with transaction.atomic():
+            locked = Stock.objects.select_for_update().get(pk=self.pk)
+            change = quantity - locked.available_quantity
+            if locked.shard_count:
+                locked.rebalance_shards(quantity)
+            else:
+                Stock.objects.filter(pk=self.pk).update(quantity=quantity, updated_at=timezone.now())
+            self.quantity = quantity
+            if change:
+                StockMovement.record(self, change, 'adjustment', user=user, note=note)
+
+    def _adjust_shards(self, change):
+        indexes = list(range(self.shard_count))
+        random.shuffle(indexes)
+        if change > 0:
+            StockShard.objects.filter(stock=self, index=indexes[0]).update(quantity=F('quantity') + change)
+            return
+        # Take the whole amount from the first shard that can cover it...
+        for index in indexes:
+            if StockShard.objects.filter(stock=self, index=index, quantity__gte=-change).update(quantity=F('quantity') + change):
+                return
+        # ...otherwise no single shard is big enough: pool them and try again.
+        with transaction.atomic():
+            total = self.rebalance_shards()
+            if total < -change:
+                raise self.insufficient_stock_error(-change)
+            self.rebalance_shards(total + change)
+
+    def rebalance_shards(self, total=None):
+        """
+        Locks all shards and spreads `total` (default: their current sum)
+        evenly across them. Also writes the exact total back to `quantity`.
+        """
+        with transaction.atomic():
+            shards = list(self.shards.select_for_update().order_by('index'))
+            if total is None:
+                total = sum(shard.quantity for shard in shards)
+            share, remainder = divmod(total, len(shards))
+            for shard in shards:
+                shard.quantity = share + (1 if shard.index < remainder else 0)
+            StockShard.objects.bulk_update(shards, ['quantity'])
+            Stock.objects.filter(pk=self.pk).update(quantity=total, updated_at=timezone.now())
+            self.quantity = total
+        return total
+
+    def enable_sharding(self, shard_count):
+        """Splits the current quantity across `shard_count` counter rows."""
+        with transaction.atomic():
+            stock = Stock.objects.select_for_update().get(pk=self.pk)
+            total = stock.available_quantity
+            self.shards.all().delete()
+            StockShard.objects.bulk_create([StockShard(stock=self, index=i) for i in range(shard_count)])
+            Stock.objects.filter(pk=self.pk).update(shard_count=shard_count)
+            self.shard_count = shard_count
+            self.rebalance_shards(total)
+
+    def disable_sharding(self):
+        """Folds the shards back into `quantity` and removes them."""
+        with transaction.atomic():
+            Stock.objects.select_for_update().get(pk=self.pk)
+            total = sum(self.shards.select_for_update().values_list('quantity', flat=True))
+            self.shards.all().delete()
+            Stock.objects.filter(pk=self.pk).update(quantity=total, shard_count=0, updated_at=timezone.now())
+            self.quantity = total
+            self.shard_count = 0
+
+    def quantity_as_of(self, when):
+        """
+        Returns the quantity on hand at `when`, starting from the nearest
+        checkpoint and summing only the movements recorded after it.
+        """
+        checkpoint = self.checkpoints.filter(taken_at__lte=when).order_by('-taken_at').first()
+        movements = self.movements.filter(created_at__lte=when)
+        base = 0
+        if checkpoint:
+            movements = movements.filter(created_at__gt=checkpoint.taken_at)
+            base = checkpoint.quantity
+        return base + (movements.aggregate(total=Sum('change'))['total'] or 0)
 
     def __str__(self):
         return f"[ID:{self.pk}] {self.product.name} - {self.get_package_type_display()} ({self.quantity} in stock)"
 
+class StockShard(models.Model):
+    """One slice of a sharded Stock's quantity."""
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'index'], name='unique_stock_shard_index'),
+        ]
+
+    def __str__(self):
+        return f"Stock {self.stock_id} shard {self.index}: {self.quantity}"
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of every change to Stock.quantity. Rows are never
+    updated or deleted; corrections are recorded as new adjustments.
+    """
+    KIND_CHOICES = (
+        ('opening', 'Opening Balance'),
+        ('receipt', 'Receipt'),
+        ('sale', 'Sale'),
+        ('return', 'Return'),
+        ('adjustment', 'Adjustment'),
+    )
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    change = models.IntegerField(help_text="Packages added (positive) or removed (negative)")
+    # Source row that caused the movement, e.g. ('OrderItem', '42')
+    source_model = models.CharField(max_length=50, blank=True)
+    source_id = models.CharField(max_length=50, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stock', 'created_at']),
+            models.Index(fields=['created_at'], name='movement_created_idx'),
+        ]
+
+    @classmethod
+    def record(cls, stock, change, kind, source=None, user=None, note=''):
+        return cls.objects.create(
+            stock=stock,
+            kind=kind,
+            change=change,
+            source_model=source.__class__.__name__ if source is not None else '',
+            source_id=str(source.pk) if source is not None else '',
+            user=user,
+            note=note,
+        )
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.change:+d} on Stock {self.stock_id}"
+
+class StockCheckpoint(models.Model):
+    """
+    Periodic snapshot of a stock item's quantity, so point-in-time lookups
+    only replay the movements recorded since the nearest checkpoint.
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='checkpoints')
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stock', 'taken_at']),
+        ]
+
+    def __str__(self):
+        return f"Stock {self.stock_id}: {self.quantity} at {self.taken_at:%Y-%m-%d %H:%M}"
+
 # --- 4. Order & OrderItem Models ---
 
 class Order(models.Model):
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Picked', 'Picked'),
+        ('Dispatched', 'Dispatched'),
+        ('Delivered', 'Delivered'),
+        ('Returned', 'Returned'),
+        ('Cancelled', 'Cancelled'),
+    ]
+    # Where each status may move next. Returned and Cancelled are final.
+    TRANSITIONS = {
+        'Pending': {'Picked', 'Cancelled'},
+        'Picked': {'Dispatched', 'Pending', 'Cancelled'},
+        'Dispatched': {'Delivered', 'Returned'},
+        'Delivered': {'Returned'},
+        'Returned': set(),
+        'Cancelled': set(),
+    }
+    CLOSED_STATUSES = ('Returned', 'Cancelled')
+
     order_id = models.AutoField(primary_key=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    status = models.CharField(max_length=50, default='Pending')
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='Pending')
     created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders_created')
     order_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Status filters on the dashboards and reports, newest first.
+            models.Index(fields=['status', '-order_date'], name='order_status_date_idx'),
+        ]
+
+    @classmethod
+    def check_transition(cls, current, new):
+        """
+        Raises ValidationError unless an order in status `current` may move
+        to `new`. New orders (`current` None) always start as Pending.
+        """
+        if current == new:
+            return
+        allowed = {'Pending'} if current is None else cls.TRANSITIONS.get(current, set())
+        if new not in allowed:
+            if current is None:
+                raise ValidationError("New orders start as Pending.")
+            raise ValidationError(f"An order can't go from {current} to {new}.")
+
     def __str__(self):
         return f"Order {self.order_id} for {self.customer.name}"
 
@@ -140,6 +415,25 @@ class OrderItem(models.Model):
     stock_item = models.ForeignKey(Stock, on_delete=models.PROTECT) 
     quantity = models.IntegerField(default=1)
     price_each = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Copied from the stock item when it is picked, so sales analytics read this table alone.
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, null=True, blank=True, related_name='order_items')
+    product_name = models.CharField(max_length=255, blank=True)
+    package_type = models.CharField(max_length=50, choices=Stock.PACKAGE_TYPE_CHOICES, blank=True)
+    # The product's selling_price at the time of sale, which reports cost sales at.
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+            models.Index(fields=['product_name', 'package_type'], name='orderitem_product_name_idx'),
+        ]
+
+    def set_product_snapshot(self):
+        product = self.stock_item.product
+        self.product = product
+        self.product_name = product.name
+        self.package_type = self.stock_item.package_type
+        self.unit_cost = product.selling_price
 
     def save(self, *args, **kwargs):
         # 1. Price Setting
@@ -148,40 +442,49 @@ class OrderItem(models.Model):
 
         # 2. STOCK DEDUCTION LOGIC
         quantity_to_deduct = self.quantity
+        original_item = None
         
         if self.pk:
             # If updating an existing item, determine the change in quantity.
             try:
                 original_item = OrderItem.objects.get(pk=self.pk)
-                # Calculate the difference (Positive=deduct more, Negative=return stock)
-                quantity_change = self.quantity - original_item.quantity
-                quantity_to_deduct = quantity_change
+                if original_item.stock_item_id == self.stock_item_id:
+                    # Calculate the difference (Positive=deduct more, Negative=return stock)
+                    quantity_to_deduct = self.quantity - original_item.quantity
             except OrderItem.DoesNotExist:
                 pass
         
-        if quantity_to_deduct != 0:
-            stock = self.stock_item
+        stock = self.stock_item
+
+        if original_item is None or original_item.stock_item_id != self.stock_item_id or self.product_id is None:
+            self.set_product_snapshot()
+
+        if self.order.status in Order.CLOSED_STATUSES:
+            raise ValidationError(f"Order {self.order_id} is {self.order.status.lower()}; its items can't change.")
             
-            # --- Check 1: Insufficient Stock (only for positive deduction) ---
-            if quantity_to_deduct > 0 and stock.quantity < quantity_to_deduct:
-                raise ValidationError(
-                    f"Insufficient stock for {stock.product.name} ({stock.get_package_type_display()}). "
-                    f"Only {stock.quantity} available, requested {quantity_to_deduct} more."
-                )
+        # --- Check 1: Insufficient Stock (only for positive deduction) ---
+        # adjust_quantity() re-checks atomically; this just fails fast before any writes.
+        if quantity_to_deduct > 0 and stock.available_quantity < quantity_to_deduct:
+            raise stock.insufficient_stock_error(quantity_to_deduct)
 
-            # --- Check 2: Deduct/Return Stock ---
-            stock.quantity -= quantity_to_deduct
-            stock.save()
+        with transaction.atomic():
+            # Call the parent save method first so the ledger can reference this item
+            super().save(*args, **kwargs)
 
-        # Call the parent save method
-        super().save(*args, **kwargs)
+            # --- Check 2: Deduct/Return Stock ---
+            if original_item and original_item.stock_item_id != self.stock_item_id:
+                # The package was swapped: return everything to the old stock item.
+                original_item.stock_item.adjust_quantity(original_item.quantity, 'return', source=self)
+            if quantity_to_deduct != 0:
+                stock.adjust_quantity(-quantity_to_deduct, 'sale' if quantity_to_deduct > 0 else 'return', source=self)
 
     def delete(self, *args, **kwargs):
         # When an OrderItem is deleted, return the stock back to inventory.
-        stock = self.stock_item
-        stock.quantity += self.quantity # Add the full quantity back
-        stock.save()
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            # ...unless cancelling the order already did.
+            if self.order.status != 'Cancelled':
+                self.stock_item.adjust_quantity(self.quantity, 'return', source=self) # Add the full quantity back
+            return super().delete(*args, **kwargs)
 
 # --- 5. Payment & Audit Trail Models ---
 
@@ -203,13 +506,397 @@ class Payment(models.Model):
             self.total_amount = calculated_total
         super().save(*args, **kwargs)
         
+class CustomerLedger(models.Model):
+    """
+    Materialized per-customer totals, kept up to date from Order, OrderItem
+    and Payment writes so reports can sort customers with an index scan.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='ledger')
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_ordered = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    open_balance = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+    last_order_date = models.DateTimeField(null=True, blank=True)
+    oldest_unpaid_order_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-lifetime_spend'], name='ledger_lifetime_spend_idx'),
+            models.Index(fields=['-open_balance'], name='ledger_open_balance_idx'),
+            models.Index(fields=['oldest_unpaid_order_date'], name='ledger_unpaid_since_idx'),
+            models.Index(fields=['-last_order_date'], name='ledger_last_order_idx'),
+        ]
+
+    @classmethod
+    def refresh(cls, customer_ids):
+        """
+        Recomputes the ledger rows for the given customers: four grouped
+        queries over the live tables and three over the archive.
+
+        Cancelled and returned orders (Order.CLOSED_STATUSES) will never be
+        paid, so they count towards order_count and last_order_date but not
+        towards total_ordered, the open balance or the oldest unpaid order.
+        Payments all count towards lifetime_spend; only those on open orders
+        settle the open balance.
+        """
+        customer_ids = set(Customer.objects.filter(pk__in=customer_ids).values_list('pk', flat=True))
+        if not customer_ids:
+            return
+        rows = {pk: cls(customer_id=pk) for pk in customer_ids}
+        open_ordered = dict.fromkeys(customer_ids, Decimal('0'))
+        open_paid = dict.fromkeys(customer_ids, Decimal('0'))
+        closed = Order.CLOSED_STATUSES
+
+        for row in Order.objects.filter(customer_id__in=customer_ids).values('customer_id').annotate(
+            count=Count('pk'), last=Max('order_date'),
+        ):
+            rows[row['customer_id']].order_count = row['count']
+            rows[row['customer_id']].last_order_date = row['last']
+        for row in OrderItem.objects.filter(order__customer_id__in=customer_ids).exclude(
+            order__status__in=closed,
+        ).values('order__customer_id').annotate(
+            total=Sum(F('quantity') * F('price_each')),
+        ):
+            rows[row['order__customer_id']].total_ordered = row['total'] or Decimal('0')
+            open_ordered[row['order__customer_id']] = row['total'] or Decimal('0')
+        for row in Payment.objects.filter(order__customer_id__in=customer_ids).values('order__customer_id').annotate(
+            total=Sum('total_amount'), open_total=Sum('total_amount', filter=~models.Q(order__status__in=closed)),
+        ):
+            rows[row['order__customer_id']].lifetime_spend = row['total'] or Decimal('0')
+            open_paid[row['order__customer_id']] = row['open_total'] or Decimal('0')
+        for row in Order.objects.filter(customer_id__in=customer_ids, payment__isnull=True).exclude(
+            status__in=closed,
+        ).values('customer_id').annotate(
+            oldest=Min('order_date'),
+        ):
+            rows[row['customer_id']].oldest_unpaid_order_date = row['oldest']
+
+        # Archived orders are paid in full or closed: never unpaid, and only the
+        # former count towards total_ordered.
+        for row in ArchivedOrder.objects.filter(customer_id__in=customer_ids).values('customer_id').annotate(
+            count=Count('pk'), last=Max('order_date'),
+        ):
+            ledger = rows[row['customer_id']]
+            ledger.order_count += row['count']
+            ledger.last_order_date = max(d for d in (ledger.last_order_date, row['last']) if d)
+        for row in ArchivedOrderItem.objects.filter(order__customer_id__in=customer_ids).exclude(
+            order__status__in=closed,
+        ).values('order__customer_id').annotate(
+            total=Sum(F('quantity') * F('price_each')),
+        ):
+            rows[row['order__customer_id']].total_ordered += row['total'] or Decimal('0')
+        for row in ArchivedPayment.objects.filter(order__customer_id__in=customer_ids).values('order__customer_id').annotate(
+            total=Sum('total_amount'),
+        ):
+            rows[row['order__customer_id']].lifetime_spend += row['total'] or Decimal('0')
+
+        for pk, row in rows.items():
+            row.open_balance = max(open_ordered[pk] - open_paid[pk], Decimal('0'))
+        cls.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=['lifetime_spend', 'total_ordered', 'open_balance', 'order_count',
+                           'last_order_date', 'oldest_unpaid_order_date', 'updated_at'],
+        )
+
+    def __str__(self):
+        return f"Ledger for {self.customer}"
+
 class AuditTrail(models.Model):
     action = models.CharField(max_length=50)
     model_name = models.CharField(max_length=50)
     record_id = models.CharField(max_length=50)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set to when the change happened, which may be before the outbox dispatcher writes the entry.
+    timestamp = models.DateTimeField(default=timezone.now)
+    # JSON: the full record when is_snapshot is set, otherwise only the changed fields.
     details = models.TextField(blank=True, null=True)
+    is_snapshot = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'record_id', 'timestamp'], name='audit_record_history_idx'),
+            models.Index(fields=['user', 'timestamp'], name='audit_user_timestamp_idx'),
+            models.Index(fields=['timestamp', 'id'], name='audit_timestamp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.action} on {self.model_name} (ID: {self.record_id})"
+
+# --- 6. Transactional Outbox ---
+
+class OutboxEvent(models.Model):
+    """
+    A side effect waiting to happen. Written in the same transaction as the
+    change that caused it and drained by the run_outbox dispatcher, so the
+    request only pays for one extra INSERT.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    # Events of one aggregate (e.g. an order with its items and payments) are handled in id order.
+    aggregate_type = models.CharField(max_length=50)
+    aggregate_id = models.CharField(max_length=50)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='outbox_status_idx'),
+            models.Index(fields=['aggregate_type', 'aggregate_id', 'id'], name='outbox_aggregate_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_type}:{self.aggregate_id} ({self.status})"
+
+
+class CacheVersion(models.Model):
+    """
+    Change counter for data each worker keeps built in memory (the stock
+    catalog, the availability snapshot) when the cache is per-process;
+    see shared_cache.py.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+# --- 7. Background Jobs ---
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by `manage.py runworker`."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Lower runs first.
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    # Periodic runs use '<name>@<slot>' so several workers never queue the same run twice.
+    dedupe_key = models.CharField(max_length=150, unique=True, null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_at'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+# --- 8. Order Archive ---
+# Closed orders past ARCHIVE_AFTER_DAYS are moved here, with their items and
+# payments, by `manage.py archive_orders`. Rows keep their original primary
+# keys, and the reverse accessors (items, payment_set) match the live models.
+
+class ArchivedOrder(models.Model):
+    order_id = models.IntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_orders')
+    status = models.CharField(max_length=50)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    order_date = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'order_date'], name='archived_order_customer_idx'),
+            models.Index(fields=['order_date'], name='archived_order_date_idx'),
+            models.Index(fields=['archived_at'], name='archived_order_archived_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.order_id} for {self.customer.name}"
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    stock_item = models.ForeignKey(Stock, on_delete=models.PROTECT, related_name='+')
+    quantity = models.IntegerField()
+    price_each = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    product_name = models.CharField(max_length=255, blank=True)
+    package_type = models.CharField(max_length=50, choices=Stock.PACKAGE_TYPE_CHOICES, blank=True)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'order'], name='archived_item_product_idx'),
+        ]
+
+class ArchivedPayment(models.Model):
+    payment_id = models.IntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='payment_set', on_delete=models.CASCADE)
+    payment_date = models.DateTimeField()
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    method = models.CharField(max_length=50)
+    processed_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['payment_date'], name='archived_payment_date_idx'),
+        ]
+
+# --- 9. Bank Statements ---
+# Imported bank / mobile-money statements whose lines are matched to open
+# orders by statements.match_statement() and confirmed as Payments on the
+# review screen.
+
+class BankStatement(models.Model):
+    name = models.CharField(max_length=255)
+    # Payment.method given to the payments confirmed from this statement.
+    method = models.CharField(max_length=50, default='Online Transfer')
+    imported_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.imported_at:%Y-%m-%d})"
+
+class StatementLine(models.Model):
+    STATUS_CHOICES = [
+        ('unmatched', 'Unmatched'),
+        ('suggested', 'Suggested'),
+        ('confirmed', 'Confirmed'),
+        ('ignored', 'Ignored'),
+    ]
+    statement = models.ForeignKey(BankStatement, related_name='lines', on_delete=models.CASCADE)
+    line_no = models.PositiveIntegerField()
+    date = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    reference = models.CharField(max_length=255, blank=True)
+    payer = models.CharField(max_length=255, blank=True)
+    phone = models.CharField(max_length=30, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='unmatched')
+    matched_order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    score = models.FloatField(null=True, blank=True)
+    payment = models.OneToOneField(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='statement_line')
+
+    class Meta:
+        ordering = ['line_no']
+        indexes = [
+            models.Index(fields=['statement', 'status'], name='statement_line_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Line {self.line_no} of {self.statement}: {self.amount}"
+
+# --- 10. Customer Deduplication ---
+
+class DuplicateCandidate(models.Model):
+    """
+    A pair of customers that look like the same business, found by
+    `manage.py find_duplicate_customers`. customer_a has the lower id.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('dismissed', 'Not a duplicate'),
+    ]
+    customer_a = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    customer_b = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    # Comma-separated signals that matched: name, phone, email.
+    reasons = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    found_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer_a', 'customer_b'], name='unique_duplicate_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-score'], name='duplicate_status_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Customers {self.customer_a_id} / {self.customer_b_id}: {self.score:.2f}"
+
+# --- 11. Offline Sync ---
+
+class SyncReceipt(models.Model):
+    """
+    One order or payment applied from a tablet's offline queue, keyed by the
+    client-generated idempotency key so a resent batch is not applied twice.
+    """
+    KIND_CHOICES = [
+        ('order', 'Order'),
+        ('payment', 'Payment'),
+    ]
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # When the client captured it, as reported by the tablet.
+    captured_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.key}"
+
+# --- 12. Price History ---
+
+class PriceHistory(models.Model):
+    """
+    Effective-dated prices: a Product's selling_price or a Stock package's
+    price_per_package, valid from valid_from until valid_to (NULL while
+    current). Rows for one item never overlap; see prices.py for lookups.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name='price_history')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, null=True, blank=True, related_name='price_history')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(product__isnull=False, stock__isnull=True) | models.Q(product__isnull=True, stock__isnull=False),
+                name='price_history_one_item',
+            ),
+            models.UniqueConstraint(fields=['product'], condition=models.Q(valid_to__isnull=True), name='one_current_product_price'),
+            models.UniqueConstraint(fields=['stock'], condition=models.Q(valid_to__isnull=True), name='one_current_stock_price'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'valid_from'], name='price_product_from_idx'),
+            models.Index(fields=['stock', 'valid_from'], name='price_stock_from_idx'),
+        ]
+
+    @classmethod
+    def record(cls, item, price, when=None):
+        """
+        Makes `price` the current price of `item` (a Product or Stock) from
+        `when` (default now), closing the previous row. No-op if unchanged.
+        """
+        item_field = 'product' if isinstance(item, Product) else 'stock'
+        current = cls.objects.select_for_update().filter(**{item_field: item, 'valid_to__isnull': True}).first()
+        if current is not None and current.price == price:
+            return current
+        when = when or timezone.now()
+        if current is not None:
+            cls.objects.filter(pk=current.pk).update(valid_to=when)
+        return cls.objects.create(**{item_field: item}, price=price, valid_from=when)
 
     def __str__(self):
-        return f"{self.user} {self.action} on {self.model_name} (ID: {self.record_id})"
\ No newline at end of file
+        item = f"Product {self.product_id}" if self.product_id else f"Stock {self.stock_id}"
+        return f"{item}: {self.price} from {self.valid_from:%Y-%m-%d %H:%M}"
@@ -0,0 +1,109 @@
+# BWLapp/order_status.py
+"""
+Order status transitions, one order or hundreds at a time.
+
+Order.TRANSITIONS is the state machine. transition_orders() locks the
+orders, moves every one allowed to make the move with a single UPDATE,
+and writes its side effects in batches rather than per order:
+
+- one 'Updated Order' audit entry per order, bulk inserted;
+- for cancellations, the stock of every item goes back with one UPDATE
+  over the plain stock items and one bulk insert of 'return' movements;
+- the CustomerLedger rows of the orders' customers are refreshed, since
+  cancelled and returned orders leave their balances;
+- one notification for the whole batch.
+
+The UPDATE bypasses save() and its outbox events, so the audit entries
+and ledger refresh above stand in for the outbox handlers those events
+would have run.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from . import audit
+from .availability import invalidate_availability
+from .models import AuditTrail, CustomerLedger, CustomUser, Notification, Order, OrderItem, Stock, StockMovement
+
+
+def transition_orders(order_ids, status, user_id=None):
+    """
+    Moves the given orders to `status`. Returns (moved ids, {id: reason})
+    for the orders left alone: unknown, or not allowed to move there.
+    """
+    if status not in Order.TRANSITIONS:
+        raise ValueError(f"Unknown order status {status!r}.")
+    sources = {source for source, targets in Order.TRANSITIONS.items() if status in targets}
+    order_ids = set(order_ids)
+    with transaction.atomic():
+        locked = list(
+            Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk')
+            .values_list('pk', 'status', 'customer_id')
+        )
+        current = {pk: old for pk, old, _ in locked}
+        moved = sorted(pk for pk, old in current.items() if old in sources)
+        skipped = {pk: "No such order." for pk in order_ids - current.keys()}
+        skipped.update({
+            pk: f"An order can't go from {old} to {status}."
+            for pk, old in current.items() if old not in sources and old != status
+        })
+        if not moved:
+            return moved, skipped
+
+        Order.objects.filter(pk__in=moved).update(status=status)
+        now = timezone.now()
+        AuditTrail.objects.bulk_create([
+            AuditTrail(
+                user_id=user_id, action='Updated Order', model_name='Order', record_id=str(pk),
+                details=audit.to_json({'status': status}), timestamp=now,
+            )
+            for pk in moved
+        ], batch_size=1000)
+        if status == 'Cancelled':
+            _return_stock(moved, user_id)
+        moved_set = set(moved)
+        CustomerLedger.refresh({customer_id for pk, _, customer_id in locked if pk in moved_set})
+        Notification.objects.create(
+            message=f"{len(moved)} order{'s' if len(moved) != 1 else ''} moved to {status}."[:255]
+        )
+    return moved, skipped
+
+
+def _return_stock(order_ids, user_id):
+    """Puts the items of cancelled orders back in stock, one movement per item."""
+    items = list(OrderItem.objects.filter(order_id__in=order_ids).values_list('pk', 'order_id', 'stock_item_id', 'quantity'))
+    if not items:
+        return
+    returned = defaultdict(int)
+    for _, _, stock_id, quantity in items:
+        returned[stock_id] += quantity
+    # Locked in id order, like every other multi-item stock write.
+    stocks = {
+        stock.pk: stock
+        for stock in Stock.objects.select_for_update().filter(pk__in=returned).order_by('pk')
+    }
+    plain = {pk: quantity for pk, quantity in returned.items() if not stocks[pk].shard_count}
+    if plain:
+        Stock.objects.filter(pk__in=plain).update(
+            quantity=F('quantity') + Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in plain.items()]),
+            updated_at=timezone.now(),
+        )
+    movements = []
+    for item_id, order_id, stock_id, quantity in items:
+        note = f"Order {order_id} cancelled"
+        if stock_id in plain:
+            movements.append(StockMovement(
+                stock_id=stock_id, kind='return', change=quantity, source_model='OrderItem',
+                source_id=str(item_id), user_id=user_id, note=note,
+            ))
+        else:
+            # Sharded stock spreads the return over its shards and records the movement itself.
+            stocks[stock_id].adjust_quantity(
+                quantity, 'return', source=OrderItem(pk=item_id, order_id=order_id),
+                user=CustomUser(pk=user_id) if user_id else None, note=note,
+            )
+    StockMovement.objects.bulk_create(movements, batch_size=1000)
+    # bulk_create skips the post_save signal that normally does this.
+    transaction.on_commit(invalidate_availability)
@@ -0,0 +1,158 @@
+# BWLapp/outbox.py
+"""
+Transactional outbox.
+
+Model signals call emit(), which INSERTs an OutboxEvent in the same
+transaction as the change itself: if the change rolls back, so does the
+event. The run_outbox command drains pending events in batches and hands
+each one to the handlers registered for its event type.
+
+Delivery is at least once. Each event runs inside its own savepoint, so
+a failing handler rolls back the work of every handler for that event.
+The event is retried with exponential backoff and marked 'failed' after
+MAX_ATTEMPTS. While an event waits for a retry, or is being handled by
+another dispatcher, later events of the same aggregate are held back so
+they are never handled out of order.
+"""
+import logging
+import traceback
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from threading import local
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 10
+BASE_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 3600
+
+_handlers = defaultdict(list)
+_state = local()
+
+
+def handler(*event_types):
+    """Registers the decorated function for one or more event types."""
+    def decorator(func):
+        for event_type in event_types:
+            _handlers[event_type].append(func)
+        return func
+    return decorator
+
+
+def handlers_for(event_type):
+    return list(_handlers.get(event_type, ()))
+
+
+@contextmanager
+def suppressed():
+    """
+    Skips emit() and audit value tracking inside the block, e.g. for bulk
+    loads that rebuild derived data afterwards.
+    """
+    previous = getattr(_state, 'suppressed', False)
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
+
+def is_suppressed():
+    return getattr(_state, 'suppressed', False)
+
+
+def emit(event_type, aggregate_type, aggregate_id, payload=None):
+    """Queues an event in the current transaction. Returns it, or None when suppressed."""
+    if is_suppressed():
+        return None
+    return OutboxEvent.objects.create(
+        event_type=event_type,
+        aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id),
+        payload=payload or {},
+    )
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def has_later_pending(event, event_types):
+    """True when a newer pending event of the same aggregate will redo this work anyway."""
+    return OutboxEvent.objects.filter(
+        aggregate_type=event.aggregate_type,
+        aggregate_id=event.aggregate_id,
+        status='pending',
+        event_type__in=event_types,
+        id__gt=event.id,
+    ).exists()
+
+
+def _handle(event):
+    with transaction.atomic():
+        for func in handlers_for(event.event_type):
+            func(event)
+
+
+def dispatch_batch(batch_size=100):
+    """
+    Handles up to `batch_size` due events, oldest first. Returns a
+    {'done': n, 'retried': n, 'failed': n, 'deferred': n} summary.
+    """
+    summary = {'done': 0, 'retried': 0, 'failed': 0, 'deferred': 0}
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Several dispatchers can share the table: each one skips rows another has locked.
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return summary
+
+        # Aggregates with an older pending event this dispatcher didn't claim, keyed
+        # to that event's id: it is waiting for a retry, or another dispatcher holds it.
+        blocked = {}
+        waiting = (
+            OutboxEvent.objects.filter(status='pending', id__lt=events[-1].id)
+            .exclude(pk__in=[event.pk for event in events])
+            .values_list('aggregate_type', 'aggregate_id', 'id')
+        )
+        for aggregate_type, aggregate_id, event_id in waiting:
+            key = (aggregate_type, aggregate_id)
+            blocked[key] = min(blocked.get(key, event_id), event_id)
+
+        done_ids = []
+        for event in events:
+            key = (event.aggregate_type, event.aggregate_id)
+            if key in blocked and blocked[key] < event.id:
+                summary['deferred'] += 1
+                continue
+            try:
+                _handle(event)
+            except Exception:
+                logger.exception("Outbox event %s (%s) failed", event.pk, event.event_type)
+                event.attempts += 1
+                event.last_error = traceback.format_exc()
+                if event.attempts >= MAX_ATTEMPTS:
+                    event.status = 'failed'
+                    summary['failed'] += 1
+                else:
+                    event.next_attempt_at = timezone.now() + backoff(event.attempts)
+                    blocked.setdefault(key, event.id)
+                    summary['retried'] += 1
+                event.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+                continue
+            done_ids.append(event.pk)
+
+        summary['done'] = len(done_ids)
+        OutboxEvent.objects.filter(pk__in=done_ids).update(status='done', processed_at=timezone.now())
+    return summary
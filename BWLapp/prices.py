@@ -0,0 +1,119 @@
+# BWLapp/prices.py
+"""
+Effective-dated price lookups.
+
+PriceHistory keeps every selling_price a Product has had and every
+price_per_package a Stock package has had. Product.save() and
+Stock.save() close the current row and open a new one when the price
+changes. Prices from before the history began (migration 0015) are
+unknown and resolve to the price the item had then, from HISTORY_START.
+
+Order items snapshot their product's price at the time of sale as
+unit_cost; fill_product_snapshots() derives it here for items written
+without save().
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import PriceHistory, Product, Stock
+
+HISTORY_START = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+# The live field each history row mirrors.
+CURRENT_PRICE_FIELDS = {Product: 'selling_price', Stock: 'price_per_package'}
+
+
+def _item_field(model):
+    if model not in CURRENT_PRICE_FIELDS:
+        raise ValueError(f"No price history for {model.__name__}.")
+    return 'product' if model is Product else 'stock'
+
+
+def prices_as_of(model, ids, when):
+    """
+    {id: price} for the given Products or Stock packages as of `when`, in
+    one indexed query. Ids with no price at that time are left out.
+    """
+    item_field = _item_field(model)
+    rows = PriceHistory.objects.filter(
+        Q(valid_to__gt=when) | Q(valid_to__isnull=True),
+        **{f'{item_field}_id__in': ids, 'valid_from__lte': when},
+    ).values_list(f'{item_field}_id', 'price')
+    return dict(rows)
+
+
+def annotate_price_as_of(queryset, item, at, name='price_as_of'):
+    """
+    Annotates `name` on each row: the price of the Product or Stock at
+    lookup path `item`, as of the datetime at lookup path `at`, e.g.
+    annotate_price_as_of(OrderItem.objects, 'stock_item__product', 'order__order_date').
+
+    The history row is found with one LEFT JOIN conditioned on the date
+    rather than a lookup per row. Rows the history doesn't cover fall back
+    to the current price.
+    """
+    model = queryset.model
+    for part in item.split('__'):
+        model = model._meta.get_field(part).related_model
+    _item_field(model)
+    history = f'{item}__price_history'
+    relation = f'_{name}_history'
+    return queryset.annotate(**{
+        relation: FilteredRelation(history, condition=(
+            Q(**{f'{history}__valid_from__lte': F(at)})
+            & (Q(**{f'{history}__valid_to__gt': F(at)}) | Q(**{f'{history}__valid_to__isnull': True}))
+        )),
+    }).annotate(**{
+        name: Coalesce(F(f'{relation}__price'), F(f'{item}__{CURRENT_PRICE_FIELDS[model]}')),
+    })
+
+
+def sync_price_history(using='default'):
+    """
+    Brings the history up to date with prices written without save(), e.g.
+    by load_seed: items whose current row is missing or differs get a new
+    one from now. Returns the number of rows opened.
+    """
+    now = timezone.now()
+    opened = []
+    for model, price_field in CURRENT_PRICE_FIELDS.items():
+        item_field = _item_field(model)
+        current = dict(
+            PriceHistory.objects.using(using).filter(**{f'{item_field}__isnull': False, 'valid_to__isnull': True})
+            .values_list(f'{item_field}_id', 'price')
+        )
+        changed = {
+            pk: price for pk, price in model.objects.using(using).values_list('pk', price_field)
+            if current.get(pk) != price
+        }
+        PriceHistory.objects.using(using).filter(
+            **{f'{item_field}_id__in': [pk for pk in changed if pk in current], 'valid_to__isnull': True}
+        ).update(valid_to=now)
+        opened += [
+            PriceHistory(**{f'{item_field}_id': pk}, price=price, valid_from=now if pk in current else HISTORY_START)
+            for pk, price in changed.items()
+        ]
+    PriceHistory.objects.using(using).bulk_create(opened, batch_size=1000)
+    return len(opened)
+
+
+def fill_product_snapshots(model, using='default', batch_size=1000):
+    """
+    Fills the product snapshot of OrderItems or ArchivedOrderItems written
+    without save(), costing each at its product's price on the order date.
+    Returns the number of items filled.
+    """
+    items = annotate_price_as_of(
+        model.objects.using(using).filter(product__isnull=True),
+        'stock_item__product', 'order__order_date', name='price_then',
+    ).values_list('pk', 'stock_item__product_id', 'stock_item__product__name', 'stock_item__package_type', 'price_then')
+    filled = [
+        model(pk=pk, product_id=product_id, product_name=name, package_type=package_type, unit_cost=price)
+        for pk, product_id, name, package_type, price in items.iterator(chunk_size=batch_size)
+    ]
+    model.objects.using(using).bulk_update(
+        filled, ['product', 'product_name', 'package_type', 'unit_cost'], batch_size=batch_size,
+    )
+    return len(filled)
@@ -0,0 +1,182 @@
+# BWLapp/reconcile.py
+"""
+Stock reconciliation.
+
+For every stock item three numbers are compared:
+
+- on hand: `available_quantity` (the shard sum for sharded stock);
+- ledger: the sum of its StockMovements;
+- expected: what receipts and order history imply. That is the opening
+  balance, receipts and manual adjustments, minus the quantity of every
+  order item (live or archived) placed since the opening balance, except
+  on cancelled orders, whose stock went back.
+
+Order items placed before a stock item's opening balance are already
+netted into it, so only the movements their later edits wrote count.
+For newer items the movements orders wrote are ignored and the item
+quantities are used instead, so an item changed without its movement
+shows up as drift, as does a quantity written without one.
+
+Stock ids are split into ranges that are checked in parallel processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connection, connections, transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+
+from . import audit
+from .availability import invalidate_availability
+from .models import ArchivedOrderItem, AuditTrail, OrderItem, Stock, StockMovement, StockShard
+
+# source_model of the movements fixes write. Expected stock ignores them,
+# since they only bring the ledger in line with the order history.
+RECONCILIATION_SOURCE = 'Reconciliation'
+
+
+def partitions(ids, count):
+    """Splits sorted `ids` into at most `count` inclusive (low, high) ranges of similar size."""
+    ids = sorted(ids)
+    if not ids:
+        return []
+    size = -(-len(ids) // max(count, 1))
+    return [(ids[offset], ids[min(offset + size, len(ids)) - 1]) for offset in range(0, len(ids), size)]
+
+
+def _on_hand(low, high):
+    on_hand, sharded = {}, []
+    for pk, quantity, shard_count in Stock.objects.filter(pk__range=(low, high)).values_list('pk', 'quantity', 'shard_count'):
+        on_hand[pk] = 0 if shard_count else quantity
+        if shard_count:
+            sharded.append(pk)
+    if sharded:
+        totals = StockShard.objects.filter(stock_id__in=sharded).values('stock_id').annotate(total=Sum('quantity'))
+        on_hand.update((row['stock_id'], row['total'] or 0) for row in totals)
+    return on_hand
+
+
+def _order_items(stock_range=None, pks=None):
+    """{item id: (stock id, quantity, order date, order status)} over the live and archived items."""
+    items = {}
+    for model in (OrderItem, ArchivedOrderItem):
+        rows = model.objects.all()
+        if stock_range:
+            rows = rows.filter(stock_item_id__gte=stock_range[0], stock_item_id__lte=stock_range[1])
+        if pks is not None:
+            rows = rows.filter(pk__in=pks)
+        for pk, stock_id, quantity, order_date, status in rows.values_list(
+            'pk', 'stock_item_id', 'quantity', 'order__order_date', 'order__status',
+        ):
+            items[pk] = (stock_id, quantity, order_date, status)
+    return items
+
+
+def check_range(bounds):
+    """
+    Reconciles the stock items with ids in `bounds` (inclusive). Returns
+    (items checked, [drift dicts]) where each drift has stock_id, on_hand,
+    ledger and expected.
+    """
+    low, high = bounds
+    try:
+        on_hand = _on_hand(low, high)
+        openings = dict(
+            StockMovement.objects.filter(stock_id__gte=low, stock_id__lte=high, kind='opening')
+            .values('stock_id').annotate(taken_at=Min('created_at')).values_list('stock_id', 'taken_at')
+        )
+        items = _order_items(stock_range=bounds)
+        movements = list(
+            StockMovement.objects.filter(stock_id__gte=low, stock_id__lte=high)
+            .values_list('stock_id', 'change', 'source_model', 'source_id')
+        )
+        # Items swapped off these stock items since are needed for their order date.
+        referenced = {
+            int(source_id) for _, _, source_model, source_id in movements
+            if source_model == 'OrderItem' and source_id.isdigit()
+        }
+        items.update(_order_items(pks=sorted(referenced - items.keys())))
+
+        def placed_after_opening(order_date, stock_id):
+            opened = openings.get(stock_id)
+            return opened is None or order_date >= opened
+
+        ledger = dict.fromkeys(on_hand, 0)
+        expected = dict.fromkeys(on_hand, 0)
+        for stock_id, change, source_model, source_id in movements:
+            ledger[stock_id] += change
+            if source_model == RECONCILIATION_SOURCE:
+                continue
+            if source_model == 'OrderItem' and source_id.isdigit() and int(source_id) in items:
+                if placed_after_opening(items[int(source_id)][2], stock_id):
+                    continue  # Counted from the item itself below.
+            expected[stock_id] += change
+        for stock_id, quantity, order_date, status in items.values():
+            if status == 'Cancelled':
+                continue  # Not demand: cancelling returned the stock (and its movement is ignored above).
+            if stock_id in expected and placed_after_opening(order_date, stock_id):
+                expected[stock_id] -= quantity
+
+        drift = [
+            {'stock_id': pk, 'on_hand': on_hand[pk], 'ledger': ledger[pk], 'expected': expected[pk]}
+            for pk in sorted(on_hand)
+            if not on_hand[pk] == ledger[pk] == expected[pk]
+        ]
+        return len(on_hand), drift
+    finally:
+        connection.close()
+
+
+def _init_worker():
+    django.setup()
+
+
+def find_drift(workers=4, partition_count=None):
+    """
+    Checks every stock item across `workers` processes. Returns
+    (items checked, drift dicts sorted by stock id).
+    """
+    ranges = partitions(Stock.objects.values_list('pk', flat=True), partition_count or workers * 4)
+    if workers > 1 and len(ranges) > 1:
+        # Children must open their own connections rather than share the parent's.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            results = list(pool.map(check_range, ranges))
+    else:
+        results = [check_range(bounds) for bounds in ranges]
+    checked = sum(count for count, _ in results)
+    return checked, [row for _, rows in results for row in rows]
+
+
+def fix_drift(row, user=None):
+    """
+    Sets the stock item's quantity (and ledger) to the expected value and
+    writes an audit entry. Returns False when the quantity moved since the
+    check, or the expected value is negative, leaving it for the next run.
+    """
+    if row['expected'] < 0:
+        return False
+    with transaction.atomic():
+        stock = Stock.objects.select_for_update().get(pk=row['stock_id'])
+        if stock.available_quantity != row['on_hand']:
+            return False
+        ledger = stock.movements.aggregate(total=Sum('change'))['total'] or 0
+        if ledger != row['ledger']:
+            return False
+        if stock.shard_count:
+            stock.rebalance_shards(row['expected'])
+        # The movement below is skipped when only the quantity drifted, so
+        # bump updated_at for sync clients (sync.stock_delta) either way.
+        Stock.objects.filter(pk=stock.pk).update(quantity=row['expected'], updated_at=timezone.now())
+        transaction.on_commit(invalidate_availability)
+        entry = AuditTrail.objects.create(
+            action='Reconciled Stock', model_name='Stock', record_id=str(stock.pk), user=user,
+            details=audit.to_json(row),
+        )
+        if row['expected'] != ledger:
+            StockMovement.objects.create(
+                stock=stock, kind='adjustment', change=row['expected'] - ledger,
+                source_model=RECONCILIATION_SOURCE, source_id=str(entry.pk), user=user,
+                note=f"Reconciliation: on hand was {row['on_hand']}",
+            )
+    return True
@@ -0,0 +1,251 @@
+# BWLapp/seed.py
+"""
+Streaming bulk loader for Django JSON fixtures.
+
+`loaddata` reads the whole fixture into memory and saves objects one at a
+time, firing every model signal. This module parses the top-level JSON
+array one object at a time, buffers up to `batch_size` objects per model
+and writes each buffer with a single bulk_create. A model's buffer is only
+written after the buffers of the models it points to, so rows go in in
+dependency order.
+"""
+import codecs
+import gzip
+import io
+import json
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connections
+from django.utils import timezone
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+
+# UTF-32 LE starts with the UTF-16 LE BOM, so it has to be tested first.
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def open_fixture(path):
+    """Opens a (optionally .gz) fixture as text, picking the encoding from its byte order mark."""
+    raw = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+    if not hasattr(raw, 'peek'):
+        raw = io.BufferedReader(raw)
+    head = raw.peek(4)[:4]
+    encoding = next((name for bom, name in BOMS if head.startswith(bom)), 'utf-8')
+    return io.TextIOWrapper(raw, encoding=encoding, newline='')
+
+
+def iter_json_array(stream, chunk_size=CHUNK_SIZE):
+    """
+    Yields the elements of a top-level JSON array read from a text stream,
+    holding only the current element (plus one chunk) in memory.
+    Raises ValueError on malformed input.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            read_more()
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("Fixture must be a JSON array")
+    pos += 1
+
+    first = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of fixture")
+        if buffer[pos] == ']':
+            return
+        if not first:
+            if buffer[pos] != ',':
+                raise ValueError(f"Expected ',' between fixture objects, got {buffer[pos]!r}")
+            pos += 1
+            skip_whitespace()
+        first = False
+
+        while True:
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Malformed fixture object") from None
+                read_more()
+        yield obj
+
+
+@lru_cache(maxsize=None)
+def dependencies(model):
+    """Models `model` has a foreign key to (self-references excluded)."""
+    return frozenset(
+        field.related_model for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is not model
+    )
+
+
+def topological_levels(models):
+    """
+    Groups `models` into levels where each model only depends on models in
+    earlier levels. Models in a dependency cycle share the last level.
+    """
+    remaining = set(models)
+    levels = []
+    while remaining:
+        level = [m for m in remaining if not (dependencies(m) & remaining)]
+        if not level:
+            level = list(remaining)
+        level.sort(key=lambda m: m._meta.label)
+        levels.append(level)
+        remaining.difference_update(level)
+    return levels
+
+
+def topological_order(models):
+    return [model for level in topological_levels(models) for model in level]
+
+
+def reset_sequences(models, using='default'):
+    """Moves auto-increment sequences past the highest loaded primary key."""
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), list(models))
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def timestamp_fields(model):
+    """The model's auto_now/auto_now_add fields."""
+    return [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+
+
+def fill_missing_timestamps(model, objects):
+    """
+    Sets auto_now/auto_now_add fields the fixture left out (e.g. rows dumped
+    before the field existed) to the current time. Values it has are kept.
+    """
+    now = timezone.now()
+    for field in timestamp_fields(model):
+        for obj in objects:
+            if getattr(obj, field.attname) is None:
+                setattr(obj, field.attname, now)
+
+
+@contextmanager
+def raw_timestamps(model):
+    """
+    Keeps bulk_create from replacing auto_now/auto_now_add values with the
+    current time, as loaddata's raw saves do.
+    """
+    fields = [(field, field.auto_now, field.auto_now_add) for field in timestamp_fields(model)]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class BulkLoader:
+    """
+    Accepts fixture objects one at a time via add() and writes them with
+    bulk_create in batches. finish() writes whatever is still buffered,
+    plus the many-to-many rows, and returns a Counter of rows per model.
+    With upsert=True, rows whose primary key already exists are updated.
+    """
+
+    def __init__(self, using='default', batch_size=1000, upsert=False):
+        self.using = using
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.buffers = defaultdict(list)
+        self.m2m_rows = defaultdict(list)
+        self.counts = Counter()
+
+    def add(self, data):
+        model = apps.get_model(data['model'])
+        if model._meta.parents:
+            raise ValueError(f"{model._meta.label} uses multi-table inheritance, which bulk_create can't load")
+        self.buffers[model].append(data)
+        if len(self.buffers[model]) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model, _visiting=None):
+        visiting = _visiting or set()
+        visiting.add(model)
+        for dependency in dependencies(model):
+            if self.buffers.get(dependency) and dependency not in visiting:
+                self.flush(dependency, visiting)
+
+        pending = self.buffers.pop(model, [])
+        if not pending:
+            return
+        objects = []
+        for deserialized in serializers.deserialize('python', pending, using=self.using, ignorenonexistent=True):
+            objects.append(deserialized.object)
+            for name, related_ids in (deserialized.m2m_data or {}).items():
+                self._collect_m2m(model, deserialized.object.pk, name, related_ids)
+        self.bulk_insert(model, objects)
+
+    def _collect_m2m(self, model, pk, name, related_ids):
+        field = model._meta.get_field(name)
+        through = field.remote_field.through
+        if not through._meta.auto_created:
+            return  # Explicit through models come with their own fixture rows.
+        source, target = f"{field.m2m_field_name()}_id", f"{field.m2m_reverse_field_name()}_id"
+        self.m2m_rows[through].extend(through(**{source: pk, target: related_id}) for related_id in related_ids)
+
+    def bulk_insert(self, model, objects):
+        options = {'batch_size': self.batch_size}
+        if self.upsert:
+            pk = model._meta.pk
+            update_fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+            if update_fields:
+                options.update(update_conflicts=True, unique_fields=[pk.name], update_fields=update_fields)
+            else:
+                options['ignore_conflicts'] = True
+        fill_missing_timestamps(model, objects)
+        with raw_timestamps(model):
+            model._base_manager.using(self.using).bulk_create(objects, **options)
+        self.counts[model] += len(objects)
+
+    def finish(self):
+        for model in topological_order([m for m, rows in self.buffers.items() if rows]):
+            self.flush(model)
+        for through, rows in self.m2m_rows.items():
+            if not rows:
+                continue
+            through._base_manager.using(self.using).bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+            self.counts[through] += len(rows)
+        self.m2m_rows.clear()
+        return self.counts
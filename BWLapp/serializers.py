@@ -0,0 +1,207 @@
+# BWLapp/serializers.py
+"""Serializers for the REST API in api.py."""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from . import order_status
+from .models import Customer, Order, OrderItem, Payment, Stock, StockMovement
+
+
+class SparseFieldsMixin:
+    """
+    On GET, drops every field not named in the `?fields=a,b` parameter.
+    Unknown names are ignored; writes always see every field.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not request.query_params.get('fields'):
+            return
+        wanted = {name.strip() for name in request.query_params['fields'].split(',')}
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Looks ids up in the `related_cache` a bulk request preloads with one
+    query per model (see api.BulkMixin) instead of one query per object,
+    like CachedModelChoiceField does for forms.
+    """
+    def to_internal_value(self, data):
+        objects = (self.context.get('related_cache') or {}).get(self.get_queryset().model)
+        if objects is not None:
+            try:
+                obj = objects.get(self.get_queryset().model._meta.pk.to_python(data))
+            except DjangoValidationError:
+                obj = None
+            if obj is not None:
+                return obj
+        return super().to_internal_value(data)
+
+
+class BaseModelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
+
+def request_user_id(context):
+    """The JWT user's id; simplejwt hands it over as a string."""
+    return int(context['request'].user.id)
+
+
+def raise_model_errors(exc):
+    """Re-raises a model ValidationError (e.g. insufficient stock) as an API one."""
+    raise serializers.ValidationError(exc.message_dict if hasattr(exc, 'error_dict') else exc.messages)
+
+
+class CustomerSerializer(BaseModelSerializer):
+    class Meta:
+        model = Customer
+        fields = ['cust_id', 'name', 'email', 'phone', 'address']
+
+
+class StockSerializer(BaseModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    # Setting quantity records a stock-count adjustment, as the stock form does.
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    class Meta:
+        model = Stock
+        fields = ['id', 'product', 'product_name', 'package_type', 'quantity', 'price_per_package', 'is_available']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'quantity' in data and instance.shard_count:
+            data['quantity'] = instance.available_quantity
+        return data
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            stock = super().create(validated_data)
+            if stock.quantity:
+                StockMovement.objects.create(
+                    stock=stock, kind='receipt', change=stock.quantity, user_id=request_user_id(self.context),
+                )
+        return stock
+
+    def update(self, instance, validated_data):
+        quantity = validated_data.pop('quantity', None)
+        with transaction.atomic():
+            stock = super().update(instance, validated_data)
+            if quantity is not None:
+                locked = Stock.objects.select_for_update().get(pk=stock.pk)
+                change = quantity - locked.available_quantity
+                if locked.shard_count:
+                    locked.rebalance_shards(quantity)
+                else:
+                    Stock.objects.filter(pk=stock.pk).update(quantity=quantity, updated_at=timezone.now())
+                stock.quantity = quantity
+                if change:
+                    StockMovement.objects.create(
+                        stock=stock, kind='adjustment', change=change,
+                        user_id=request_user_id(self.context), note="Set through the API",
+                    )
+        return stock
+
+
+class OrderItemSerializer(BaseModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'order', 'stock_item', 'quantity', 'price_each']
+        extra_kwargs = {'price_each': {'required': False}}
+
+    def validate_quantity(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Quantity must be at least 1.")
+        return value
+
+    def save(self, **kwargs):
+        # OrderItem.save() deducts stock and raises a model ValidationError when short.
+        try:
+            return super().save(**kwargs)
+        except DjangoValidationError as exc:
+            raise_model_errors(exc)
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    """An item nested in an order; the order comes from the parent."""
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'stock_item', 'quantity', 'price_each']
+        extra_kwargs = {'price_each': {'required': False}}
+
+    def validate_quantity(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Quantity must be at least 1.")
+        return value
+
+
+class OrderSerializer(BaseModelSerializer):
+    items = OrderLineSerializer(many=True, required=False)
+
+    class Meta:
+        model = Order
+        fields = ['order_id', 'customer', 'status', 'created_by', 'order_date', 'items']
+        read_only_fields = ['created_by', 'order_date']
+
+    def validate_status(self, value):
+        try:
+            Order.check_transition(self.instance.status if self.instance else None, value)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+        return value
+
+    def create(self, validated_data):
+        items = validated_data.pop('items', [])
+        with transaction.atomic():
+            order = Order.objects.create(created_by_id=request_user_id(self.context), **validated_data)
+            try:
+                for item in items:
+                    OrderItem(order=order, **item).save()
+            except DjangoValidationError as exc:
+                raise_model_errors(exc)
+        return order
+
+    def update(self, instance, validated_data):
+        if 'items' in validated_data:
+            raise serializers.ValidationError({'items': "Change items through the order-items endpoint."})
+        status = validated_data.pop('status', instance.status)
+        with transaction.atomic():
+            # The save below writes every field: lock the row and start from its
+            # current status so a stale one is never written back.
+            instance.status = Order.objects.select_for_update().values_list('status', flat=True).get(pk=instance.pk)
+            order = super().update(instance, validated_data)
+            if status != order.status:
+                # Through the state machine, so cancelling returns the stock.
+                _, skipped = order_status.transition_orders([order.pk], status, request_user_id(self.context))
+                if order.pk in skipped:
+                    # Another request moved the order after validate_status saw it.
+                    raise serializers.ValidationError({'status': [skipped[order.pk]]})
+                order.refresh_from_db(fields=['status'])
+        return order
+
+
+class PaymentSerializer(BaseModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['payment_id', 'order', 'payment_date', 'total_amount', 'method', 'processed_by']
+        read_only_fields = ['payment_date', 'processed_by']
+        # Left out, the total is the order's item total (see Payment.save).
+        extra_kwargs = {'total_amount': {'required': False}}
+
+    def create(self, validated_data):
+        return super().create({'processed_by_id': request_user_id(self.context), **validated_data})
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Puts the user's role in the token so API requests never load the user."""
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['role'] = user.role
+        return token
@@ -0,0 +1,77 @@
+# BWLapp/shared_cache.py
+"""
+Whether a change recorded in the cache reaches every process.
+
+The default CACHES entry is a LocMemCache, private to each gunicorn
+worker (and to run_outbox, runworker and management commands). A key
+deleted or bumped there is only deleted or bumped in that process, so
+anything whose correctness depends on seeing other processes' writes has
+to check cache_is_shared() and fall back to the database without it.
+Set REDIS_URL to share the cache.
+
+get_version() applies that to data a worker keeps built in memory (the
+stock catalog, the availability snapshot): writers bump a counter with
+bump_version() once their change commits, and workers rebuild when it
+moves. Without a shared cache the counter is a CacheVersion row, read by
+primary key at most once every VERSION_CHECK_SECONDS per process, so a
+change made elsewhere shows up within that interval and a burst of
+changes costs one rebuild. Changes made in this process show at once.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CacheVersion
+
+# This process's last read of each CacheVersion row: key -> (expires, version).
+_checked = {}
+
+
+def cache_is_shared(alias='default'):
+    """False for per-process (LocMem) and no-op (Dummy) caches."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def version_check_seconds():
+    return getattr(settings, 'VERSION_CHECK_SECONDS', 1)
+
+
+def get_version(key):
+    """The counter at `key`: in the shared cache, else in the CacheVersion table."""
+    if not cache_is_shared():
+        checked = _checked.get(key)
+        if checked is not None and checked[0] > time.monotonic():
+            return checked[1]
+        version = CacheVersion.objects.filter(key=key).values_list('version', flat=True).first() or 0
+        _checked[key] = (time.monotonic() + version_check_seconds(), version)
+        return version
+    version = cache.get(key)
+    if version is None:
+        # Start from a number no earlier counter (since evicted) can have reached.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Called after a change commits."""
+    if cache_is_shared():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+        return
+    _checked.pop(key, None)
+    if CacheVersion.objects.filter(key=key).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            CacheVersion.objects.create(key=key, version=1)
+    except IntegrityError:
+        # Another process created the row first.
+        CacheVersion.objects.filter(key=key).update(version=F('version') + 1)
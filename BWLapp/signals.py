@@ -1,49 +1,66 @@
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from django.forms.models import model_to_dict
 from django.db import transaction
-from django.core.exceptions import ValidationError
-from django.core.serializers.json import DjangoJSONEncoder
-from decimal import Decimal
-import json
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Order, Product, Customer, AuditTrail, OrderItem, Payment
+from .models import Order, Product, Profile, Customer, OrderItem, Payment, Stock, StockMovement
+from . import audit, outbox, handlers  # noqa: F401 -- importing handlers registers them
+from .availability import invalidate_availability
+from .catalog import invalidate_catalog
+from .identity import invalidate_identity
+from .seed import fill_missing_timestamps
 
 # Now get the custom User model
 User = get_user_model()
 
-# --- New: Custom JSON Encoder for Decimal values ---
-class CustomJSONEncoder(DjangoJSONEncoder):
+# Foreign keys copied into every event so handlers don't have to reload deleted rows.
+REF_FIELDS = ('customer_id', 'order_id', 'stock_item_id')
+
+def _audit_user_id(instance):
+    if isinstance(instance, User):
+        return instance.pk
+    return getattr(instance, 'created_by_id', None) or getattr(instance, 'processed_by_id', None)
+
+def _aggregate(instance):
+    """Orders, their items and their payments share one aggregate so their events stay in order."""
+    if isinstance(instance, (OrderItem, Payment)):
+        return 'Order', instance.order_id
+    return type(instance).__name__, instance.pk
+
+def _emit(instance, action, payload, loaded=None):
+    aggregate_type, aggregate_id = _aggregate(instance)
+    payload['record_id'] = instance.pk
+    refs = {name: getattr(instance, name) for name in REF_FIELDS if hasattr(instance, name)}
+    # A save that moved the row (e.g. an order to another customer) also names where it was.
+    for name, value in list(refs.items()):
+        previous = (loaded or {}).get(name)
+        if previous is not None and previous != value:
+            refs[f'previous_{name}'] = previous
+    payload['refs'] = refs
+    outbox.emit(f"{type(instance).__name__}.{action}", aggregate_type, aggregate_id, payload)
+
+@receiver(pre_save)
+def fill_fixture_timestamps(sender, instance, raw, **kwargs):
     """
-    A custom JSON encoder that handles Decimal objects by converting them to strings.
-    This prevents the "TypeError: Object of type Decimal is not JSON serializable" error.
+    loaddata saves raw, skipping auto_now, so a fixture row without e.g.
+    Stock.updated_at would hit its NOT NULL column. Give it the current time.
     """
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return str(obj)
-        return super().default(obj)
-
-# --- End Custom JSON Encoder ---
+    if raw:
+        fill_missing_timestamps(sender, [instance])
 
-@receiver(post_save, sender=Order)
-def update_product_stock(sender, instance, created, **kwargs):
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=Customer)
+@receiver(post_init, sender=Order)
+@receiver(post_init, sender=OrderItem)
+@receiver(post_init, sender=Payment)
+@receiver(post_init, sender=User)
+def track_loaded_values(sender, instance, **kwargs):
     """
-    Reduces product stock quantity and increases quantity_sold when a new order is created.
+    Remembers the field values each audited instance was loaded with, so a
+    later save can log only what changed. Skipped during bulk seed loads.
     """
-    if created:
-        for item in instance.items.all():
-            product = item.product
-            if product.stock_quantity >= item.quantity:
-                product.stock_quantity -= item.quantity
-                # Note: 'quantity_sold' field is not in your models.py.
-                # If you have it, uncomment the line below. Otherwise, remove it.
-                # product.quantity_sold += item.quantity
-                product.save()
-            else:
-                # Optional: cancel the order or raise error
-                raise ValidationError(
-                    f"Not enough stock for {product.name}. Available: {product.stock_quantity}, Ordered: {item.quantity}"
-                )
+    if outbox.is_suppressed():
+        return
+    audit.remember_loaded_values(instance)
 
 @receiver(post_save, sender=Product)
 @receiver(post_save, sender=Customer)
@@ -51,50 +68,58 @@ def update_product_stock(sender, instance, created, **kwargs):
 @receiver(post_save, sender=OrderItem)
 @receiver(post_save, sender=Payment)
 @receiver(post_save, sender=User)
-def log_post_save(sender, instance, created, **kwargs):
+def emit_saved(sender, instance, created, **kwargs):
     """
-    Logs creation and update actions for key models in the AuditTrail.
+    Queues a '<Model>.saved' outbox event carrying the changed fields (all
+    fields on create). The audit entry, ledger refresh and other side
+    effects are handled by the run_outbox dispatcher; see handlers.py.
     """
-    if transaction.get_connection().in_atomic_block:
-        transaction.on_commit(lambda: _do_log_post_save(sender, instance, created))
-    else:
-        _do_log_post_save(sender, instance, created)
-
-def _do_log_post_save(sender, instance, created):
-    action = f"Created {sender.__name__}" if created else f"Updated {sender.__name__}"
-    user = getattr(instance, 'created_by', None) or getattr(instance, 'processed_by', None)
-    if isinstance(instance, User):
-        user = instance
-
-    if instance.pk:
-        try:
-            # Corrected: Use CustomJSONEncoder for serialization
-            details = json.dumps(model_to_dict(instance, exclude=['password', 'last_login', 'is_superuser']), cls=CustomJSONEncoder)
-        except Exception as e:
-            details = f"Could not serialize instance to JSON: {e}"
+    values = audit.current_values(instance) if created else audit.changed_values(instance)
+    if not values:
+        return  # Saved without changes: nothing to do.
+    loaded = None if created else getattr(instance, '_audit_loaded', None)
+    audit.remember_loaded_values(instance)
+    _emit(instance, 'saved', {
+        'created': created,
+        'user_id': _audit_user_id(instance),
+        'values': values,
+    }, loaded)
 
-        AuditTrail.objects.create(
-            user=user,
-            action=action,
-            details=details
-        )
 @receiver(post_delete, sender=Product)
 @receiver(post_delete, sender=Customer)
 @receiver(post_delete, sender=Order)
-def log_post_delete(sender, instance, **kwargs):
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_delete, sender=Payment)
+def emit_deleted(sender, instance, **kwargs):
+    """Queues a '<Model>.deleted' outbox event with a final copy of the row."""
+    _emit(instance, 'deleted', {'values': audit.current_values(instance)})
+
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def stale_catalog(sender, **kwargs):
     """
-    Logs deletion actions for key models in the AuditTrail.
+    Package details changed. Bumped in the request, not from the outbox, so
+    the change is searchable as soon as it commits.
     """
-    user = None # This part is tricky. Deletion signals don't carry the user.
-    
-    try:
-        # Corrected: Use CustomJSONEncoder for serialization
-        details = json.dumps(model_to_dict(instance), cls=CustomJSONEncoder)
-    except Exception as e:
-        details = f"Could not serialize deleted instance to JSON: {e}"
-        
-    AuditTrail.objects.create(
-        user=user,
-        action=f"Deleted {sender.__name__}",
-        details=details
-    )
\ No newline at end of file
+    transaction.on_commit(invalidate_catalog)
+
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+@receiver(post_save, sender=StockMovement)
+def stale_availability(sender, **kwargs):
+    """
+    A price or quantity changed. Bumped here rather than from the outbox so
+    the availability snapshot is stale the moment the change commits.
+    """
+    transaction.on_commit(invalidate_availability)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def stale_identity(sender, instance, **kwargs):
+    """The cached request user (with its profile) is out of date once this commits."""
+    user_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: invalidate_identity(user_id))
@@ -0,0 +1,307 @@
+# BWLapp/statements.py
+"""
+Bank / mobile-money statement import and payment matching.
+
+A statement CSV is loaded into StatementLine rows. Open orders (those with
+an outstanding balance) are indexed by order number, by customer phone
+and name, and by balance. Each index proposes (line, order) candidate
+pairs, and all pairs are scored in one vectorized pass:
+
+- the reference quotes the order number: REFERENCE_WEIGHT;
+- the payer's phone or name belongs to the order's customer: CUSTOMER_WEIGHT;
+- the amount settles the balance: AMOUNT_WEIGHT, or a share of it for a
+  part payment. Orders placed after the payment date score 0.
+
+Pairs are then assigned greedily, best score first, each line to one
+order and each order to lines until its balance is used up.
+"""
+import csv
+import io
+import re
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .archive import CLOSED_STATUSES
+from .models import BankStatement, Customer, Order, OrderItem, Payment, StatementLine
+
+REFERENCE_WEIGHT = 0.5
+CUSTOMER_WEIGHT = 0.3
+AMOUNT_WEIGHT = 0.3
+# Lines scoring below this are left unmatched; at or above AUTO_CONFIRM
+# they are ticked for confirmation on the review screen.
+SUGGEST_THRESHOLD = 0.3
+AUTO_CONFIRM_THRESHOLD = 0.8
+# An amount shared by more open orders than this says nothing on its own.
+MAX_AMOUNT_CANDIDATES = 5
+# Phones are compared on their last PHONE_DIGITS digits, so country and
+# trunk prefixes don't matter; shorter numbers are too ambiguous to use.
+PHONE_DIGITS = 9
+MIN_PHONE_DIGITS = 7
+
+COLUMN_ALIASES = {
+    'date': ('date', 'transaction date', 'value date', 'posted'),
+    'amount': ('amount', 'credit', 'paid in', 'deposit'),
+    'reference': ('reference', 'ref', 'description', 'narration', 'details'),
+    'payer': ('payer', 'name', 'sender', 'from'),
+    'phone': ('phone', 'msisdn', 'mobile', 'sender phone'),
+}
+DATE_FORMATS = ('%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d %b %Y', '%d/%m/%y')
+ORDER_NUMBER = re.compile(r'\d+')
+
+
+class StatementError(Exception):
+    pass
+
+
+def _column_map(header):
+    normalized = {name.strip().lower(): name for name in header if name}
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        columns[field] = next((normalized[alias] for alias in aliases if alias in normalized), None)
+    missing = [field for field in ('date', 'amount') if columns[field] is None]
+    if missing:
+        raise StatementError(f"Statement has no {' or '.join(missing)} column")
+    return columns
+
+
+def _parse_date(value):
+    value = value.strip()
+    parsed = parse_date(value[:10])
+    if parsed:
+        return parsed
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognised date {value!r}")
+
+
+def _parse_amount(value):
+    try:
+        return Decimal(value.strip().replace(',', '').replace(' ', '') or '0')
+    except InvalidOperation:
+        raise ValueError(f"unrecognised amount {value!r}") from None
+
+
+def parse_statement(stream):
+    """
+    Reads statement lines from a binary CSV stream. Yields StatementLine
+    instances (unsaved) for money received; debits and blank rows are
+    skipped. Raises StatementError naming the first bad row.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    columns = _column_map(reader.fieldnames or [])
+    for row in reader:
+        if not any((value or '').strip() for value in row.values() if isinstance(value, str)):
+            continue
+        try:
+            amount = _parse_amount(row[columns['amount']] or '')
+            line_date = _parse_date(row[columns['date']] or '')
+        except ValueError as exc:
+            raise StatementError(f"Row {reader.line_num}: {exc}")
+        if amount <= 0:
+            continue
+        yield StatementLine(
+            line_no=reader.line_num,
+            date=line_date,
+            amount=amount,
+            **{
+                field: (row[columns[field]] or '').strip()[:StatementLine._meta.get_field(field).max_length]
+                for field in ('reference', 'payer', 'phone') if columns[field]
+            },
+        )
+
+
+def import_statement(stream, name, method, user=None):
+    """Saves a statement and its lines, then matches them. Returns the BankStatement."""
+    with transaction.atomic():
+        statement = BankStatement.objects.create(name=name, method=method, imported_by=user)
+        lines = list(parse_statement(stream))
+        if not lines:
+            raise StatementError("Statement has no incoming payments")
+        for line in lines:
+            line.statement = statement
+        StatementLine.objects.bulk_create(lines, batch_size=1000)
+    match_statement(statement)
+    return statement
+
+
+def normalize_phone(value):
+    digits = re.sub(r'\D', '', value or '')
+    return digits[-PHONE_DIGITS:] if len(digits) >= MIN_PHONE_DIGITS else ''
+
+
+def normalize_name(value):
+    return ' '.join(re.sub(r'[^a-z ]', ' ', (value or '').lower()).split())
+
+
+def open_orders():
+    """Orders not in a closed status with something left to pay, annotated with `balance`."""
+    money = DecimalField(max_digits=14, decimal_places=2)
+    paid = (
+        Payment.objects.filter(order=OuterRef('pk')).values('order')
+        .annotate(total=Sum('total_amount')).values('total')
+    )
+    ordered = (
+        OrderItem.objects.filter(order=OuterRef('pk')).values('order')
+        .annotate(total=Sum(F('quantity') * F('price_each'))).values('total')
+    )
+    return Order.objects.exclude(status__in=CLOSED_STATUSES).annotate(
+        balance=Coalesce(Subquery(ordered, output_field=money), Value(Decimal('0')), output_field=money)
+        - Coalesce(Subquery(paid, output_field=money), Value(Decimal('0')), output_field=money),
+    ).filter(balance__gt=0)
+
+
+class OrderIndex:
+    """Open orders as numpy arrays, with lookups by order number, customer and balance."""
+
+    def __init__(self, orders):
+        rows = list(orders.values_list('pk', 'customer_id', 'balance', 'order_date'))
+        self.order_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.balances = np.array([int(row[2] * 100) for row in rows], dtype=np.int64)
+        self.dates = np.array([timezone.localtime(row[3]).date().toordinal() for row in rows], dtype=np.int64)
+        self.by_id = {pk: n for n, pk in enumerate(self.order_ids.tolist())}
+
+        self.by_customer = {}
+        for n, row in enumerate(rows):
+            self.by_customer.setdefault(row[1], []).append(n)
+        self.by_phone, self.by_name = {}, {}
+        for pk, name, phone in Customer.objects.filter(pk__in=list(self.by_customer)).values_list('pk', 'name', 'phone'):
+            if normalize_phone(phone):
+                self.by_phone.setdefault(normalize_phone(phone), []).append(pk)
+            if normalize_name(name):
+                self.by_name.setdefault(normalize_name(name), []).append(pk)
+
+        self.balance_order = np.argsort(self.balances, kind='stable')
+        self.sorted_balances = self.balances[self.balance_order]
+
+    def __len__(self):
+        return len(self.order_ids)
+
+    def customer_orders(self, phone, payer):
+        customers = set(self.by_phone.get(normalize_phone(phone), ())) | set(self.by_name.get(normalize_name(payer), ()))
+        return [n for customer in customers for n in self.by_customer[customer]]
+
+    def reference_orders(self, reference):
+        return [self.by_id[int(number)] for number in ORDER_NUMBER.findall(reference or '') if int(number) in self.by_id]
+
+    def amount_orders(self, amounts):
+        """For each amount (in cents), the orders whose balance it settles exactly, if few enough."""
+        low = np.searchsorted(self.sorted_balances, amounts, side='left')
+        high = np.searchsorted(self.sorted_balances, amounts, side='right')
+        return [
+            self.balance_order[lo:hi].tolist() if 0 < hi - lo <= MAX_AMOUNT_CANDIDATES else []
+            for lo, hi in zip(low.tolist(), high.tolist())
+        ]
+
+
+def score_pairs(index, line_amounts, line_dates, pair_lines, pair_orders, reference_hit, customer_hit):
+    """Vectorized scores for the candidate pairs; see the module docstring."""
+    amounts = line_amounts[pair_lines]
+    balances = index.balances[pair_orders]
+    amount_score = np.where(amounts == balances, 1.0, np.where(amounts < balances, 0.5 * amounts / balances, 0.0))
+    score = REFERENCE_WEIGHT * reference_hit + CUSTOMER_WEIGHT * customer_hit + AMOUNT_WEIGHT * amount_score
+    score[index.dates[pair_orders] > line_dates[pair_lines]] = 0.0
+    return np.minimum(score, 1.0)
+
+
+def match_lines(lines, index):
+    """
+    Returns {line position: (order id, score)} for the lines that matched,
+    assigning the best-scoring pairs first.
+    """
+    if not lines or not len(index):
+        return {}
+    line_amounts = np.array([int(line.amount * 100) for line in lines], dtype=np.int64)
+    line_dates = np.array([line.date.toordinal() for line in lines], dtype=np.int64)
+
+    pairs, flags = [], []
+    for n, (line, by_amount) in enumerate(zip(lines, index.amount_orders(line_amounts))):
+        for order, flag in [
+            *((order, 1) for order in index.reference_orders(line.reference)),
+            *((order, 2) for order in index.customer_orders(line.phone, line.payer)),
+            *((order, 0) for order in by_amount),
+        ]:
+            pairs.append((n, order))
+            flags.append(flag)
+    if not pairs:
+        return {}
+    pairs = np.array(pairs, dtype=np.int64)
+    flags = np.array(flags, dtype=np.int64)
+
+    # One row per distinct pair, remembering which indexes proposed it.
+    keys, inverse = np.unique(pairs[:, 0] * len(index) + pairs[:, 1], return_inverse=True)
+    reference_hit = np.zeros(len(keys))
+    customer_hit = np.zeros(len(keys))
+    np.maximum.at(reference_hit, inverse, (flags == 1).astype(float))
+    np.maximum.at(customer_hit, inverse, (flags == 2).astype(float))
+    pair_lines, pair_orders = keys // len(index), keys % len(index)
+    scores = score_pairs(index, line_amounts, line_dates, pair_lines, pair_orders, reference_hit, customer_hit)
+
+    remaining = index.balances.copy()
+    matches = {}
+    for n in np.argsort(-scores, kind='stable').tolist():
+        if scores[n] < SUGGEST_THRESHOLD:
+            break
+        line, order = int(pair_lines[n]), int(pair_orders[n])
+        if line in matches or line_amounts[line] > remaining[order]:
+            continue
+        remaining[order] -= line_amounts[line]
+        matches[line] = (int(index.order_ids[order]), float(scores[n]))
+    return matches
+
+
+def match_statement(statement):
+    """(Re)matches the statement's open lines and saves the suggestions. Returns how many matched."""
+    lines = list(statement.lines.filter(status__in=['unmatched', 'suggested']))
+    matches = match_lines(lines, OrderIndex(open_orders()))
+    for n, line in enumerate(lines):
+        order_id, score = matches.get(n, (None, None))
+        line.matched_order_id, line.score = order_id, score
+        line.status = 'suggested' if order_id else 'unmatched'
+    StatementLine.objects.bulk_update(lines, ['matched_order', 'score', 'status'], batch_size=1000)
+    return len(matches)
+
+
+def confirm_lines(statement, choices, user=None):
+    """
+    Creates one Payment per confirmed line in a single transaction, dated
+    the day the money came in. `choices` maps line ids to the order each
+    pays. Lines already confirmed, and lines for orders that have since
+    closed or been paid off, are skipped. Returns the payments created.
+    """
+    with transaction.atomic():
+        lines = list(
+            statement.lines.select_for_update()
+            .filter(pk__in=choices, payment__isnull=True).exclude(status='confirmed')
+        )
+        chosen = {choices[line.pk] for line in lines}
+        # Lock the orders so a status change or another payment can't slip in between the check and the insert.
+        list(Order.objects.select_for_update().filter(pk__in=chosen).values_list('pk', flat=True))
+        order_ids = set(open_orders().filter(pk__in=chosen).values_list('pk', flat=True))
+        lines = [line for line in lines if choices[line.pk] in order_ids]
+        payments = Payment.objects.bulk_create([
+            Payment(order_id=choices[line.pk], total_amount=line.amount, method=statement.method, processed_by=user)
+            for line in lines
+        ], batch_size=1000)
+        # payment_date is auto_now_add, which bulk_create stamps with now; date each payment by its line instead.
+        for line, payment in zip(lines, payments):
+            payment.payment_date = timezone.make_aware(datetime.combine(line.date, time.min))
+        Payment.objects.bulk_update(payments, ['payment_date'], batch_size=1000)
+        for line, payment in zip(lines, payments):
+            line.payment, line.matched_order_id, line.status = payment, payment.order_id, 'confirmed'
+            # bulk_create skips signals; queue the same outbox events a saved payment does.
+            post_save.send(
+                sender=Payment, instance=payment, created=True, raw=False, using=payment._state.db, update_fields=None,
+            )
+        StatementLine.objects.bulk_update(lines, ['payment', 'matched_order', 'status'], batch_size=1000)
+    return payments
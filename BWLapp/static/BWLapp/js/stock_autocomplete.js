@@ -0,0 +1,56 @@
+// Stock picker for the order formset: searches the stock catalog endpoint
+// instead of rendering every stock package as an <option>.
+(function () {
+    function attach(container) {
+        const url = container.dataset.url;
+        const hidden = container.querySelector('.stock-autocomplete-value');
+        const input = container.querySelector('.stock-autocomplete-input');
+        const list = container.querySelector('.stock-autocomplete-results');
+        let timer = null;
+
+        function clear() {
+            list.innerHTML = '';
+        }
+
+        function choose(item) {
+            hidden.value = item.id;
+            input.value = item.label;
+            clear();
+        }
+
+        input.addEventListener('input', function () {
+            hidden.value = '';
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (!query) {
+                clear();
+                return;
+            }
+            timer = setTimeout(function () {
+                fetch(url + '?q=' + encodeURIComponent(query), { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        clear();
+                        data.results.forEach(function (item) {
+                            const li = document.createElement('li');
+                            li.textContent = item.label + ' — ' + item.available + ' in stock';
+                            if (item.available <= 0) {
+                                li.classList.add('out-of-stock');
+                            }
+                            li.addEventListener('mousedown', function (event) {
+                                event.preventDefault();
+                                choose(item);
+                            });
+                            list.appendChild(li);
+                        });
+                    });
+            }, 200);
+        });
+
+        input.addEventListener('blur', clear);
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('.stock-autocomplete').forEach(attach);
+    });
+})();
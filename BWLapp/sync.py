@@ -0,0 +1,293 @@
+# BWLapp/sync.py
+"""
+Offline order capture for shop-floor tablets.
+
+Tablets queue orders and payments while offline, each under a
+client-generated idempotency key, and push them to /api/v1/sync/ in
+(optionally gzipped) batches:
+
+    {"since": "<token from the last sync>",
+     "operations": [
+        {"key": "t7-0001", "type": "order", "customer": 12,
+         "items": [{"stock_item": 3, "quantity": 2}], "captured_at": "..."},
+        {"key": "t7-0002", "type": "payment", "order_key": "t7-0001",
+         "method": "Cash", "total_amount": "42.00"}]}
+
+apply_batch() locks every stock item the batch's orders use, in id
+order, and applies the operations in one transaction, each in its own
+savepoint so a rejected one does not undo the rest. A key that already
+has a SyncReceipt is answered from it instead of being applied again.
+
+The response also carries the stock levels and prices changed since the
+client's token (stock_delta) and a new token to send next time.
+"""
+import zlib
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Customer, Order, OrderItem, Payment, Stock, StockMovement, StockShard, SyncReceipt
+
+MAX_OPERATIONS = 500
+MAX_BODY_BYTES = 5 * 1024 * 1024
+# A change committed just after a token was issued can carry an earlier
+# timestamp, so every delta reaches back this far. Clients apply deltas
+# idempotently, so the overlap only costs a few repeated rows.
+TOKEN_OVERLAP = timedelta(seconds=30)
+
+
+class SyncError(Exception):
+    """The batch as a whole is unusable; nothing was applied."""
+
+
+def decompress(body):
+    """Inflates a gzip request body, refusing anything over MAX_BODY_BYTES."""
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = inflater.decompress(body, MAX_BODY_BYTES + 1)
+    except zlib.error as exc:
+        raise SyncError(f"Body is not valid gzip: {exc}")
+    if len(data) > MAX_BODY_BYTES or inflater.unconsumed_tail:
+        raise SyncError(f"Batch is larger than {MAX_BODY_BYTES} bytes uncompressed.")
+    return data
+
+
+def parse_token(token):
+    if token in (None, ''):
+        return None
+    when = parse_datetime(token) if isinstance(token, str) else None
+    if when is None:
+        raise SyncError("Unrecognised sync token; send none to get a full snapshot.")
+    return when
+
+
+def _positive_int(value):
+    return value if isinstance(value, int) and not isinstance(value, bool) and value > 0 else None
+
+
+def _clean_order(op):
+    errors = {}
+    customer = _positive_int(op.get('customer'))
+    if customer is None:
+        errors['customer'] = "A customer id is required."
+    items = op.get('items')
+    if not isinstance(items, list) or not items:
+        errors['items'] = "At least one item is required."
+        items = []
+    lines = []
+    for index, item in enumerate(items):
+        stock_id = _positive_int(item.get('stock_item')) if isinstance(item, dict) else None
+        quantity = _positive_int(item.get('quantity')) if isinstance(item, dict) else None
+        if stock_id is None or quantity is None:
+            errors[f'items.{index}'] = "Each item needs a stock_item id and a quantity of at least 1."
+        else:
+            lines.append((stock_id, quantity))
+    return {'customer': customer, 'lines': lines}, errors
+
+
+def _clean_payment(op):
+    errors = {}
+    order, order_key = _positive_int(op.get('order')), op.get('order_key')
+    if order is None and not isinstance(order_key, str):
+        errors['order'] = "Give the order id, or the order_key of an order synced earlier."
+    method = op.get('method')
+    if not isinstance(method, str) or not method.strip():
+        errors['method'] = "A payment method is required."
+    total = None
+    if op.get('total_amount') not in (None, ''):
+        try:
+            total = Decimal(str(op['total_amount']))
+        except InvalidOperation:
+            total = None
+        if total is None or not total.is_finite() or total <= 0:
+            errors['total_amount'] = "Must be a positive amount."
+    clean = {'order': order, 'order_key': order_key, 'method': (method or '').strip()[:50], 'total': total}
+    return clean, errors
+
+
+def _clean(op):
+    errors = {}
+    captured_at = None
+    if op.get('captured_at'):
+        captured_at = parse_datetime(str(op['captured_at']))
+        if captured_at is None:
+            errors['captured_at'] = "Not a valid timestamp."
+    if op.get('type') == 'order':
+        clean, more = _clean_order(op)
+    elif op.get('type') == 'payment':
+        clean, more = _clean_payment(op)
+    else:
+        clean, more = {}, {'type': "Must be 'order' or 'payment'."}
+    clean['captured_at'] = captured_at
+    return clean, {**errors, **more}
+
+
+def _result(key, status, receipt=None, errors=None):
+    result = {'key': key, 'status': status}
+    if receipt is not None:
+        result.update(order_id=receipt.order_id, payment_id=receipt.payment_id)
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+def _available(stocks):
+    """Quantity on hand per stock id; one grouped query covers every sharded item."""
+    available = {pk: stock.quantity for pk, stock in stocks.items()}
+    sharded = [pk for pk, stock in stocks.items() if stock.shard_count]
+    if sharded:
+        totals = StockShard.objects.filter(stock_id__in=sharded).values('stock_id').annotate(total=Sum('quantity'))
+        available.update({row['stock_id']: row['total'] or 0 for row in totals})
+    return available
+
+
+def apply_batch(operations, user_id):
+    """
+    Applies a batch of queued operations for the user and returns one
+    result per operation, in order: status 'applied', 'duplicate' (the key
+    was applied before) or 'rejected' with the errors.
+    """
+    if not isinstance(operations, list):
+        raise SyncError("'operations' must be a list.")
+    if len(operations) > MAX_OPERATIONS:
+        raise SyncError(f"Send at most {MAX_OPERATIONS} operations per batch.")
+    if not all(isinstance(op, dict) and isinstance(op.get('key'), str) and 0 < len(op['key']) <= 64 for op in operations):
+        raise SyncError("Every operation must be an object with a 'key' of 1-64 characters.")
+
+    keys = [op['key'] for op in operations]
+    repeated = {key for key, count in Counter(keys).items() if count > 1}
+    cleaned = [_clean(op) for op in operations]
+    stock_ids = sorted({pk for clean, _ in cleaned for pk, _ in clean.get('lines', ())})
+    customer_ids = {clean['customer'] for clean, _ in cleaned if clean.get('customer')}
+
+    results = []
+    with transaction.atomic():
+        receipts = SyncReceipt.objects.in_bulk(keys, field_name='key')
+        customers = set(Customer.objects.filter(pk__in=customer_ids).values_list('pk', flat=True))
+        # Id order, so two batches sharing items always lock them the same way round.
+        stocks = {
+            stock.pk: stock
+            for stock in Stock.objects.select_for_update().filter(pk__in=stock_ids).order_by('pk')
+        }
+        remaining = _available(stocks)
+        orders = Order.objects.in_bulk(
+            {clean['order'] for clean, _ in cleaned if clean.get('order')}
+            | {receipt.order_id for receipt in receipts.values() if receipt.order_id}
+        )
+
+        for op, (clean, errors) in zip(operations, cleaned):
+            key = op['key']
+            if key in receipts:
+                results.append(_result(key, 'duplicate', receipts[key]))
+                continue
+            if key in repeated:
+                errors = {**errors, 'key': "Used by more than one operation in this batch."}
+
+            if op.get('type') == 'order' and not errors:
+                errors = _check_order(clean, customers, stocks, remaining)
+            elif op.get('type') == 'payment' and not errors:
+                order_id = clean['order'] or getattr(receipts.get(clean['order_key']), 'order_id', None)
+                clean['order'] = orders.get(order_id)
+                if clean['order'] is None:
+                    errors = {'order': "Unknown order."}
+            if errors:
+                results.append(_result(key, 'rejected', errors=errors))
+                continue
+
+            try:
+                with transaction.atomic():
+                    if op['type'] == 'order':
+                        receipt = _apply_order(key, clean, stocks, user_id)
+                        for stock_id, quantity in clean['lines']:
+                            remaining[stock_id] -= quantity
+                        orders[receipt.order_id] = receipt.order
+                    else:
+                        receipt = _apply_payment(key, clean, user_id)
+            except ValidationError as exc:
+                results.append(_result(key, 'rejected', errors={'detail': exc.messages}))
+                continue
+            except IntegrityError:
+                # Another request applied the same key between our lookup and insert.
+                receipt = SyncReceipt.objects.filter(key=key).first()
+                if receipt is None:
+                    raise
+                results.append(_result(key, 'duplicate', receipt))
+                continue
+            receipts[key] = receipt
+            results.append(_result(key, 'applied', receipt))
+    return results
+
+
+def _check_order(clean, customers, stocks, remaining):
+    """Rejects an order up front if any line can't be filled from the locked stock."""
+    if clean['customer'] not in customers:
+        return {'customer': "Unknown customer."}
+    errors = {}
+    wanted = Counter()
+    for stock_id, quantity in clean['lines']:
+        wanted[stock_id] += quantity
+    for stock_id, quantity in wanted.items():
+        stock = stocks.get(stock_id)
+        if stock is None or not stock.is_available:
+            errors[f'stock_item.{stock_id}'] = "Unknown or unavailable stock item."
+        elif remaining[stock_id] < quantity:
+            errors[f'stock_item.{stock_id}'] = f"Only {remaining[stock_id]} available, {quantity} requested."
+    return errors
+
+
+def _apply_order(key, clean, stocks, user_id):
+    order = Order.objects.create(customer_id=clean['customer'], created_by_id=user_id)
+    for stock_id, quantity in clean['lines']:
+        # The locked instance, so each save sees the quantity earlier ones left.
+        OrderItem(order=order, stock_item=stocks[stock_id], quantity=quantity).save()
+    return SyncReceipt.objects.create(
+        key=key, kind='order', user_id=user_id, order=order, captured_at=clean['captured_at'],
+    )
+
+
+def _apply_payment(key, clean, user_id):
+    payment = Payment.objects.create(
+        order=clean['order'], method=clean['method'], total_amount=clean['total'], processed_by_id=user_id,
+    )
+    return SyncReceipt.objects.create(
+        key=key, kind='payment', user_id=user_id, order=clean['order'], payment=payment,
+        captured_at=clean['captured_at'],
+    )
+
+
+def stock_delta(since=None):
+    """
+    Stock items whose quantity, price or product changed since `since`
+    (every item when None), with a token for the next call.
+    """
+    token = timezone.now()
+    stocks = Stock.objects.select_related('product').order_by('pk')
+    if since is not None:
+        since -= TOKEN_OVERLAP
+        moved = StockMovement.objects.filter(created_at__gte=since).values('stock_id')
+        stocks = stocks.filter(Q(updated_at__gte=since) | Q(product__updated_at__gte=since) | Q(pk__in=moved))
+    stocks = {stock.pk: stock for stock in stocks}
+    available = _available(stocks)
+    return {
+        'token': token.isoformat(),
+        'full': since is None,
+        'stock': [
+            {
+                'id': stock.pk,
+                'product_id': stock.product_id,
+                'product': stock.product.name,
+                'package_type': stock.package_type,
+                'quantity': available[stock.pk],
+                'price_per_package': str(stock.price_per_package),
+                'selling_price': str(stock.product.selling_price),
+                'is_available': stock.is_available,
+            }
+            for stock in stocks.values()
+        ],
+    }
@@ -0,0 +1,97 @@
+# BWLapp/tasks.py
+"""Background jobs run by `manage.py runworker`; see jobs.py."""
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from . import jobs
+from .documents import purge_documents
+from .handlers import LOW_STOCK_THRESHOLD, post_low_stock_notification
+from .models import Job, Notification, OutboxEvent, Product, Stock
+from .reconcile import find_drift
+
+MAX_IMAGE_SIZE = (1200, 1200)
+JOB_RETENTION_DAYS = 14
+DOCUMENT_RETENTION_DAYS = 30
+
+
+@jobs.job('products.optimize_image')
+def optimize_product_image(product_id):
+    """Shrinks an uploaded product image to at most MAX_IMAGE_SIZE, keeping its format."""
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or not product.image:
+        return
+    with product.image.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    if image.width <= MAX_IMAGE_SIZE[0] and image.height <= MAX_IMAGE_SIZE[1]:
+        return
+
+    image_format = image.format or 'PNG'
+    image.thumbnail(MAX_IMAGE_SIZE)
+    buffer = BytesIO()
+    image.save(buffer, format=image_format)
+    name = product.image.name
+    storage = product.image.storage
+    storage.delete(name)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+@jobs.periodic('*/15 * * * *', name='stock.checkpoint')
+def checkpoint_stock():
+    call_command('stock_checkpoint')
+
+
+@jobs.periodic('0 * * * *', name='alerts.low_stock')
+def evaluate_low_stock_alerts():
+    """Posts low-stock notifications for packages that ran down outside of sales, e.g. adjustments."""
+    candidates = Stock.objects.select_related('product').filter(
+        Q(quantity__lt=LOW_STOCK_THRESHOLD) | Q(shard_count__gt=0), is_available=True,
+    )
+    for stock in candidates.iterator():
+        post_low_stock_notification(stock)
+
+
+@jobs.periodic('0 1 * * *', name='stock.reconcile')
+def reconcile_stock():
+    """Nightly drift check; corrections are left to `manage.py reconcile_stock --fix`."""
+    _, drift = find_drift(workers=1)
+    if drift:
+        ids = ', '.join(str(row['stock_id']) for row in drift[:20])
+        Notification.objects.create(
+            message=f"Stock reconciliation: {len(drift)} packages drifted from order history (IDs {ids})."[:255],
+        )
+
+
+@jobs.periodic('30 2 * * *', name='ledger.rebuild')
+def rebuild_customer_ledger():
+    """Nightly full recompute, in case an outbox event was dead-lettered."""
+    call_command('rebuild_customer_ledger')
+
+
+@jobs.periodic('0 4 * * 0', name='orders.archive')
+def archive_closed_orders():
+    call_command('archive_orders')
+
+
+@jobs.periodic('0 5 * * 0', name='customers.find_duplicates')
+def find_duplicate_customers():
+    call_command('find_duplicate_customers')
+
+
+@jobs.periodic('0 3 * * *', name='jobs.purge')
+def purge_finished_jobs():
+    cutoff = timezone.now() - timedelta(days=JOB_RETENTION_DAYS)
+    Job.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    OutboxEvent.objects.filter(status='done', processed_at__lt=cutoff).delete()
+
+
+@jobs.periodic('15 3 * * *', name='documents.purge')
+def purge_cached_documents():
+    """Deletes superseded PDFs and any not rendered in DOCUMENT_RETENTION_DAYS."""
+    purge_documents(timezone.now() - timedelta(days=DOCUMENT_RETENTION_DAYS))
@@ -0,0 +1,28 @@
+# BWLapp/tests/test_api.py
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from BWLapp.models import Customer, CustomUser
+
+
+class BulkTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user('boss', password='pw', role='admin'))
+
+    def test_bulk_create(self):
+        rows = [{'name': 'Ama', 'email': 'ama@example.com'}, {'name': 'Kofi', 'email': 'kofi@example.com'}]
+        response = self.client.post('/api/v1/customers/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_duplicate_email_in_batch_is_a_400(self):
+        rows = [
+            {'name': 'Ama', 'email': 'ama@example.com'},
+            {'name': 'Kofi', 'email': 'kofi@example.com'},
+            {'name': 'Ama again', 'email': 'ama@example.com'},
+        ]
+        response = self.client.post('/api/v1/customers/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [2])
+        self.assertFalse(Customer.objects.exists())
@@ -0,0 +1,45 @@
+# BWLapp/tests/test_archive.py
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from BWLapp import archive
+from BWLapp.models import ArchivedOrder, Customer, Order, OrderItem, Product, Stock
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=20, price_per_package=Decimal('10.00'))
+
+    def old_order(self, days):
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, stock_item=self.stock, quantity=1)
+        Order.objects.filter(pk=order.pk).update(status='Cancelled', order_date=timezone.now() - timedelta(days=days))
+        return order
+
+    def test_archive_moves_the_order_and_its_items(self):
+        order = self.old_order(400)
+        self.assertEqual(list(archive.closed_orders(archive.cutoff_date())), [order])
+        self.assertEqual(archive.archive_orders([order.pk]), 1)
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+        self.assertEqual(ArchivedOrder.objects.get(order_id=order.pk).items.count(), 1)
+
+    def test_horizon_sees_other_processes_without_a_shared_cache(self):
+        self.assertFalse(archive.reaches_archive(None))
+        # Archived the way run_archive would in another process: this one's cache is untouched.
+        with mock.patch('BWLapp.archive.invalidate_horizon'):
+            archive.archive_orders([self.old_order(400).pk])
+        self.assertTrue(archive.reaches_archive(None))
+
+    def test_horizon_is_cached_in_a_shared_cache(self):
+        with mock.patch('BWLapp.archive.cache_is_shared', return_value=True):
+            archive.archive_horizon()
+            with self.assertNumQueries(0):
+                self.assertIsNone(archive.archive_horizon()['order_date'])
@@ -0,0 +1,45 @@
+# BWLapp/tests/test_audit.py
+import json
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from BWLapp import audit, outbox
+from BWLapp.models import AuditTrail, Customer
+
+
+class AuditReconstructionTests(TestCase):
+    def save_name(self, customer, name):
+        customer.name = name
+        customer.save()
+        outbox.dispatch_batch()
+
+    def test_reconstruct_replays_deltas_from_the_last_snapshot(self):
+        customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        outbox.dispatch_batch()
+        self.save_name(customer, 'Chanda M')
+        before_last = timezone.now()
+        self.save_name(customer, 'Chanda Mwale')
+
+        record_id = str(customer.pk)
+        self.assertEqual(audit.reconstruct('Customer', record_id)['name'], 'Chanda Mwale')
+        self.assertEqual(audit.reconstruct('Customer', record_id, as_of=before_last)['name'], 'Chanda M')
+        delta = AuditTrail.objects.filter(model_name='Customer', is_snapshot=False).latest('id')
+        self.assertEqual(json.loads(delta.details), {'name': 'Chanda Mwale'})
+
+    @override_settings(AUDIT_SNAPSHOT_INTERVAL=2)
+    def test_snapshots_are_written_every_interval(self):
+        customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        outbox.dispatch_batch()
+        for name in ('A', 'B', 'C'):
+            self.save_name(customer, name)
+        entries = list(AuditTrail.objects.filter(model_name='Customer').order_by('id').values_list('is_snapshot', flat=True))
+        self.assertEqual(entries, [True, False, False, True])
+        self.assertEqual(audit.reconstruct('Customer', customer.pk)['email'], 'chanda@example.com')
+
+    def test_deleted_records_reconstruct_to_none(self):
+        customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        record_id = customer.pk
+        customer.delete()
+        outbox.dispatch_batch()
+        self.assertIsNone(audit.reconstruct('Customer', record_id))
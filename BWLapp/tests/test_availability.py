@@ -0,0 +1,58 @@
+# BWLapp/tests/test_availability.py
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from BWLapp import availability, shared_cache
+from BWLapp.models import CacheVersion, Product, Stock
+
+
+class AvailabilityVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        shared_cache._checked.clear()
+        availability._local_snapshot.update(version=None, snapshot=None)
+        self.product = Product.objects.create(name='Coca-Cola', selling_price=Decimal('8.00'))
+        self.stock = Stock.objects.create(
+            product=self.product, package_type='6pack', quantity=10, price_per_package=Decimal('45.00'),
+        )
+
+    def available(self):
+        _, [line] = availability.check_lines([{'product': self.product.pk, 'package_type': '6pack'}])
+        return line['available']
+
+    def test_changes_from_other_processes_are_seen_without_a_shared_cache(self):
+        self.assertEqual(self.available(), 10)
+        # As another worker would write it: the sale there bumps the version row.
+        Stock.objects.filter(pk=self.stock.pk).update(quantity=4)
+        CacheVersion.objects.create(key=availability.AVAILABILITY_VERSION_KEY, version=1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.available(), 10)
+        shared_cache._checked.clear()
+        self.assertEqual(self.available(), 4)
+
+    def test_sales_are_seen_when_they_commit(self):
+        self.stock.enable_sharding(2)
+        self.assertEqual(self.available(), 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stock.adjust_quantity(-5, 'sale')
+        self.assertEqual(self.available(), 5)
+
+    def test_unchanged_stock_reuses_the_snapshot(self):
+        self.available()
+        shared_cache._checked.clear()
+        # One primary-key read of the version row, no scan of the stock table.
+        with self.assertNumQueries(1), mock.patch.object(availability, 'build_snapshot') as build:
+            self.available()
+        build.assert_not_called()
+
+    @mock.patch('BWLapp.shared_cache.cache_is_shared', return_value=True)
+    def test_shared_cache_is_bumped_when_a_sale_commits(self, _):
+        self.assertEqual(self.available(), 10)
+        with self.assertNumQueries(0):
+            self.available()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stock.adjust_quantity(-3, 'sale')
+        self.assertEqual(self.available(), 7)
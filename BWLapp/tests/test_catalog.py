@@ -0,0 +1,48 @@
+# BWLapp/tests/test_catalog.py
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from BWLapp import catalog, shared_cache
+from BWLapp.models import CacheVersion, Product, Stock
+
+
+class CatalogVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        shared_cache._checked.clear()
+        catalog._local_catalog.update(version=None, catalog=None)
+        self.product = Product.objects.create(name='Fanta Orange', selling_price=Decimal('10.00'))
+        Stock.objects.create(product=self.product, package_type='6pack', quantity=5, price_per_package=Decimal('55.00'))
+
+    def labels(self, query):
+        return [entry['product'] for entry in catalog.search_catalog(query)]
+
+    def test_changes_from_other_processes_are_seen_without_a_shared_cache(self):
+        self.assertEqual(self.labels('fanta'), ['Fanta Orange'])
+        # Written like another worker would: committed there, with the version row bumped there.
+        Product.objects.filter(pk=self.product.pk).update(name='Sprite', updated_at=timezone.now())
+        CacheVersion.objects.create(key=catalog.CATALOG_VERSION_KEY, version=1)
+        # Within VERSION_CHECK_SECONDS this worker keeps its copy without asking...
+        self.assertEqual(self.labels('fanta'), ['Fanta Orange'])
+        # ...and then reads the version row and rebuilds.
+        shared_cache._checked.clear()
+        self.assertEqual(self.labels('sprite'), ['Sprite'])
+
+    def test_own_saves_are_seen_when_they_commit(self):
+        self.assertEqual(self.labels('fanta'), ['Fanta Orange'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Sprite'
+            self.product.save()
+        self.assertEqual(self.labels('sprite'), ['Sprite'])
+
+    @mock.patch('BWLapp.shared_cache.cache_is_shared', return_value=True)
+    def test_shared_cache_is_bumped_when_a_save_commits(self, _):
+        self.assertEqual(self.labels('fanta'), ['Fanta Orange'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Sprite'
+            self.product.save()
+        self.assertEqual(self.labels('sprite'), ['Sprite'])
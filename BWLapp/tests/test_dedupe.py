@@ -0,0 +1,81 @@
+# BWLapp/tests/test_dedupe.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from BWLapp import archive, dedupe
+from BWLapp.models import (
+    ArchivedOrder, AuditTrail, Customer, CustomerLedger, DuplicateCandidate, Order, OrderItem, Payment, Product, Stock,
+)
+
+
+class MergeCustomersTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=50, price_per_package=Decimal('10.00'))
+        self.keep = Customer.objects.create(name='Chanda Mwale Ltd', email='accounts@mwale.co.zm')
+        self.duplicate = Customer.objects.create(
+            name='Chanda Mwale', email='orders@mwale.co.zm', phone='0977 123 456', address='Plot 12, Kitwe',
+        )
+        self.kept_order = self.order(self.keep, 2)
+        self.live_order = self.order(self.duplicate, 3, paid=True)
+        self.archived_order = self.order(self.duplicate, 1, paid=True)
+        Order.objects.filter(pk=self.archived_order.pk).update(status='Delivered', order_date=timezone.now() - timedelta(days=400))
+        archive.archive_orders([self.archived_order.pk])
+        ArchivedOrder.objects.filter(pk=self.archived_order.pk).update(archived_at=timezone.now() - timedelta(days=30))
+
+    def order(self, customer, quantity, paid=False):
+        order = Order.objects.create(customer=customer)
+        OrderItem.objects.create(order=order, stock_item=self.stock, quantity=quantity)
+        if paid:
+            Payment.objects.create(order=order, total_amount=Decimal('10.00') * quantity, method='Cash')
+        return order
+
+    def test_merge_moves_live_and_archived_orders_and_rebuilds_the_ledger(self):
+        duplicate_pk = self.duplicate.pk
+        DuplicateCandidate.objects.create(customer_a=self.keep, customer_b=self.duplicate, score=0.9)
+        self.assertEqual(dedupe.merge_customers(self.keep, self.duplicate), 2)
+
+        self.assertFalse(Customer.objects.filter(pk=duplicate_pk).exists())
+        self.assertFalse(DuplicateCandidate.objects.exists())
+        self.assertEqual(Order.objects.get(pk=self.live_order.pk).customer_id, self.keep.pk)
+        archived = ArchivedOrder.objects.get(pk=self.archived_order.pk)
+        self.assertEqual(archived.customer_id, self.keep.pk)
+        self.assertGreater(archived.archived_at, timezone.now() - timedelta(minutes=1))
+
+        self.keep.refresh_from_db()
+        self.assertEqual((self.keep.phone, self.keep.address, self.keep.email), ('0977 123 456', 'Plot 12, Kitwe', 'accounts@mwale.co.zm'))
+        ledger = CustomerLedger.objects.get(customer=self.keep)
+        self.assertEqual(
+            (ledger.order_count, ledger.total_ordered, ledger.lifetime_spend, ledger.open_balance),
+            (3, Decimal('60.00'), Decimal('40.00'), Decimal('20.00')),
+        )
+        self.assertTrue(AuditTrail.objects.filter(action='Merged Customer', record_id=str(duplicate_pk), is_snapshot=True).exists())
+        self.assertTrue(AuditTrail.objects.filter(action='Updated Order', record_id=str(self.live_order.pk)).exists())
+
+    def test_a_customer_cannot_be_merged_into_itself(self):
+        with self.assertRaises(ValueError):
+            dedupe.merge_customers(self.keep, self.keep)
+
+
+class FindDuplicatesTests(TestCase):
+    def test_similar_names_and_shared_phones_are_candidates(self):
+        a = Customer.objects.create(name='Kabwe General Dealers Ltd', email='kabwe@gmail.com')
+        b = Customer.objects.create(name='Kabwe Dealers', email='kabwe.dealers@yahoo.com')
+        c = Customer.objects.create(name='Mutale', email='m@example.com', phone='+260 977 555 111')
+        d = Customer.objects.create(name='Mutale Enterprises', email='n@example.com', phone='0977555111')
+        Customer.objects.create(name='Zambezi Fisheries', email='z@gmail.com')
+        customers, _, stored = dedupe.find_duplicates()
+        self.assertEqual((customers, stored), (5, 2))
+        pairs = dict(((row.customer_a_id, row.customer_b_id), row.reasons) for row in DuplicateCandidate.objects.all())
+        self.assertEqual(pairs, {(a.pk, b.pk): 'name', (c.pk, d.pk): 'name,phone'})
+
+    def test_dismissed_pairs_stay_dismissed(self):
+        a = Customer.objects.create(name='Kabwe Dealers', email='a@gmail.com')
+        b = Customer.objects.create(name='Kabwe Dealers Ltd', email='b@gmail.com')
+        dedupe.find_duplicates()
+        DuplicateCandidate.objects.update(status='dismissed')
+        dedupe.find_duplicates()
+        self.assertEqual(list(DuplicateCandidate.objects.values_list('customer_a', 'customer_b', 'status')), [(a.pk, b.pk, 'dismissed')])
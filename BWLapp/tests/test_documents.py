@@ -0,0 +1,65 @@
+# BWLapp/tests/test_documents.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from BWLapp import archive, documents
+from BWLapp.models import Customer, CustomerLedger, Order, OrderItem, Payment, Product, Stock
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class DocumentTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = stock = Stock.objects.create(product=product, package_type='bulk', quantity=20, price_per_package=Decimal('10.00'))
+        self.order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=self.order, stock_item=stock, quantity=3)
+
+    def render_invoice(self):
+        doc, = documents.load_invoices([self.order.pk])
+        self.assertTrue(documents.get_or_render(doc).startswith(b'%PDF'))
+        return doc['storage_name']
+
+    def cached(self):
+        return default_storage.listdir('documents/invoice')[1]
+
+    def test_purge_keeps_only_the_current_version(self):
+        old = self.render_invoice()
+        Customer.objects.filter(pk=self.customer.pk).update(name='Chanda Mwale')
+        current = self.render_invoice()
+        self.assertNotEqual(old, current)
+        self.assertEqual(documents.purge_documents(timezone.now() - timedelta(days=1)), 1)
+        self.assertEqual(self.cached(), [current.rsplit('/', 1)[1]])
+
+    def test_purge_deletes_files_saved_before_the_cutoff(self):
+        self.render_invoice()
+        self.assertEqual(documents.purge_documents(timezone.now() + timedelta(seconds=1)), 1)
+        self.assertEqual(self.cached(), [])
+        self.assertEqual(documents.purge_documents(timezone.now()), 0)
+
+    def closed_order(self, status, days_ago=0, paid=None):
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, stock_item=self.stock, quantity=2)
+        if paid is not None:
+            Payment.objects.create(order=order, method='Cash', total_amount=paid)
+        Order.objects.filter(pk=order.pk).update(status=status, order_date=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_statement_leaves_out_closed_orders_like_the_ledger(self):
+        self.closed_order('Cancelled', paid=Decimal('20.00'))
+        self.closed_order('Returned', days_ago=30)
+        archive.archive_orders([self.closed_order('Cancelled', days_ago=400).pk])
+        start, end = timezone.now() - timedelta(days=7), timezone.now() + timedelta(days=1)
+        doc, = documents.load_statements([self.customer.pk], start, end)
+        self.assertEqual(doc['opening_balance'], '0')
+        self.assertEqual([entry['description'] for entry in doc['entries']], [f"Order #{self.order.pk}"])
+        closing = documents.statement_lines(doc)[-1].split()[-1]
+        CustomerLedger.refresh([self.customer.pk])
+        self.assertEqual(closing, documents._money(CustomerLedger.objects.get(customer=self.customer).open_balance))
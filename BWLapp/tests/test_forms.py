@@ -0,0 +1,100 @@
+# BWLapp/tests/test_forms.py
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.forms import inlineformset_factory
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from BWLapp import catalog
+from BWLapp.forms import ChoiceCache, OrderForm, OrderItemForm
+from BWLapp.models import Customer, CustomUser, Order, OrderItem, Product, Stock
+
+OrderItemFormSet = inlineformset_factory(Order, OrderItem, form=OrderItemForm, extra=0, can_delete=True)
+
+
+class ChoiceCacheTestMixin:
+    def setUp(self):
+        cache.clear()
+        catalog._local_catalog.update(version=None, catalog=None)
+        self.user = CustomUser.objects.create_user('boss', password='pw', role='admin')
+        self.customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        self.stocks = [
+            Stock.objects.create(
+                product=Product.objects.create(name=f"Product {i}", selling_price=Decimal('10.00')),
+                package_type='bulk', quantity=100, price_per_package=Decimal('10.00'),
+            )
+            for i in range(10)
+        ]
+
+    def order_with_lines(self, lines):
+        order = Order.objects.create(customer=self.customer, created_by=self.user)
+        for stock in self.stocks[:lines]:
+            OrderItem.objects.create(order=order, stock_item=stock, quantity=1)
+        return order
+
+
+class SharedChoicesTests(ChoiceCacheTestMixin, TestCase):
+    def post_data(self, order, lines):
+        data = {
+            'customer': self.customer.pk, 'status': 'Pending', 'created_by': self.user.pk,
+            'items-TOTAL_FORMS': lines, 'items-INITIAL_FORMS': 0,
+        }
+        for i, stock in enumerate(self.stocks[:lines]):
+            data.update({f'items-{i}-stock_item': stock.pk, f'items-{i}-quantity': 2})
+        return data
+
+    def validate(self, lines):
+        order = Order(customer=self.customer)
+        choice_cache = ChoiceCache()
+        data = self.post_data(order, lines)
+        order_form = OrderForm(data, instance=order, choice_cache=choice_cache)
+        formset = OrderItemFormSet(data, instance=order, form_kwargs={'choice_cache': choice_cache})
+        self.assertTrue(order_form.is_valid() and formset.is_valid(), (order_form.errors, formset.errors))
+
+    def test_validation_queries_do_not_grow_with_the_lines(self):
+        with CaptureQueriesContext(connection) as one_line:
+            self.validate(1)
+        with self.assertNumQueries(len(one_line)):
+            self.validate(10)
+
+    def test_only_the_chosen_stock_rows_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.validate(2)
+        stock_queries = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "BWLapp_stock"' in q['sql']]
+        self.assertEqual(len(stock_queries), 1)
+        # By primary key, not the whole available catalog.
+        self.assertIn('"BWLapp_stock"."id" IN (', stock_queries[0])
+
+    def test_cached_field_rejects_choices_outside_its_queryset(self):
+        Stock.objects.filter(pk=self.stocks[0].pk).update(is_available=False)
+        form = OrderItemForm({'stock_item': self.stocks[0].pk, 'quantity': 1}, choice_cache=ChoiceCache())
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['stock_item'][0].split('.')[0], "Select a valid choice")
+
+    def test_without_a_cache_the_field_queries_as_usual(self):
+        form = OrderItemForm({'stock_item': self.stocks[0].pk, 'quantity': 1})
+        with self.assertNumQueries(1):
+            self.assertEqual(form.fields['stock_item'].clean(self.stocks[0].pk), self.stocks[0])
+
+
+class ManageOrderTests(ChoiceCacheTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def render(self, order):
+        response = self.client.get(f'/orders/{order.pk}/update/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_page_queries_do_not_grow_with_the_lines(self):
+        small, large = self.order_with_lines(1), self.order_with_lines(10)
+        self.render(small)  # Warm the session and catalog.
+        with CaptureQueriesContext(connection) as one_line:
+            self.render(small)
+        with self.assertNumQueries(len(one_line)):
+            response = self.render(large)
+        for stock in self.stocks:
+            self.assertContains(response, f'value="{catalog.stock_label(stock)}"')
@@ -0,0 +1,47 @@
+# BWLapp/tests/test_identity.py
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from BWLapp.identity import CachedModelBackend
+from BWLapp.models import CustomUser, Profile
+
+
+class CachedModelBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('clerk', password='pw', role='employee')
+        Profile.objects.create(user=self.user, name='Clerk')
+        self.backend = CachedModelBackend()
+
+    def test_per_process_cache_reads_the_database(self):
+        # The default LocMemCache isn't shared, so no copy may outlive a change made elsewhere.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    @mock.patch('BWLapp.identity.cache_is_shared', return_value=True)
+    def test_shared_cache_serves_user_and_profile(self, _):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertEqual(user.profile.name, 'Clerk')
+
+    @mock.patch('BWLapp.identity.cache_is_shared', return_value=True)
+    def test_save_invalidates_cached_user(self, _):
+        self.backend.get_user(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    @mock.patch('BWLapp.identity.cache_is_shared', return_value=True)
+    def test_profile_save_invalidates_cached_user(self, _):
+        self.backend.get_user(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.get(user=self.user)
+            profile.name = 'Renamed'
+            profile.save()
+        self.assertEqual(self.backend.get_user(self.user.pk).profile.name, 'Renamed')
@@ -0,0 +1,109 @@
+# BWLapp/tests/test_jobs.py
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from BWLapp import jobs
+from BWLapp.models import Job
+
+calls = []
+
+
+def record(**kwargs):
+    calls.append(kwargs)
+
+
+def explode(**kwargs):
+    raise RuntimeError("boom")
+
+
+class CronScheduleTests(TestCase):
+    def test_fields(self):
+        schedule = jobs.CronSchedule('*/15 8-17 * * 1-5')
+        self.assertTrue(schedule.matches(datetime(2026, 10, 19, 8, 45)))  # Monday
+        self.assertFalse(schedule.matches(datetime(2026, 10, 19, 8, 50)))
+        self.assertFalse(schedule.matches(datetime(2026, 10, 19, 18, 0)))
+        self.assertFalse(schedule.matches(datetime(2026, 10, 18, 9, 0)))  # Sunday
+        self.assertTrue(schedule.matches(datetime(2026, 10, 23, 17, 0)))  # Friday
+
+    def test_sunday_is_zero_and_lists_combine(self):
+        schedule = jobs.CronSchedule('0 6,18 1 * 0')
+        self.assertEqual(schedule.fields[1], {6, 18})
+        self.assertTrue(schedule.matches(datetime(2026, 11, 1, 18, 0)))  # A Sunday, the 1st
+
+    def test_bad_expressions(self):
+        for expression in ('* * * *', '60 * * * *', '* 5-2 * * *', '* * 0 * *'):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                jobs.CronSchedule(expression)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        registry = mock.patch.dict(jobs._registry)
+        registry.start()
+        self.addCleanup(registry.stop)
+        jobs.job('tests.record')(record)
+        jobs.job('tests.explode', max_attempts=3)(explode)
+
+    def test_claim_runs_due_jobs_by_priority(self):
+        later = jobs.enqueue('tests.record', run_at=timezone.now() + timedelta(hours=1), n=0)
+        low = jobs.enqueue('tests.record', priority=5, n=1)
+        high = jobs.enqueue('tests.record', priority=-1, n=2)
+        claimed = jobs.claim('w1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker, claimed.attempts), (high.pk, 'running', 'w1', 1))
+        self.assertTrue(jobs.run(claimed))
+        self.assertEqual(jobs.claim('w1').pk, low.pk)
+        self.assertIsNone(jobs.claim('w1'))
+        self.assertEqual(calls, [{'n': 2}])
+        self.assertEqual(Job.objects.get(pk=high.pk).status, 'done')
+        self.assertEqual(Job.objects.get(pk=later.pk).status, 'queued')
+
+    def test_a_claimed_job_is_not_claimed_again(self):
+        jobs.enqueue('tests.record')
+        self.assertIsNotNone(jobs.claim('w1'))
+        self.assertIsNone(jobs.claim('w2'))
+
+    def test_failures_back_off_then_fail(self):
+        job = jobs.enqueue('tests.explode')
+        with self.assertLogs('BWLapp.jobs', 'ERROR'):
+            for attempt in range(1, 4):
+                Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+                claimed = jobs.claim('w1')
+                before = timezone.now()
+                self.assertFalse(jobs.run(claimed))
+                job.refresh_from_db()
+                self.assertEqual(job.attempts, attempt)
+                if attempt < 3:
+                    self.assertEqual(job.status, 'queued')
+                    self.assertGreaterEqual(job.run_at, before + jobs.backoff(attempt))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertEqual([jobs.backoff(n).total_seconds() for n in (1, 2, 3, 20)], [30, 60, 120, 3600])
+
+    def test_retry_gives_a_failed_job_fresh_attempts(self):
+        job = jobs.enqueue('tests.explode')
+        Job.objects.filter(pk=job.pk).update(status='failed', attempts=3, finished_at=timezone.now())
+        jobs.retry(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.finished_at), ('queued', 0, None))
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = jobs.enqueue('tests.record')
+        Job.objects.filter(pk=job.pk).update(status='running', worker='dead', started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(timedelta(minutes=30)), 1)
+        self.assertEqual(jobs.claim('w1').pk, job.pk)
+
+    @mock.patch.object(jobs, '_schedules', [])
+    def test_periodic_jobs_are_queued_once_per_slot(self):
+        jobs.periodic('*/5 * * * *', name='tests.tick')(record)
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        self.assertEqual(jobs.schedule_due(start, start + timedelta(minutes=12)), 2)
+        # A second worker scanning the same window finds the runs already queued.
+        jobs.schedule_due(start, start + timedelta(minutes=12))
+        self.assertEqual(
+            sorted(Job.objects.filter(name='tests.tick').values_list('run_at', flat=True)),
+            [start + timedelta(minutes=5), start + timedelta(minutes=10)],
+        )
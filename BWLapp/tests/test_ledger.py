@@ -0,0 +1,53 @@
+# BWLapp/tests/test_ledger.py
+from decimal import Decimal
+
+from django.test import TestCase
+
+from BWLapp.models import Customer, CustomerLedger, Order, OrderItem, Payment, Product, Stock
+
+
+class CustomerLedgerRefreshTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Mwila', email='mwila@example.com')
+        product = Product.objects.create(name='Sugar', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=100, price_per_package=Decimal('10.00'))
+
+    def order(self, quantity, status='Pending', paid=None):
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, stock_item=self.stock, quantity=quantity)
+        if paid is not None:
+            Payment.objects.create(order=order, method='Cash', total_amount=paid)
+        Order.objects.filter(pk=order.pk).update(status=status)
+        return order
+
+    def ledger(self):
+        CustomerLedger.refresh([self.customer.pk])
+        return CustomerLedger.objects.get(customer=self.customer)
+
+    def test_totals(self):
+        unpaid = self.order(3)
+        self.order(2, paid=Decimal('20.00'))
+        ledger = self.ledger()
+        self.assertEqual(ledger.order_count, 2)
+        self.assertEqual(ledger.total_ordered, Decimal('50.00'))
+        self.assertEqual(ledger.lifetime_spend, Decimal('20.00'))
+        self.assertEqual(ledger.open_balance, Decimal('30.00'))
+        self.assertEqual(ledger.oldest_unpaid_order_date, unpaid.order_date)
+
+    def test_closed_orders_are_never_owed(self):
+        self.order(3, status='Cancelled')
+        self.order(4, status='Returned', paid=Decimal('40.00'))
+        open_order = self.order(1)
+        ledger = self.ledger()
+        self.assertEqual(ledger.order_count, 3)
+        self.assertEqual(ledger.total_ordered, Decimal('10.00'))
+        # The returned order's payment doesn't settle the open order.
+        self.assertEqual(ledger.open_balance, Decimal('10.00'))
+        self.assertEqual(ledger.lifetime_spend, Decimal('40.00'))
+        self.assertEqual(ledger.oldest_unpaid_order_date, open_order.order_date)
+
+    def test_only_closed_orders_leave_nothing_open(self):
+        self.order(3, status='Cancelled')
+        ledger = self.ledger()
+        self.assertEqual(ledger.open_balance, Decimal('0'))
+        self.assertIsNone(ledger.oldest_unpaid_order_date)
@@ -0,0 +1,91 @@
+# BWLapp/tests/test_order_status.py
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.test import TestCase
+from rest_framework import serializers
+
+from BWLapp.models import Customer, CustomerLedger, CustomUser, Order, OrderItem, Product, Stock
+from BWLapp.order_status import transition_orders
+from BWLapp.serializers import OrderSerializer
+
+
+class TransitionOrdersTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('boss', password='pw', role='admin')
+        self.customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=20, price_per_package=Decimal('10.00'))
+        self.order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=self.order, stock_item=self.stock, quantity=3)
+        CustomerLedger.refresh([self.customer.pk])
+
+    def test_cancelling_returns_stock_and_clears_the_balance(self):
+        self.assertEqual(CustomerLedger.objects.get(customer=self.customer).open_balance, Decimal('30.00'))
+        moved, skipped = transition_orders([self.order.pk], 'Cancelled', self.user.pk)
+        self.assertEqual((moved, skipped), ([self.order.pk], {}))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 20)
+        self.assertEqual(CustomerLedger.objects.get(customer=self.customer).open_balance, Decimal('0'))
+
+    def test_illegal_moves_are_skipped(self):
+        moved, skipped = transition_orders([self.order.pk, 999999], 'Delivered', self.user.pk)
+        self.assertEqual(moved, [])
+        self.assertEqual(set(skipped), {self.order.pk, 999999})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Pending')
+
+    def serializer(self, instance, status):
+        context = {'request': SimpleNamespace(user=self.user, method='PATCH')}
+        return OrderSerializer(instance, data={'status': status}, partial=True, context=context)
+
+    def test_serializer_reports_the_saved_status(self):
+        serializer = self.serializer(self.order, 'Picked')
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().status, 'Picked')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'Picked')
+
+    def test_serializer_rejects_a_move_that_lost_a_race(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        transition_orders([self.order.pk], 'Picked', self.user.pk)
+        transition_orders([self.order.pk], 'Dispatched', self.user.pk)
+        serializer = self.serializer(stale, 'Cancelled')
+        self.assertTrue(serializer.is_valid(), serializer.errors)  # Pending -> Cancelled, as far as it knows
+        with self.assertRaises(serializers.ValidationError):
+            serializer.save()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'Dispatched')
+
+
+class ManageClosedOrderTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('boss', password='pw', role='admin')
+        self.client.force_login(self.admin)
+        self.customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=20, price_per_package=Decimal('10.00'))
+        self.order = Order.objects.create(customer=self.customer)
+        self.item = OrderItem.objects.create(order=self.order, stock_item=self.stock, quantity=3)
+        Order.objects.filter(pk=self.order.pk).update(status='Cancelled')
+
+    def post(self, quantity, **extra):
+        data = {
+            'customer': self.customer.pk, 'status': 'Cancelled', 'created_by': '',
+            'items-TOTAL_FORMS': '2', 'items-INITIAL_FORMS': '1', 'items-MIN_NUM_FORMS': '0', 'items-MAX_NUM_FORMS': '1000',
+            'items-0-id': self.item.pk, 'items-0-order': self.order.pk,
+            'items-0-stock_item': self.stock.pk, 'items-0-quantity': quantity,
+            **extra,
+        }
+        return self.client.post(f'/orders/{self.order.pk}/update/', data)
+
+    def test_changing_a_line_is_rejected_not_a_server_error(self):
+        response = self.post(5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['formset'].non_form_errors()), ["This order is cancelled; its items can't change."])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 3)
+
+    def test_adding_a_line_is_rejected(self):
+        response = self.post(3, **{'items-1-stock_item': self.stock.pk, 'items-1-quantity': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['formset'].non_form_errors())
+        self.assertEqual(self.order.items.count(), 1)
@@ -0,0 +1,93 @@
+# BWLapp/tests/test_outbox.py
+from unittest import mock
+
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from BWLapp import outbox
+from BWLapp.models import Customer, CustomerLedger, Notification, Order, OrderItem, OutboxEvent, Product, Stock
+
+
+def notify(event):
+    Notification.objects.create(message=f"handled {event.aggregate_id}")
+
+
+def fail(event):
+    Notification.objects.create(message="rolled back")
+    raise RuntimeError("handler failed")
+
+
+class DispatchTests(TestCase):
+    def setUp(self):
+        OutboxEvent.objects.all().delete()
+
+    def test_handled_events_are_marked_done(self):
+        event = outbox.emit('test.ok', 'Thing', 1)
+        with mock.patch.dict(outbox._handlers, {'test.ok': [notify]}):
+            self.assertEqual(outbox.dispatch_batch(), {'done': 1, 'retried': 0, 'failed': 0, 'deferred': 0})
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'done')
+        self.assertIsNotNone(event.processed_at)
+        self.assertTrue(Notification.objects.filter(message='handled 1').exists())
+
+    def test_failed_event_is_rolled_back_retried_and_holds_back_its_aggregate(self):
+        failing = outbox.emit('test.fail', 'Thing', 1)
+        held = outbox.emit('test.ok', 'Thing', 1)
+        other = outbox.emit('test.ok', 'Thing', 2)
+        with mock.patch.dict(outbox._handlers, {'test.ok': [notify], 'test.fail': [fail]}), \
+                self.assertLogs('BWLapp.outbox', 'ERROR'):
+            summary = outbox.dispatch_batch()
+        self.assertEqual(summary, {'done': 1, 'retried': 1, 'failed': 0, 'deferred': 1})
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), ('pending', 1))
+        self.assertGreater(failing.next_attempt_at, timezone.now())
+        self.assertFalse(Notification.objects.filter(message='rolled back').exists())
+        self.assertEqual(OutboxEvent.objects.get(pk=held.pk).status, 'pending')
+        self.assertEqual(OutboxEvent.objects.get(pk=other.pk).status, 'done')
+
+    def test_events_behind_one_claimed_elsewhere_wait(self):
+        claimed = outbox.emit('test.ok', 'Thing', 1)
+        later = outbox.emit('test.ok', 'Thing', 1)
+        other = outbox.emit('test.ok', 'Thing', 2)
+        # Another dispatcher has locked `claimed`, so skip_locked leaves it out of this batch.
+        select_for_update = OutboxEvent.objects.select_for_update
+        with mock.patch.object(OutboxEvent.objects, 'select_for_update',
+                               lambda **kwargs: select_for_update(**kwargs).exclude(pk=claimed.pk)), \
+                mock.patch.dict(outbox._handlers, {'test.ok': [notify]}):
+            self.assertEqual(outbox.dispatch_batch(), {'done': 1, 'retried': 0, 'failed': 0, 'deferred': 1})
+        self.assertEqual(OutboxEvent.objects.get(pk=later.pk).status, 'pending')
+        self.assertEqual(OutboxEvent.objects.get(pk=other.pk).status, 'done')
+
+    def test_event_fails_after_max_attempts(self):
+        event = outbox.emit('test.fail', 'Thing', 1)
+        OutboxEvent.objects.filter(pk=event.pk).update(attempts=outbox.MAX_ATTEMPTS - 1)
+        with mock.patch.dict(outbox._handlers, {'test.fail': [fail]}), self.assertLogs('BWLapp.outbox', 'ERROR'):
+            self.assertEqual(outbox.dispatch_batch()['failed'], 1)
+        self.assertEqual(OutboxEvent.objects.get(pk=event.pk).status, 'failed')
+
+    def test_suppressed_emit_writes_nothing(self):
+        with outbox.suppressed():
+            self.assertIsNone(outbox.emit('test.ok', 'Thing', 1))
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class LedgerHandlerTests(TestCase):
+    def test_moving_an_order_refreshes_both_customers(self):
+        first = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        second = Customer.objects.create(name='Mwila', email='mwila@example.com')
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        stock = Stock.objects.create(product=product, package_type='bulk', quantity=20, price_per_package=Decimal('10.00'))
+        order = Order.objects.create(customer=first)
+        OrderItem.objects.create(order=order, stock_item=stock, quantity=3)
+        outbox.dispatch_batch()
+        self.assertEqual(CustomerLedger.objects.get(customer=first).open_balance, Decimal('30.00'))
+
+        order.customer = second
+        order.save()
+        # A later event of the same order skips the current customer, not the one moved away from.
+        OrderItem.objects.create(order=order, stock_item=stock, quantity=1)
+        outbox.dispatch_batch()
+        self.assertEqual(CustomerLedger.objects.get(customer=first).open_balance, Decimal('0'))
+        self.assertEqual(CustomerLedger.objects.get(customer=second).open_balance, Decimal('40.00'))
@@ -0,0 +1,72 @@
+# BWLapp/tests/test_prices.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from BWLapp import prices
+from BWLapp.models import Customer, Order, OrderItem, PriceHistory, Product, Stock
+
+
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=self.product, package_type='bulk', quantity=50, price_per_package=Decimal('100.00'))
+        # The opening prices were set ten days ago and changed five days ago.
+        PriceHistory.objects.update(valid_from=self.days_ago(10))
+        for item, price in ((self.product, Decimal('12.00')), (self.stock, Decimal('110.00'))):
+            PriceHistory.record(item, price, when=self.days_ago(5))
+        Product.objects.filter(pk=self.product.pk).update(selling_price=Decimal('12.00'))
+        Stock.objects.filter(pk=self.stock.pk).update(price_per_package=Decimal('110.00'))
+        self.customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+
+    def days_ago(self, days):
+        return self.now - timedelta(days=days)
+
+    def order_item(self, days):
+        order = Order.objects.create(customer=self.customer)
+        item = OrderItem.objects.create(order=order, stock_item=self.stock, quantity=1)
+        Order.objects.filter(pk=order.pk).update(order_date=self.days_ago(days))
+        return item
+
+    def test_prices_as_of(self):
+        for model, pk, before, after in (
+            (Product, self.product.pk, Decimal('10.00'), Decimal('12.00')),
+            (Stock, self.stock.pk, Decimal('100.00'), Decimal('110.00')),
+        ):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(prices.prices_as_of(model, [pk], self.days_ago(7)), {pk: before})
+                # valid_to is exclusive: the new price applies from the moment of the change.
+                self.assertEqual(prices.prices_as_of(model, [pk], self.days_ago(5)), {pk: after})
+                self.assertEqual(prices.prices_as_of(model, [pk], self.now), {pk: after})
+                self.assertEqual(prices.prices_as_of(model, [pk], self.days_ago(20)), {})
+
+    def test_annotate_price_as_of_the_order_date(self):
+        items = {days: self.order_item(days).pk for days in (20, 7, 2)}
+        annotated = dict(
+            prices.annotate_price_as_of(OrderItem.objects, 'stock_item__product', 'order__order_date')
+            .values_list('pk', 'price_as_of')
+        )
+        # Before the history began there is nothing to go on but the current price.
+        self.assertEqual(annotated, {items[20]: Decimal('12.00'), items[7]: Decimal('10.00'), items[2]: Decimal('12.00')})
+        stock_prices = prices.annotate_price_as_of(OrderItem.objects.filter(pk=items[7]), 'stock_item', 'order__order_date', name='package_price')
+        self.assertEqual(stock_prices.get().package_price, Decimal('100.00'))
+
+    def test_fill_product_snapshots_costs_items_at_the_order_date(self):
+        item = self.order_item(7)
+        OrderItem.objects.filter(pk=item.pk).update(product=None, unit_cost=None)
+        self.assertEqual(prices.fill_product_snapshots(OrderItem), 1)
+        item.refresh_from_db()
+        self.assertEqual((item.product_id, item.unit_cost), (self.product.pk, Decimal('10.00')))
+
+    def test_models_without_history_are_rejected(self):
+        with self.assertRaises(ValueError):
+            prices.prices_as_of(Customer, [self.customer.pk], self.now)
+
+    def test_sync_opens_rows_for_prices_written_without_save(self):
+        Product.objects.filter(pk=self.product.pk).update(selling_price=Decimal('15.00'))
+        self.assertEqual(prices.sync_price_history(), 1)
+        self.assertEqual(prices.prices_as_of(Product, [self.product.pk], timezone.now()), {self.product.pk: Decimal('15.00')})
+        self.assertEqual(prices.prices_as_of(Product, [self.product.pk], self.days_ago(1)), {self.product.pk: Decimal('12.00')})
@@ -0,0 +1,79 @@
+# BWLapp/tests/test_reconcile.py
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import F, Sum
+from django.test import TestCase
+
+from BWLapp import reconcile
+from BWLapp.models import AuditTrail, Customer, Order, OrderItem, Product, Stock, StockShard
+
+
+class DriftTests(TestCase):
+    def setUp(self):
+        # check_range closes its connection for the worker processes; keep the test's open.
+        patcher = mock.patch('BWLapp.reconcile.connection')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=0, price_per_package=Decimal('10.00'))
+        self.stock.adjust_quantity(20, 'receipt')
+        self.order = Order.objects.create(customer=Customer.objects.create(name='Chanda', email='chanda@example.com'))
+        self.item = OrderItem.objects.create(order=self.order, stock_item=self.stock, quantity=5)
+
+    def drift(self):
+        checked, rows = reconcile.find_drift(workers=1)
+        self.assertEqual(checked, 1)
+        return rows
+
+    def ledger(self):
+        return self.stock.movements.aggregate(total=Sum('change'))['total']
+
+    def test_consistent_stock_has_no_drift(self):
+        self.assertEqual(self.drift(), [])
+
+    def test_quantity_written_without_a_movement(self):
+        Stock.objects.filter(pk=self.stock.pk).update(quantity=F('quantity') - 2)
+        row, = self.drift()
+        self.assertEqual(row, {'stock_id': self.stock.pk, 'on_hand': 13, 'ledger': 15, 'expected': 15})
+        self.assertTrue(reconcile.fix_drift(row))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 15)
+        self.assertFalse(self.stock.movements.filter(source_model=reconcile.RECONCILIATION_SOURCE).exists())
+        self.assertTrue(AuditTrail.objects.filter(action='Reconciled Stock', record_id=str(self.stock.pk)).exists())
+        self.assertEqual(self.drift(), [])
+
+    def test_item_changed_without_a_movement(self):
+        OrderItem.objects.filter(pk=self.item.pk).update(quantity=7)
+        row, = self.drift()
+        self.assertEqual((row['on_hand'], row['ledger'], row['expected']), (15, 15, 13))
+        self.assertTrue(reconcile.fix_drift(row))
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).quantity, 13)
+        self.assertEqual(self.ledger(), 13)
+        self.assertEqual(self.drift(), [])
+
+    def test_cancelled_orders_are_not_demand(self):
+        Order.objects.filter(pk=self.order.pk).update(status='Cancelled')
+        row, = self.drift()
+        self.assertEqual(row['expected'], 20)
+
+    def test_sharded_stock_is_checked_and_fixed_on_its_shards(self):
+        self.stock.enable_sharding(4)
+        StockShard.objects.filter(stock=self.stock, index=0).update(quantity=F('quantity') + 3)
+        row, = self.drift()
+        self.assertEqual((row['on_hand'], row['ledger'], row['expected']), (18, 15, 15))
+        self.assertTrue(reconcile.fix_drift(row))
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).available_quantity, 15)
+        self.assertEqual(self.drift(), [])
+
+    def test_fix_is_skipped_when_stock_moved_since_the_check(self):
+        Stock.objects.filter(pk=self.stock.pk).update(quantity=F('quantity') - 2)
+        row, = self.drift()
+        OrderItem.objects.create(order=self.order, stock_item=self.stock, quantity=1)
+        self.assertFalse(reconcile.fix_drift(row))
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).quantity, 12)
+        self.assertFalse(reconcile.fix_drift({**row, 'expected': -1}))
+
+    def test_partitions(self):
+        self.assertEqual(reconcile.partitions([5, 1, 3, 2, 4], 2), [(1, 3), (4, 5)])
+        self.assertEqual(reconcile.partitions([], 4), [])
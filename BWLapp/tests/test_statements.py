@@ -0,0 +1,121 @@
+# BWLapp/tests/test_statements.py
+import io
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from BWLapp import statements
+from BWLapp.models import BankStatement, Customer, CustomUser, Order, OrderItem, Payment, Product, StatementLine, Stock
+
+
+class ConfirmLinesTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('clerk', password='pw', role='employee')
+        self.customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=50, price_per_package=Decimal('10.00'))
+        self.order = self.make_order(3)
+        self.statement = BankStatement.objects.create(name='june.csv', method='Mobile Money')
+        self.paid_on = timezone.localdate() - timedelta(days=2)
+
+    def make_order(self, quantity):
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, stock_item=self.stock, quantity=quantity)
+        return order
+
+    def line(self, amount='30.00', line_no=2):
+        return StatementLine.objects.create(statement=self.statement, line_no=line_no, date=self.paid_on, amount=Decimal(amount))
+
+    def test_payment_is_dated_by_its_line(self):
+        line = self.line()
+        payment, = statements.confirm_lines(self.statement, {line.pk: self.order.pk}, user=self.user)
+        payment.refresh_from_db()
+        self.assertEqual(timezone.localtime(payment.payment_date).date(), self.paid_on)
+        self.assertEqual((payment.total_amount, payment.method), (Decimal('30.00'), 'Mobile Money'))
+        line.refresh_from_db()
+        self.assertEqual((line.status, line.payment_id, line.matched_order_id), ('confirmed', payment.pk, self.order.pk))
+
+    def test_closed_or_paid_off_orders_are_skipped(self):
+        cancelled, paid = self.order, self.make_order(2)
+        Order.objects.filter(pk=cancelled.pk).update(status='Cancelled')
+        Payment.objects.create(order=paid, total_amount=Decimal('20.00'), method='Cash')
+        first, second = self.line(line_no=2), self.line('20.00', line_no=3)
+        self.assertEqual(statements.confirm_lines(self.statement, {first.pk: cancelled.pk, second.pk: paid.pk}), [])
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(set(self.statement.lines.values_list('status', flat=True)), {'unmatched'})
+
+    def test_confirming_twice_pays_once(self):
+        line = self.line()
+        statements.confirm_lines(self.statement, {line.pk: self.order.pk})
+        self.assertEqual(statements.confirm_lines(self.statement, {line.pk: self.order.pk}), [])
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+
+class MatchStatementTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=100, price_per_package=Decimal('10.00'))
+        self.chanda = Customer.objects.create(name='Chanda Mwale', email='chanda@example.com', phone='0977 123 456')
+        self.bwalya = Customer.objects.create(name='Bwalya', email='bwalya@example.com')
+        self.by_phone = self.make_order(self.chanda, 3)
+        self.by_reference = self.make_order(self.bwalya, 4)
+        self.by_amount = self.make_order(self.bwalya, 7)
+        self.today = timezone.localdate().isoformat()
+
+    def make_order(self, customer, quantity):
+        order = Order.objects.create(customer=customer)
+        OrderItem.objects.create(order=order, stock_item=self.stock, quantity=quantity)
+        return order
+
+    def import_csv(self, rows):
+        text = 'Date,Amount,Narration,Sender,MSISDN\n' + ''.join(f"{','.join(row)}\n" for row in rows)
+        return statements.import_statement(io.BytesIO(text.encode()), 'june.csv', 'Mobile Money')
+
+    def matches(self, statement):
+        return {line.line_no: (line.status, line.matched_order_id) for line in statement.lines.all()}
+
+    def test_lines_match_by_reference_customer_and_amount(self):
+        statement = self.import_csv([
+            (self.today, '30.00', 'airtime', 'C MWALE', '+260977123456'),
+            (self.today, '40.00', f'Payment for order {self.by_reference.pk}', '', ''),
+            (self.today, '70.00', 'transfer', '', ''),
+            (self.today, '12.34', 'unknown', 'Nobody', ''),
+            (self.today, '-50.00', 'withdrawal', '', ''),
+        ])
+        self.assertEqual(self.matches(statement), {
+            2: ('suggested', self.by_phone.pk),
+            3: ('suggested', self.by_reference.pk),
+            4: ('suggested', self.by_amount.pk),
+            5: ('unmatched', None),
+        })
+        line = statement.lines.get(line_no=3)
+        self.assertGreaterEqual(line.score, statements.AUTO_CONFIRM_THRESHOLD)
+
+    def test_orders_placed_after_the_payment_are_not_matched(self):
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        statement = self.import_csv([(yesterday, '40.00', f'order {self.by_reference.pk}', '', '')])
+        self.assertEqual(self.matches(statement), {2: ('unmatched', None)})
+
+    def test_an_order_takes_lines_only_up_to_its_balance(self):
+        statement = self.import_csv([
+            (self.today, '30.00', f'order {self.by_phone.pk}', '', ''),
+            (self.today, '30.00', f'order {self.by_phone.pk}', '', ''),
+        ])
+        self.assertEqual(sorted(self.matches(statement).values(), key=str), [('suggested', self.by_phone.pk), ('unmatched', None)])
+
+    def test_closed_orders_are_not_matched_and_rematching_picks_up_changes(self):
+        Order.objects.filter(pk=self.by_reference.pk).update(status='Cancelled')
+        statement = self.import_csv([(self.today, '40.00', f'order {self.by_reference.pk}', '', '')])
+        self.assertEqual(self.matches(statement), {2: ('unmatched', None)})
+        Order.objects.filter(pk=self.by_reference.pk).update(status='Pending')
+        self.assertEqual(statements.match_statement(statement), 1)
+        self.assertEqual(self.matches(statement), {2: ('suggested', self.by_reference.pk)})
+
+    def test_bad_rows_are_reported(self):
+        with self.assertRaisesRegex(statements.StatementError, 'Row 2: unrecognised amount'):
+            self.import_csv([(self.today, 'lots', '', '', '')])
+        with self.assertRaisesRegex(statements.StatementError, 'no amount column'):
+            statements.import_statement(io.BytesIO(b'Date,Ref\n2026-01-01,x\n'), 'bad.csv', 'Cash')
+        self.assertFalse(BankStatement.objects.exists())
@@ -0,0 +1,69 @@
+# BWLapp/tests/test_stock.py
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from BWLapp.models import Customer, CustomUser, Order, OrderItem, Product, Stock, StockMovement
+
+
+class ShardedStockEditTests(TestCase):
+    def setUp(self):
+        caches['template_fragments'].clear()
+        self.admin = CustomUser.objects.create_superuser('boss', password='pw', role='admin')
+        self.client.force_login(self.admin)
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=100, price_per_package=Decimal('10.00'))
+        self.stock.enable_sharding(4)
+        customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        for _ in range(2):
+            OrderItem.objects.create(order=Order.objects.create(customer=customer), stock_item=self.stock, quantity=5)
+        self.stock.refresh_from_db()
+        self.assertNotEqual(self.stock.quantity, 90)  # The column lags; the shards hold 90.
+        self.assertEqual(self.stock.available_quantity, 90)
+
+    def form_data(self, form, **changes):
+        """The form as shown, with a new price and `changes`."""
+        return {
+            'product': self.stock.product_id, 'package_type': 'bulk', 'quantity': form.initial['quantity'],
+            'price_per_package': '12.00', 'is_available': 'True', **changes,
+        }
+
+    def view_form(self):
+        return self.client.get(f'/stocks/{self.stock.pk}/update/').context['form']
+
+    def adjustments(self):
+        return list(StockMovement.objects.filter(stock=self.stock, kind='adjustment').values_list('change', flat=True))
+
+    def test_form_shows_the_shard_total(self):
+        self.assertEqual(self.view_form().initial['quantity'], 90)
+
+    def test_price_only_edit_keeps_the_quantity(self):
+        response = self.client.post(f'/stocks/{self.stock.pk}/update/', self.form_data(self.view_form()))
+        self.assertEqual(response.status_code, 302)
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.available_quantity, self.stock.price_per_package), (90, Decimal('12.00')))
+        self.assertEqual(self.adjustments(), [])
+
+    def test_stock_count_is_applied_as_an_adjustment(self):
+        self.client.post(f'/stocks/{self.stock.pk}/update/', self.form_data(self.view_form(), quantity=80))
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.available_quantity, self.stock.quantity), (80, 80))
+        self.assertEqual(self.adjustments(), [-10])
+
+    def test_admin_price_only_edit_keeps_the_quantity(self):
+        url = f'/admin/BWLapp/stock/{self.stock.pk}/change/'
+        form = self.client.get(url).context['adminform'].form
+        self.assertEqual(form.initial['quantity'], 90)
+        response = self.client.post(url, self.form_data(form))
+        self.assertEqual(response.status_code, 302)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.available_quantity, 90)
+        self.assertEqual(self.adjustments(), [])
+
+    def test_dashboard_and_list_read_the_shards(self):
+        response = self.client.get('/admin-dashboard/')
+        self.assertEqual(response.context['total_stock_quantity'], 90)
+        self.assertEqual(response.context['total_inventory_value'], Decimal('900.00'))
+        response = self.client.get('/stocks/')
+        self.assertEqual([stock.on_hand for stock in response.context['all_stocks']], [90])
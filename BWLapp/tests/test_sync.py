@@ -0,0 +1,45 @@
+# BWLapp/tests/test_sync.py
+from decimal import Decimal
+
+from django.test import TestCase
+
+from BWLapp import sync
+from BWLapp.models import Customer, CustomUser, Order, Payment, Product, Stock
+
+
+class ApplyBatchTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('till', password='pw', role='employee')
+        self.customer = Customer.objects.create(name='Chanda', email='chanda@example.com')
+        product = Product.objects.create(name='Salt', selling_price=Decimal('10.00'))
+        self.stock = Stock.objects.create(product=product, package_type='bulk', quantity=10, price_per_package=Decimal('10.00'))
+
+    def order(self, key, quantity=2):
+        return {'key': key, 'type': 'order', 'customer': self.customer.pk,
+                'items': [{'stock_item': self.stock.pk, 'quantity': quantity}]}
+
+    def statuses(self, results):
+        return [result['status'] for result in results]
+
+    def test_resent_keys_are_answered_from_their_receipts(self):
+        batch = [self.order('t1-1'), {'key': 't1-2', 'type': 'payment', 'order_key': 't1-1', 'method': 'Cash', 'total_amount': '20.00'}]
+        first = sync.apply_batch(batch, self.user.pk)
+        self.assertEqual(self.statuses(first), ['applied', 'applied'])
+        again = sync.apply_batch(batch, self.user.pk)
+        self.assertEqual(self.statuses(again), ['duplicate', 'duplicate'])
+        self.assertEqual(again[0]['order_id'], first[0]['order_id'])
+        self.assertEqual(again[1]['payment_id'], first[1]['payment_id'])
+        self.assertEqual((Order.objects.count(), Payment.objects.count()), (1, 1))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 8)
+
+    def test_key_repeated_within_a_batch_is_rejected(self):
+        results = sync.apply_batch([self.order('t1-1'), self.order('t1-1')], self.user.pk)
+        self.assertEqual(self.statuses(results), ['rejected', 'rejected'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_rejected_operation_leaves_the_rest_applied(self):
+        results = sync.apply_batch([self.order('t1-1', 6), self.order('t1-2', 6), self.order('t1-3', 4)], self.user.pk)
+        self.assertEqual(self.statuses(results), ['applied', 'rejected', 'applied'])
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 0)
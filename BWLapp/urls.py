@@ -11,10 +11,21 @@ from .views import (
     employee_dashboard,
     search_dashboard,
     get_notifications,
+    db_pool_stats,
+    stock_autocomplete,
     payment_receipt,
+    payment_receipt_pdf,
+    order_invoice_pdf,
+    documents_zip,
     profile,
     change_password,
     reports_view,
+    audit_trail_view,
+    audit_record_history,
+    job_status,
+    bank_statements,
+    statement_review,
+    customer_duplicates,
     EmployeeListView, EmployeeCreateView,
     EmployeeUpdateView, EmployeeDeleteView,
     ProductListView, ProductCreateView,
@@ -23,6 +34,7 @@ from .views import (
     CustomerUpdateView, CustomerDeleteView,
     OrderListView, OrderDeleteView,
     manage_order,
+    order_bulk_status,
     OrderItemListView, OrderItemCreateView,
     OrderItemUpdateView, OrderItemDeleteView,
     PaymentListView, PaymentCreateView,
@@ -49,8 +61,23 @@ urlpatterns = [
     #notification urls
     path('notifications/', get_notifications, name='get_notifications'),
 
+    #stock catalog urls
+    path('stocks/autocomplete/', stock_autocomplete, name='stock-autocomplete'),
+
+    #monitoring urls
+    path('monitoring/db-pool/', db_pool_stats, name='db_pool_stats'),
+
+    #bank statement urls
+    path('payments/statements/', bank_statements, name='bank-statements'),
+    path('payments/statements/<int:pk>/', statement_review, name='statement-review'),
+
     #payment receipt url
     path("payment/<int:pk>/receipt/", payment_receipt, name="payment_receipt"),
+    path("payment/<int:pk>/receipt.pdf", payment_receipt_pdf, name="payment_receipt_pdf"),
+
+    #document urls
+    path("orders/<int:pk>/invoice.pdf", order_invoice_pdf, name="order_invoice_pdf"),
+    path("documents/zip/", documents_zip, name="documents_zip"),
 
     # Profile and Password URLs
     path('profile/', profile, name='profile'),
@@ -67,6 +94,7 @@ urlpatterns = [
     path('customer/create/', CustomerCreateView.as_view(), name='customer-create'),
     path('customer/<int:pk>/update/', CustomerUpdateView.as_view(), name='customer-update'),
     path('customer/<int:pk>/delete/', CustomerDeleteView.as_view(), name='customer-delete'),
+    path('customer/duplicates/', customer_duplicates, name='customer-duplicates'),
 
     #Product URLs
     path('products/', ProductListView.as_view(), name='product-list'),
@@ -79,6 +107,7 @@ urlpatterns = [
     path('orders/create/', manage_order, name='order-create'),
     path('orders/<int:order_id>/update/', manage_order, name='order-update'),
     path('orders/<int:pk>/delete/', OrderDeleteView.as_view(), name='order-delete'),
+    path('orders/bulk-status/', order_bulk_status, name='order-bulk-status'),
 
     # OrderItem URLs
     path('orderitem/', OrderItemListView.as_view(), name='orderitem-list'),
@@ -94,6 +123,13 @@ urlpatterns = [
     #report urls
     path('reports/', reports_view, name='reports'),
 
+    #audit trail urls
+    path('audit/', audit_trail_view, name='audit-trail'),
+    path('audit/<str:model_name>/<str:record_id>/', audit_record_history, name='audit-record-history'),
+
+    #background jobs
+    path('jobs/', job_status, name='job-status'),
+
     # Stock URLs
  #report urls
     path('reports/', reports_view, name='reports'),
@@ -6,22 +6,32 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.mixins import AccessMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
 from django.db import transaction
-from django.db.models import Sum, F, Count, Q, ExpressionWrapper, DecimalField
+from django.db.models import Sum, F, Count, Q, Max, OuterRef, Subquery
 from django.db.models.functions import TruncDay, TruncMonth, TruncYear
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.forms import inlineformset_factory
 from django.utils import timezone
-from datetime import timedelta
+from django.conf import settings
+from datetime import timedelta, date
 import json
 from decimal import Decimal
 from django.core.serializers.json import DjangoJSONEncoder
 
-from .models import AuditTrail, Product, Customer, Order, OrderItem, Payment, Employee, Profile, Notification, Category, Stock
-from .forms import RegisterForm, LoginForm, OrderForm, OrderItemForm, PaymentForm, ProductForm, StockForm
+from .models import AuditTrail, Product, Customer, Order, OrderItem, Payment, Employee, Profile, Notification, Category, Stock, StockMovement, CustomerLedger, Job, OutboxEvent, ArchivedOrderItem, ArchivedPayment, BankStatement, StatementLine, DuplicateCandidate
+from .forms import RegisterForm, LoginForm, OrderForm, OrderItemForm, OrderItemInlineFormSet, PaymentForm, ProductForm, StockForm, StatementUploadForm, ChoiceCache
+from .db_pool import pool_stats
+from .catalog import search_catalog
+from . import documents
+from . import audit
+from . import jobs
+from . import statements
+from . import dedupe
+from . import order_status
+from .archive import merge_totals, reaches_archive
 
 # --- New: Custom JSON Encoder for Decimal values ---
 class CustomJSONEncoder(DjangoJSONEncoder):
@@ -98,6 +108,24 @@ def search_dashboard(request):
     # Corrected: Use CustomJSONEncoder for JsonResponse
     return JsonResponse({'results': results}, encoder=CustomJSONEncoder)
 
+@login_required
+def stock_autocomplete(request):
+    """
+    Returns stock packages whose product name or package type starts with the
+    typed words, with live availability, for the order item picker.
+    """
+    results = search_catalog(request.GET.get('q', ''))
+    return JsonResponse({'results': results}, encoder=CustomJSONEncoder)
+
+@login_required
+def db_pool_stats(request):
+    """
+    Returns database connection pool metrics (wait time, saturation) as JSON.
+    """
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse(pool_stats(), encoder=CustomJSONEncoder)
+
 # --- Login & Registration Views ---
 def login_register_view(request):
     login_form = LoginForm()
@@ -136,14 +164,19 @@ def admin_dashboard(request):
     # --- Dashboard Overview Cards ---
     low_stock_threshold = 10
     total_products = Product.objects.count()
-    total_stock_quantity = Stock.objects.aggregate(
-        total=Sum('quantity')
-    )['total'] or 0
-    total_inventory_value = Stock.objects.aggregate(
-        total=Sum(F('quantity') * F('price_per_package'))
-    )['total'] or Decimal('0')
+    # Sharded stock keeps its quantity in the shards, so read on_hand rather than the column.
+    stock_totals = Stock.objects.annotate(on_hand=Stock.on_hand_expression()).aggregate(
+        quantity=Sum('on_hand'),
+        value=Sum(F('on_hand') * F('price_per_package')),
+    )
+    total_stock_quantity = stock_totals['quantity'] or 0
+    total_inventory_value = stock_totals['value'] or Decimal('0')
+    product_on_hand = (
+        Stock.objects.filter(product=OuterRef('pk')).annotate(on_hand=Stock.on_hand_expression())
+        .values('product').annotate(total=Sum('on_hand')).values('total')
+    )
     low_stock_products = Product.objects.annotate(
-        total_quantity=Sum('stock_items__quantity')
+        total_quantity=Subquery(product_on_hand)
     ).filter(
         total_quantity__lt=low_stock_threshold
     )
@@ -170,24 +203,14 @@ def admin_dashboard(request):
         'details': f"Order #{order.order_id} created for {order.customer.name}",
         'date': order.order_date.strftime('%Y-%m-%d')
     } for order in recent_orders]
-    # Get top 5 best-selling products based on quantity sold
+    # Get top 5 best-selling products by sales value, from the items' product snapshot alone
     top_products_qs = (
-    OrderItem.objects
-    .annotate(
-        revenue=ExpressionWrapper(
-            # FIX 1: Change 'product__cost_price' to the appropriate lookup. 
-            # Assuming you want the cost price of the product linked through the stock item.
-            F("quantity") * F("stock_item__product__selling_price"),
-            output_field=DecimalField()
-        )
-    )
-    # FIX 2: Change 'product__name' to the new lookup path.
-    .values("stock_item__product__name") 
-    .annotate(total_sales=Sum("revenue"))
-    .order_by("-total_sales")[:5]
+        OrderItem.objects
+        .values("product_name")
+        .annotate(total_sales=Sum(F("quantity") * F("unit_cost")))
+        .order_by("-total_sales")[:5]
     )
-    # FIX 3: Change 'product__name' in the list comprehension.
-    top_products_labels = [p["stock_item__product__name"] for p in top_products_qs]
+    top_products_labels = [p["product_name"] for p in top_products_qs]
     
     top_products_data = [float(p["total_sales"] or 0) for p in top_products_qs]
     # --- Low Stock Notifications ---
@@ -249,6 +272,14 @@ def change_password(request):
         form = PasswordChangeForm(request.user)
     return render(request, 'BWLapp/change_password.html', {'form': form})
 
+# --- Form Mixins ---
+class SharedChoicesViewMixin:
+    """Gives the view's form a fresh per-request ChoiceCache."""
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['choice_cache'] = ChoiceCache()
+        return kwargs
+
 # --- Access Control Mixins ---
 class AdminRequiredMixin(AccessMixin):
     def dispatch(self, request, *args, **kwargs):
@@ -363,6 +394,7 @@ class CustomerDeleteView(AdminRequiredMixin, DeleteView):
 # --- Product Views ---
 class ProductListView(AjaxableResponseMixin, EmployeeRequiredMixin, ListView):
     model = Product
+    queryset = Product.objects.select_related('category')
     template_name = 'BWLapp/product_list.html'
     context_object_name = 'products'
     ordering = ['product_id']
@@ -375,7 +407,7 @@ class ProductDetailView(EmployeeRequiredMixin, DetailView):
     model = Product
     template_name = 'BWLapp/product_detail.html'
 
-class ProductCreateView(AdminRequiredMixin, CreateView):
+class ProductCreateView(SharedChoicesViewMixin, AdminRequiredMixin, CreateView):
     model = Product
     form_class = ProductForm
     template_name = 'BWLapp/product_form.html'
@@ -386,13 +418,17 @@ class ProductCreateView(AdminRequiredMixin, CreateView):
         if 'image' in self.request.FILES:
             form.instance.image = self.request.FILES['image']
         messages.success(self.request, "Product created successfully!")
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        if 'image' in self.request.FILES:
+            # Resizing large uploads happens in the background worker.
+            jobs.enqueue('products.optimize_image', product_id=self.object.pk)
+        return response
 
     def form_invalid(self, form):
         messages.error(self.request, "There was an error creating the product. Please check the form.")
         return super().form_invalid(form)
 
-class ProductUpdateView(AdminRequiredMixin, UpdateView):
+class ProductUpdateView(SharedChoicesViewMixin, AdminRequiredMixin, UpdateView):
     model = Product
     form_class = ProductForm
     template_name = 'BWLapp/product_form.html'
@@ -403,7 +439,11 @@ class ProductUpdateView(AdminRequiredMixin, UpdateView):
         if 'image' in self.request.FILES:
             form.instance.image = self.request.FILES['image']
         messages.success(self.request, "Product updated successfully!")
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        if 'image' in self.request.FILES:
+            # Resizing large uploads happens in the background worker.
+            jobs.enqueue('products.optimize_image', product_id=self.object.pk)
+        return response
     
     def form_invalid(self, form):
         messages.error(self.request, "There was an error updating the product. Please check the form.")
@@ -419,10 +459,37 @@ class OrderListView(AjaxableResponseMixin, EmployeeRequiredMixin, ListView):
     model = Order
     template_name = 'BWLapp/order_list.html'
     context_object_name = 'orders'
+    def get_queryset(self):
+        orders = Order.objects.select_related('customer').order_by('-order_date')
+        if self.request.GET.get('status') in Order.TRANSITIONS:
+            orders = orders.filter(status=self.request.GET['status'])
+        return orders
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['is_admin'] = self.request.user.role == 'admin'
+        context['status_choices'] = Order.STATUS_CHOICES
+        context['status_filter'] = self.request.GET.get('status', '')
         return context
+
+@login_required
+def order_bulk_status(request):
+    """Moves the ticked orders on the order list to one status in a single update."""
+    if request.user.role != 'admin':
+        return redirect('employee_dashboard')
+    if request.method == 'POST':
+        status = request.POST.get('status')
+        order_ids = [int(pk) for pk in request.POST.getlist('order_ids') if pk.isdigit()]
+        if status not in Order.TRANSITIONS or not order_ids:
+            messages.error(request, "Tick some orders and pick the status to move them to.")
+        else:
+            moved, skipped = order_status.transition_orders(order_ids, status, request.user.pk)
+            if moved:
+                messages.success(request, f"Moved {len(moved)} order(s) to {status}.")
+            if skipped:
+                messages.warning(request, f"Left {len(skipped)} order(s) alone: " + "; ".join(
+                    f"#{pk}: {reason}" for pk, reason in sorted(skipped.items())[:10]
+                ))
+    return redirect(f"{reverse_lazy('order-list')}?status={request.POST.get('status_filter', '')}")
     
 class OrderDeleteView(AdminRequiredMixin, DeleteView):
     model = Order
@@ -471,26 +538,38 @@ def manage_order(request, order_id=None):
         Order,
         OrderItem,
         form=OrderItemForm,
+        formset=OrderItemInlineFormSet,
         extra=1,
         can_delete=True
     )
+    # One cache for the whole page, so each choice queryset runs once no matter how many lines the order has.
+    choice_cache = ChoiceCache()
     if request.method == 'POST':
-        order_form = OrderForm(request.POST, instance=order)
-        formset = OrderItemFormSet(request.POST, instance=order)
+        order_form = OrderForm(request.POST, instance=order, choice_cache=choice_cache)
+        formset = OrderItemFormSet(request.POST, instance=order, form_kwargs={'choice_cache': choice_cache})
         if order_form.is_valid() and formset.is_valid():
             with transaction.atomic():
                 order = order_form.save(commit=False)
+                new_status = order.status
                 if not is_update:
                     order.created_by = request.user
+                else:
+                    # Status changes go through the state machine so their side effects run.
+                    # Save the locked row's current status, not the one the form was loaded with.
+                    order.status = Order.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
                 order.save()
                 formset.save()
+                if new_status != order.status:
+                    _, skipped = order_status.transition_orders([order.pk], new_status, request.user.pk)
+                    if skipped:
+                        messages.warning(request, f"Order #{order.pk} kept its status: {skipped[order.pk]}")
             if request.user.role == 'admin':
                 return redirect('admin_dashboard')
             else:
                 return redirect('employee_dashboard')
     else:
-        order_form = OrderForm(instance=order)
-        formset = OrderItemFormSet(instance=order)
+        order_form = OrderForm(instance=order, choice_cache=choice_cache)
+        formset = OrderItemFormSet(instance=order, form_kwargs={'choice_cache': choice_cache})
     context = {
         'order_form': order_form,
         'formset': formset,
@@ -508,7 +587,7 @@ class PaymentListView(AjaxableResponseMixin, EmployeeRequiredMixin, ListView):
         context['is_admin'] = self.request.user.role == 'admin'
         return context
 
-class PaymentCreateView(EmployeeRequiredMixin, CreateView):
+class PaymentCreateView(SharedChoicesViewMixin, EmployeeRequiredMixin, CreateView):
     model = Payment
     form_class = PaymentForm
     template_name = 'BWLapp/payment_form.html'
@@ -520,7 +599,7 @@ class PaymentCreateView(EmployeeRequiredMixin, CreateView):
             return reverse_lazy('admin_dashboard')
         return reverse_lazy('employee_dashboard')
 
-class PaymentUpdateView(AdminRequiredMixin, UpdateView):
+class PaymentUpdateView(SharedChoicesViewMixin, AdminRequiredMixin, UpdateView):
     model = Payment
     form_class = PaymentForm
     template_name = 'BWLapp/payment_form.html'
@@ -559,26 +638,46 @@ def reports_view(request):
         trunc_by = TruncMonth
         
     # 1. Sales Reports
-    sales_over_time = Payment.objects.filter(
+    # Archived orders and payments are only read when the range reaches back into the archive.
+    sales_over_time = list(Payment.objects.filter(
         payment_date__range=(start_date, end_date)
     ).annotate(
         date_group=trunc_by('payment_date')
     ).values('date_group').annotate(
         total_sales=Sum('total_amount')
-    ).order_by('date_group')
+    ).order_by('date_group'))
+    if reaches_archive(start_date, 'payment_date'):
+        sales_over_time = sorted(merge_totals('date_group', 'total_sales', sales_over_time, ArchivedPayment.objects.filter(
+            payment_date__range=(start_date, end_date)
+        ).annotate(
+            date_group=trunc_by('payment_date')
+        ).values('date_group').annotate(
+            total_sales=Sum('total_amount')
+        ).order_by('date_group')), key=lambda entry: entry['date_group'])
     sales_labels = [entry['date_group'].strftime('%Y-%m-%d' if time_range == 'daily' else '%b %Y') for entry in sales_over_time]
     sales_data = [entry['total_sales'] for entry in sales_over_time]
     
-    # ✅ FIX 1 APPLIED: Corrected aggregation structure for sales_by_product
-    sales_by_product = OrderItem.objects.values('stock_item__product__name').annotate(
+    sales_by_product = OrderItem.objects.values('product_name').annotate(
         total_revenue=Sum(F('quantity') * F('price_each'))
-    ).order_by('-total_revenue')[:10]
+    ).order_by('-total_revenue')
     
     sales_by_employee = Payment.objects.values(
         'processed_by__username'
     ).annotate(
         total_sales=Sum('total_amount')
     ).order_by('-total_sales')
+    if reaches_archive(None):
+        sales_by_product = merge_totals('product_name', 'total_revenue', sales_by_product,
+            ArchivedOrderItem.objects.values('product_name').annotate(
+                total_revenue=Sum(F('quantity') * F('price_each'))
+            ).order_by())
+        sales_by_product.sort(key=lambda entry: entry['total_revenue'], reverse=True)
+        sales_by_employee = merge_totals('processed_by__username', 'total_sales', sales_by_employee,
+            ArchivedPayment.objects.values('processed_by__username').annotate(
+                total_sales=Sum('total_amount')
+            ).order_by())
+        sales_by_employee.sort(key=lambda entry: entry['total_sales'], reverse=True)
+    sales_by_product = sales_by_product[:10]
     
     # 2. Inventory Reports (Rest of the code remains the same as it looked correct)
     low_stock_threshold = 10 
@@ -588,35 +687,40 @@ def reports_view(request):
     
     sold_products = OrderItem.objects.filter(
         order__order_date__gte=six_months_ago
-    ).values_list('stock_item__product_id', flat=True)
+    ).values_list('product_id', flat=True)
     dead_stock = Product.objects.exclude(product_id__in=sold_products)
+    if reaches_archive(six_months_ago):
+        dead_stock = dead_stock.exclude(product_id__in=ArchivedOrderItem.objects.filter(
+            order__order_date__gte=six_months_ago
+        ).values_list('product_id', flat=True))
     
     stock_valuation = Product.objects.aggregate(
         total_at_cost=Sum(F('stock_items__quantity') * F('selling_price')),
         total_at_selling_price=Sum(F('stock_items__quantity') * F('selling_price'))
     ) or {'total_at_cost': Decimal('0'), 'total_at_selling_price': Decimal('0')}
     
-    # 3. Customer Reports (Code remains the same)
-    top_customers = Customer.objects.annotate(
-        total_spent=Sum('order__payment__total_amount')
-    ).exclude(total_spent__isnull=True).order_by('-total_spent')[:10]
-    outstanding_balances = Order.objects.filter(
-        payment__isnull=True,
-        status='pending'
-    ).annotate(
-        total_order_value=Sum(F('items__quantity') * F('items__price_each'))
-    ).order_by('-total_order_value')
+    # 3. Customer Reports (read from the materialized CustomerLedger, which includes the archive)
+    top_customers = CustomerLedger.objects.filter(
+        lifetime_spend__gt=0
+    ).select_related('customer').order_by('-lifetime_spend')[:10]
+    outstanding_balances = CustomerLedger.objects.filter(
+        open_balance__gt=0
+    ).select_related('customer').order_by('-open_balance')[:50]
     
     # 4. Financial Reports (Code remains the same)
     total_revenue = Payment.objects.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-    total_cogs = OrderItem.objects.aggregate(total=Sum(F('quantity') * F('stock_item__product__selling_price'))).get('total') or Decimal('0')
+    # Each item is costed at its unit_cost, the product's price when it was sold.
+    total_cogs = OrderItem.objects.aggregate(total=Sum(F('quantity') * F('unit_cost')))['total'] or Decimal('0')
+    if reaches_archive(None):
+        total_revenue += ArchivedPayment.objects.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
+        total_cogs += ArchivedOrderItem.objects.aggregate(total=Sum(F('quantity') * F('unit_cost')))['total'] or Decimal('0')
     total_profit = total_revenue - total_cogs
     
     # 5. Operational Reports (Code remains the same)
     returned_orders = Order.objects.filter(status='Returned').order_by('-order_date')
     
     # 6. Audit Trail Report (Code remains the same)
-    audit_trail_log = AuditTrail.objects.all().order_by('-timestamp')[:50]
+    audit_trail_log = AuditTrail.objects.select_related('user').order_by('-timestamp', '-id')[:50]
     
     # Context (Code remains the same)
     context = {
@@ -644,13 +748,257 @@ def reports_view(request):
     }
     return render(request, 'BWLapp/reports.html', context)
 
+# --- Audit Trail Views ---
+AUDITED_MODEL_NAMES = ['CustomUser', 'Customer', 'Product', 'Order', 'OrderItem', 'Payment']
+
+@login_required
+def audit_trail_view(request):
+    """
+    Filterable audit log browser, newest first, paginated with a
+    (timestamp, id) keyset cursor.
+    """
+    if request.user.role != 'admin':
+        return redirect('employee_dashboard')
+    filters = {
+        'model_name': request.GET.get('model_name', ''),
+        'record_id': request.GET.get('record_id', ''),
+        'user': request.GET.get('user', ''),
+        'action': request.GET.get('action', ''),
+        'start': request.GET.get('start', ''),
+        'end': request.GET.get('end', ''),
+    }
+    query_filters = dict(filters)
+    for key in ('start', 'end'):
+        try:
+            day = date.fromisoformat(filters[key]) if filters[key] else None
+        except ValueError:
+            day = None
+        query_filters[key] = documents.date_range(day, day)[0 if key == 'start' else 1] if day else None
+
+    entries, next_cursor = audit.browse(query_filters, cursor=request.GET.get('cursor'))
+    params = request.GET.copy()
+    first_query = None
+    if params.pop('cursor', None):
+        first_query = params.urlencode()
+    next_query = None
+    if next_cursor:
+        params['cursor'] = next_cursor
+        next_query = params.urlencode()
+    context = {
+        'entries': entries,
+        'filters': filters,
+        'model_names': AUDITED_MODEL_NAMES,
+        'next_query': next_query,
+        'first_query': first_query,
+    }
+    return render(request, 'BWLapp/audit_trail.html', context)
+
+@login_required
+def audit_record_history(request, model_name, record_id):
+    """Every audit entry for one record, plus its state rebuilt from the log."""
+    if request.user.role != 'admin':
+        return redirect('employee_dashboard')
+    entries = AuditTrail.objects.filter(
+        model_name=model_name, record_id=record_id
+    ).select_related('user').order_by('-timestamp', '-id')
+    context = {
+        'model_name': model_name,
+        'record_id': record_id,
+        'entries': entries,
+        'current_state': audit.reconstruct(model_name, record_id),
+    }
+    return render(request, 'BWLapp/audit_record_history.html', context)
+
+@login_required
+def job_status(request):
+    """
+    Background work at a glance: job and outbox counts, running and failed
+    jobs and the periodic schedule. POST a job_id to retry a failed job.
+    """
+    if request.user.role != 'admin':
+        return redirect('employee_dashboard')
+    if request.method == 'POST':
+        failed = get_object_or_404(Job, pk=request.POST.get('job_id'), status='failed')
+        jobs.retry(failed)
+        messages.success(request, f"Job #{failed.pk} ({failed.name}) queued again.")
+        return redirect('job-status')
+
+    job_counts = dict(Job.objects.values_list('status').annotate(total=Count('id')))
+    outbox_counts = dict(OutboxEvent.objects.values_list('status').annotate(total=Count('id')))
+    last_runs = dict(
+        Job.objects.filter(name__in=[name for _, name in jobs.schedules()])
+        .values_list('name').annotate(last=Max('run_at'))
+    )
+    context = {
+        'job_counts': [(label, job_counts.get(key, 0)) for key, label in Job.STATUS_CHOICES],
+        'outbox_counts': [(label, outbox_counts.get(key, 0)) for key, label in OutboxEvent.STATUS_CHOICES],
+        'due_jobs': Job.objects.filter(status='queued', run_at__lte=timezone.now()).count(),
+        'running_jobs': Job.objects.filter(status='running').order_by('started_at')[:50],
+        'failed_jobs': Job.objects.filter(status='failed').order_by('-finished_at')[:50],
+        'periodic_jobs': [
+            {'name': name, 'cron': schedule.expression, 'last_run': last_runs.get(name)}
+            for schedule, name in jobs.schedules()
+        ],
+    }
+    return render(request, 'BWLapp/job_status.html', context)
+
+@login_required
+def bank_statements(request):
+    """Upload of a statement CSV to match against open orders, plus the recent imports."""
+    if request.user.role != 'admin':
+        return redirect('employee_dashboard')
+    form = StatementUploadForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        upload = form.cleaned_data['file']
+        try:
+            statement = statements.import_statement(upload, upload.name, form.cleaned_data['method'], user=request.user)
+        except statements.StatementError as exc:
+            form.add_error('file', str(exc))
+        else:
+            return redirect('statement-review', pk=statement.pk)
+
+    recent = BankStatement.objects.select_related('imported_by').annotate(
+        line_count=Count('lines'),
+        confirmed_count=Count('lines', filter=Q(lines__status='confirmed')),
+    ).order_by('-imported_at')[:20]
+    return render(request, 'BWLapp/bank_statements.html', {'form': form, 'statements': recent})
+
+@login_required
+def statement_review(request, pk):
+    """
+    A statement's lines with their suggested orders. Ticked lines are
+    confirmed as payments to the order entered next to them, all in one
+    transaction; they can also be ignored or matched again.
+    """
+    if request.user.role != 'admin':
+        return redirect('employee_dashboard')
+    statement = get_object_or_404(BankStatement, pk=pk)
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        line_ids = [int(value) for value in request.POST.getlist('line') if value.isdigit()]
+        if action == 'confirm':
+            choices = {}
+            for line_id in line_ids:
+                order_id = request.POST.get(f'order_{line_id}', '').strip()
+                if order_id.isdigit():
+                    choices[line_id] = int(order_id)
+            payments = statements.confirm_lines(statement, choices, user=request.user)
+            messages.success(request, f"Recorded {len(payments)} payments.")
+            skipped = len(choices) - len(payments)
+            if skipped:
+                messages.warning(request, f"{skipped} lines were not recorded: already confirmed, or the order is closed or paid off.")
+        elif action == 'ignore':
+            ignored = statement.lines.filter(pk__in=line_ids).exclude(status='confirmed').update(status='ignored')
+            messages.success(request, f"Ignored {ignored} lines.")
+        elif action == 'rematch':
+            matched = statements.match_statement(statement)
+            messages.success(request, f"{matched} open lines matched an order.")
+        return redirect(f"{request.path}?{request.GET.urlencode()}")
+
+    status = request.GET.get('status', 'open')
+    lines = statement.lines.select_related('matched_order__customer', 'payment')
+    if status == 'open':
+        lines = lines.filter(status__in=['suggested', 'unmatched'])
+    elif status in dict(StatementLine.STATUS_CHOICES):
+        lines = lines.filter(status=status)
+    counts = dict(statement.lines.values_list('status').annotate(total=Count('id')))
+    context = {
+        'statement': statement,
+        'lines': lines,
+        'status': status,
+        'status_counts': [(key, label, counts.get(key, 0)) for key, label in StatementLine.STATUS_CHOICES],
+        'auto_confirm': statements.AUTO_CONFIRM_THRESHOLD,
+    }
+    return render(request, 'BWLapp/statement_review.html', context)
+
+@login_required
+def customer_duplicates(request):
+    """
+    Open duplicate customer candidates, best match first. POST a
+    candidate_id with action 'keep_a' or 'keep_b' to merge the pair into
+    that customer, or 'dismiss' if they are different businesses.
+    """
+    if request.user.role != 'admin':
+        return redirect('employee_dashboard')
+    if request.method == 'POST':
+        candidate = get_object_or_404(
+            DuplicateCandidate.objects.select_related('customer_a', 'customer_b'),
+            pk=request.POST.get('candidate_id'), status='open',
+        )
+        action = request.POST.get('action')
+        if action in ('keep_a', 'keep_b'):
+            keep, duplicate = candidate.customer_a, candidate.customer_b
+            if action == 'keep_b':
+                keep, duplicate = duplicate, keep
+            moved = dedupe.merge_customers(keep, duplicate, user=request.user)
+            messages.success(request, f"Merged {duplicate.name} into {keep.name}; {moved} orders moved.")
+        elif action == 'dismiss':
+            candidate.status = 'dismissed'
+            candidate.save(update_fields=['status'])
+        return redirect('customer-duplicates')
+
+    candidates = (
+        DuplicateCandidate.objects.filter(status='open')
+        .select_related('customer_a__ledger', 'customer_b__ledger')
+        .order_by('-score', 'pk')[:100]
+    )
+    context = {
+        'candidates': candidates,
+        'open_count': DuplicateCandidate.objects.filter(status='open').count(),
+    }
+    return render(request, 'BWLapp/customer_duplicates.html', context)
+
 def payment_receipt(request, pk):
-    payment = get_object_or_404(Payment, pk=pk)
+    payment = get_object_or_404(Payment.objects.select_related('order__customer'), pk=pk)
     return render(request, "BWLapp/payment_receipt.html", {"payment": payment})
 
+@login_required
+def payment_receipt_pdf(request, pk):
+    docs = documents.load_receipts([pk])
+    if not docs:
+        return HttpResponse(status=404)
+    response = HttpResponse(documents.get_or_render(docs[0]), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{docs[0]["filename"]}"'
+    return response
+
+@login_required
+def order_invoice_pdf(request, pk):
+    docs = documents.load_invoices([pk])
+    if not docs:
+        return HttpResponse(status=404)
+    response = HttpResponse(documents.get_or_render(docs[0]), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{docs[0]["filename"]}"'
+    return response
+
+@login_required
+def documents_zip(request):
+    """
+    Streams a ZIP of receipts, invoices or statements for a date range,
+    e.g. /documents/zip/?kind=receipt&from=2025-09-01&to=2025-09-30
+    """
+    if request.user.role != 'admin':
+        return redirect('employee_dashboard')
+    kind = request.GET.get('kind', 'receipt')
+    try:
+        start, end = documents.date_range(
+            date.fromisoformat(request.GET['from']),
+            date.fromisoformat(request.GET['to']),
+        )
+    except (KeyError, ValueError):
+        return HttpResponse("Provide 'from' and 'to' dates as YYYY-MM-DD.", status=400)
+    if kind not in documents.DOCUMENT_KINDS:
+        return HttpResponse(f"Unknown document kind '{kind}'.", status=400)
+
+    ids = list(documents.select_ids(kind, start, end))
+    files = documents.iter_documents(kind, ids, start, end, workers=settings.DOCUMENT_WORKERS)
+    response = StreamingHttpResponse(documents.stream_zip(files), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{kind}s-{start:%Y%m%d}-{end:%Y%m%d}.zip"'
+    return response
+
 # --- New: Stock Views ---
 class StockListView(AjaxableResponseMixin, AdminRequiredMixin, ListView):
     model = Stock
+    queryset = Stock.objects.select_related('product').annotate(on_hand=Stock.on_hand_expression())
     template_name = 'BWLapp/stock_list.html'
     context_object_name = 'all_stocks'
     ordering = ['product__name']
@@ -659,12 +1007,30 @@ class StockCreateView(AdminRequiredMixin, CreateView):
     form_class = StockForm
     template_name = 'BWLapp/stock_form.html'
     success_url = reverse_lazy('stock-list') # Or wherever you want to redirect
+
+    def form_valid(self, form):
+        with transaction.atomic():
+            response = super().form_valid(form)
+            if self.object.quantity:
+                StockMovement.record(self.object, self.object.quantity, 'receipt', user=self.request.user)
+        return response
+
 class StockUpdateView(AdminRequiredMixin, UpdateView):
     model = Stock
     form_class = StockForm
     template_name = 'BWLapp/stock_form.html'
     success_url = reverse_lazy('stock-list') # Or wherever you want to redirect
 
+    def form_valid(self, form):
+        with transaction.atomic():
+            # Save the row's current quantity, not the one the form was loaded with;
+            # a stock count typed into the form is then applied as an adjustment.
+            form.instance.quantity = Stock.objects.select_for_update().values_list('quantity', flat=True).get(pk=self.object.pk)
+            response = super().form_valid(form)
+            if 'quantity' in form.changed_data:
+                self.object.set_quantity(form.cleaned_data['quantity'], user=self.request.user, note="Edited on stock form")
+        return response
+
 class StockDeleteView(AdminRequiredMixin, DeleteView):
     model = Stock
     template_name = 'BWLapp/stock_confirm_delete.html'
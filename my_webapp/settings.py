@@ -2,6 +2,7 @@
 
 from pathlib import Path
 import os
+from datetime import timedelta
 from decimal import Decimal
 import json
 import dj_database_url
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'BWLapp',
 ]
 AUTH_USER_MODEL = 'BWLapp.CustomUser'
@@ -60,13 +62,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept per process. Under DEBUG the autoreloader
+            # empties the cache whenever a template file changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -98,6 +107,72 @@ else:
         }
     }
 
+# Connection pooling (psycopg 3 only)
+# Each gunicorn worker shares a small pool of Postgres connections instead of
+# holding one persistent connection per thread. Set DB_POOL=False to go back
+# to plain persistent connections.
+DB_POOL_ENABLED = os.environ.get('DB_POOL', 'True') == 'True'
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))
+
+if DB_POOL_ENABLED and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # The pool owns connection lifetime, so Django must not keep its own.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    # Pre-ping: with health checks on, Django gives the pool its own check
+    # and each connection is checked before it is handed to a request.
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': DB_POOL_MIN_SIZE,
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': DB_POOL_TIMEOUT,
+        'max_idle': DB_POOL_MAX_IDLE,
+    }
+
+# Caching
+# LocMem is per-process. Set REDIS_URL to share the cache between gunicorn workers.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bwl-default',
+        }
+    }
+# Rendered list rows ({% cache %} fragments). Their keys carry the row's
+# updated_at, so a changed row gets a new key and a per-process copy can't
+# serve stale HTML; keeping them local saves a network trip per row.
+CACHES['template_fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'bwl-template-fragments',
+    'TIMEOUT': 24 * 60 * 60,
+    'OPTIONS': {'MAX_ENTRIES': 50000},
+}
+
+# With a shared cache, sessions are read from it and written through to the
+# database, so a cache restart or eviction only costs a database read. A
+# per-process LocMem copy would outlive a logout made in another worker, so
+# without REDIS_URL sessions stay in the database alone.
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if REDIS_URL else 'django.contrib.sessions.backends.db'
+)
+
+# The cached backend serves request.user (and its profile) from the cache when
+# it is shared (REDIS_URL); otherwise it reads the database like ModelBackend.
+# ModelBackend stays listed so sessions started before it keep working.
+AUTHENTICATION_BACKENDS = [
+    'BWLapp.identity.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -129,8 +204,39 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Processes used to render PDF batches from the web (documents_zip).
+# The generate_documents command takes its own --workers option.
+DOCUMENT_WORKERS = int(os.environ.get('DOCUMENT_WORKERS', '1'))
+
+# Without REDIS_URL, how long a worker reuses a cache version (stock catalog,
+# availability) before reading it from the database again (shared_cache.py).
+VERSION_CHECK_SECONDS = float(os.environ.get('VERSION_CHECK_SECONDS', '1'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Audit log: write a full snapshot of a record after this many delta entries.
+AUDIT_SNAPSHOT_INTERVAL = 20
+
+# Closed orders older than this move to the archive tables (manage.py archive_orders).
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '365'))
+
+# REST API (BWLapp/api.py)
+# JWT only: the token carries the user id and role, so API requests never
+# touch the session table or load the user row.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
+}
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.environ.get('API_ACCESS_TOKEN_MINUTES', '15'))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_USER_CLASS': 'BWLapp.api.RoleTokenUser',
+}
+
 # Custom JSON encoder for DecimalField
 JSON_ENCODER = 'my_webapp.settings.CustomJSONEncoder'
\ No newline at end of file
@@ -7,6 +7,8 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Versioned REST API for integrations (BWLapp/api.py).
+    path('api/v1/', include('BWLapp.api_urls')),
     # This includes all the URL patterns from your BWLapp application.
     path('', include('BWLapp.urls')),
 ]